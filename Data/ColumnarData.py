@@ -0,0 +1,279 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#    Columnar (struct of arrays) storage of the datapoints of a namespace.
+#    Rather than a MarvinData object per datapoint, each namespace keeps
+#    arrays of arrival times and interned ID/value codes.  MarvinData
+#    objects are only created again when the data is written out.
+#
+##############################################################################
+import copy
+from array import array
+
+from Data import MarvinGroupData
+
+NO_GROUP = -1
+
+
+## interns strings (or any hashable) to small integer codes
+class StringTable(object):
+    def __init__(self):
+        self._strings = []
+        self._codes = {}
+
+    def __len__(self):
+        return len(self._strings)
+
+    def Code(self,string):
+        try:
+            return self._codes[string]
+        except KeyError:
+            code = len(self._strings)
+            self._codes[string] = code
+            self._strings.append(string)
+            return code
+
+    def String(self,code):
+        return self._strings[code]
+
+    def Strings(self):
+        return self._strings
+
+
+## value table, also caches the numeric version of each distinct value
+class ValueTable(StringTable):
+    def __init__(self):
+        StringTable.__init__(self)
+        self._numbers = []
+
+    def Code(self,value):
+        code = StringTable.Code(self,value)
+        if code == len(self._numbers):
+            try:
+                self._numbers.append(float(value))
+            except Exception:
+                self._numbers.append(None)
+        return code
+
+    # float version of the value, None if is not numeric
+    def Number(self,code):
+        return self._numbers[code]
+
+
+## the tables shared by all the namespaces of a file
+class ColumnarTables(object):
+    def __init__(self):
+        self.IDs = StringTable()
+        self.Values = ValueTable()
+        self.Extras = StringTable() # (class, Namespace, FormatVersion, Live) of each datapoint
+
+
+## all of the datapoints for a single namespace
+class ColumnarNamespace(object):
+    def __init__(self,name,tables):
+        self.Name = name
+        self.NamespaceOverride = None # set when renamed, is stamped on the datapoints at write time
+        self._tables = tables
+        self.Times = array('q')
+        self.IDs = array('l')
+        self.Values = array('l')
+        self.Extras = array('l')
+        self.Groups = array('l') # index into _groupShells, or NO_GROUP
+        self._groupShells = []
+
+    def __len__(self):
+        return len(self.Times)
+
+    def __iter__(self):
+        return self.Entries()
+
+    def _addRow(self,entry,group):
+        tables = self._tables
+        self.Times.append(entry.ArrivalTime)
+        self.IDs.append(tables.IDs.Code(entry.ID))
+        self.Values.append(tables.Values.Code(entry.Value))
+        self.Extras.append(tables.Extras.Code((entry.__class__,entry.Namespace,entry.FormatVersion,entry.Live)))
+        self.Groups.append(group)
+
+    # add a MarvinData or MarvinDataGroup, must be added in time order
+    def AddEntry(self,entry):
+        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+            shell = copy.copy(entry)
+            shell._DataList = []
+            group = len(self._groupShells)
+            self._groupShells.append(shell)
+            for subEntry in entry._DataList:
+                self._addRow(subEntry,group)
+        else:
+            self._addRow(entry,NO_GROUP)
+
+    def EntryCount(self):
+        count = 0
+        lastGroup = NO_GROUP
+        for group in self.Groups:
+            if group == NO_GROUP or group != lastGroup:
+                count += 1
+            lastGroup = group
+        return count
+
+    # returns a bytearray indexed by ID code, 1 where the ID matches matchFn
+    def IdCodeMask(self,matchFn):
+        mask = bytearray(len(self._tables.IDs))
+        for code in set(self.IDs):
+            if matchFn(self._tables.IDs.String(code)):
+                mask[code] = 1
+        return mask
+
+    # row numbers of every datapoint whose ID code is set in the mask
+    def SelectRows(self,idMask):
+        return [row for row,code in enumerate(self.IDs) if idMask[code]]
+
+    # keep only the rows that are set in keepMask (bytearray/list, 1 per row)
+    def Compress(self,keepMask):
+        for column in ('Times','IDs','Values','Extras','Groups'):
+            old = getattr(self,column)
+            setattr(self,column,array(old.typecode,[item for item,keep in zip(old,keepMask) if keep]))
+
+    # remaps every row that is in rows, valueFn gets the value and returns the new one (or None to leave it)
+    # is done once per distinct value, not once per row
+    def MapValues(self,rows,valueFn):
+        values = self._tables.Values
+        remap = {}
+        changedCount = 0
+        for row in rows:
+            code = self.Values[row]
+            if not code in remap:
+                newValue = valueFn(values.String(code),values.Number(code))
+                remap[code] = None if None == newValue else values.Code(newValue)
+
+            newCode = remap[code]
+            if None != newCode:
+                self.Values[row] = newCode
+                changedCount += 1
+
+        return changedCount
+
+    # remaps the ID of every row in rows, idFn gets called once per distinct ID
+    def MapIDs(self,rows,idFn):
+        ids = self._tables.IDs
+        remap = {}
+        for row in rows:
+            code = self.IDs[row]
+            if not code in remap:
+                remap[code] = ids.Code(idFn(ids.String(code)))
+            self.IDs[row] = remap[code]
+
+        return [ids.String(code) for code in remap.values()]
+
+    # creates another namespace with the same datapoints
+    def Copy(self,newName):
+        newNS = ColumnarNamespace(newName,self._tables)
+        newNS.NamespaceOverride = newName
+        for column in ('Times','IDs','Values','Extras','Groups'):
+            setattr(newNS,column,array(getattr(self,column).typecode,getattr(self,column)))
+        newNS._groupShells = list(self._groupShells)
+        return newNS
+
+    # merges individual datapoints from another namespace (as non grouped datapoints), sorted by time
+    # newIdFn gives the ID for the copied datapoint, namespace is what they get stamped with
+    def MergeRows(self,other,rows,newIdFn,namespace):
+        ids = self._tables.IDs
+        extras = self._tables.Extras
+        extrasMap = {}
+        for row in rows:
+            code = other.Extras[row]
+            if not code in extrasMap:
+                entryClass,oldNamespace,formatVersion,live = extras.String(code)
+                extrasMap[code] = extras.Code((entryClass,namespace,formatVersion,live))
+
+        incoming = [(other.Times[row],ids.Code(newIdFn(ids.String(other.IDs[row]))),other.Values[row],extrasMap[other.Extras[row]]) for row in rows]
+        if len(incoming) < 1:
+            return 0
+
+        incoming.sort(key=lambda newRow: newRow[0])
+
+        existing = list(zip(self.Times,self.IDs,self.Values,self.Extras,self.Groups))
+        merged = []
+        index = 0
+        for newRow in incoming:
+            while index < len(existing) and existing[index][0] <= newRow[0]:
+                group = existing[index][4]
+                merged.append(existing[index])
+                index += 1
+                while NO_GROUP != group and index < len(existing) and existing[index][4] == group: # don't split a group
+                    merged.append(existing[index])
+                    index += 1
+            merged.append(newRow + (NO_GROUP,))
+        merged.extend(existing[index:])
+
+        self.Times = array('q',[row[0] for row in merged])
+        self.IDs = array('l',[row[1] for row in merged])
+        self.Values = array('l',[row[2] for row in merged])
+        self.Extras = array('l',[row[3] for row in merged])
+        self.Groups = array('l',[row[4] for row in merged])
+        return len(incoming)
+
+    def _createEntry(self,row):
+        tables = self._tables
+        entryClass,namespace,formatVersion,live = tables.Extras.String(self.Extras[row])
+        if None != self.NamespaceOverride:
+            namespace = self.NamespaceOverride
+
+        entry = entryClass(namespace,tables.IDs.String(self.IDs[row]),tables.Values.String(self.Values[row]),self.Times[row],formatVersion,False)
+        entry.Live = live
+        return entry
+
+    # ArrivalTime of each entry that Entries() gives, without creating them
+    def EntryTimes(self):
+        rowCount = len(self.Times)
+        row = 0
+        while row < rowCount:
+            group = self.Groups[row]
+            if NO_GROUP == group:
+                yield self.Times[row]
+                row += 1
+                continue
+
+            yield self._groupShells[group].ArrivalTime
+            while row < rowCount and self.Groups[row] == group:
+                row += 1
+
+    def IsTimeOrdered(self):
+        lastTime = None
+        for arrivalTime in self.EntryTimes():
+            if None != lastTime and arrivalTime < lastTime:
+                return False
+            lastTime = arrivalTime
+
+        return True
+
+    # generator that re-creates the MarvinData/MarvinDataGroup objects, in time order
+    def Entries(self):
+        rowCount = len(self.Times)
+        row = 0
+        while row < rowCount:
+            group = self.Groups[row]
+            if NO_GROUP == group:
+                yield self._createEntry(row)
+                row += 1
+                continue
+
+            entry = copy.copy(self._groupShells[group])
+            entry._DataList = []
+            while row < rowCount and self.Groups[row] == group:
+                entry._DataList.append(self._createEntry(row))
+                row += 1
+            yield entry
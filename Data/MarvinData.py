@@ -17,6 +17,8 @@
 #    Wrapper class for a piece of data, could be from file or from network
 #
 ##############################################################################
+import copy
+import copyreg
 from Util import Time
 
 class MarvinData(object):
@@ -56,5 +58,58 @@ class MarvinData(object):
 
         return buffer
 
-    
-        
+
+## Compact version of MarvinData, uses __slots__ so there is no per instance dictionary.
+## __class__ reports MarvinData, so isinstance() checks still work and pickling writes
+## out a plain Data.MarvinData.MarvinData - files are unchanged for Oscar/Marvin.
+class CompactMarvinData(object):
+    __slots__ = ('FormatVersion','Value','ArrivalTime','Namespace','ID','Live')
+
+    def __init__(self,Namespace,ID,Value,ElapsedTime,FormatVersion,isLive=True):
+        MarvinData.__init__(self,Namespace,ID,Value,ElapsedTime,FormatVersion,isLive)
+
+    @property
+    def __class__(self):
+        return MarvinData
+
+    def __getstate__(self):
+        state = {}
+        for name in CompactMarvinData.__slots__:
+            if hasattr(self,name):
+                state[name] = getattr(self,name)
+        return state
+
+    def __setstate__(self,state):
+        if len(state) == len(CompactMarvinData.__slots__):
+            try: # called for every datapoint loaded, so quick path for the usual case
+                self.FormatVersion = state['FormatVersion']
+                self.Value = state['Value']
+                self.ArrivalTime = state['ArrivalTime']
+                self.Namespace = state['Namespace']
+                self.ID = state['ID']
+                self.Live = state['Live']
+                return
+
+            except KeyError:
+                pass
+
+        for name,value in state.items():
+            setattr(self,name,value)
+
+    # pickle exactly like the class we stand in for
+    def __reduce_ex__(self,protocol):
+        return (copyreg.__newobj__,(self.__class__,),self.__getstate__())
+
+    def __copy__(self):
+        newObj = type(self).__new__(type(self))
+        newObj.__setstate__(self.__getstate__())
+        return newObj
+
+    def __deepcopy__(self,memo):
+        newObj = type(self).__new__(type(self))
+        memo[id(self)] = newObj
+        newObj.__setstate__(copy.deepcopy(self.__getstate__(),memo))
+        return newObj
+
+    ToXML = MarvinData.ToXML
+
@@ -41,4 +41,27 @@ class MarvinDataGroup(MarvinData.MarvinData):
 
         buffer += "</OscarGroup>"
 
-        return buffer
\ No newline at end of file
+        return buffer
+
+
+## Compact version of MarvinDataGroup, see MarvinData.CompactMarvinData
+class CompactMarvinDataGroup(MarvinData.CompactMarvinData):
+    __slots__ = ('_DataList',)
+
+    def __init__(self,Namespace,ID,Value,ElapsedTime,FormatVersion,isLive=True):
+        MarvinData.CompactMarvinData.__init__(self,Namespace,ID,Value,ElapsedTime,FormatVersion,isLive)
+        self._DataList = []
+
+    @property
+    def __class__(self):
+        return MarvinDataGroup
+
+    def __getstate__(self):
+        state = MarvinData.CompactMarvinData.__getstate__(self)
+        if hasattr(self,'_DataList'):
+            state['_DataList'] = self._DataList
+        return state
+
+    AddPacket = MarvinDataGroup.AddPacket
+    ToXML = MarvinDataGroup.ToXML
+
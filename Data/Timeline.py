@@ -0,0 +1,241 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Time ordered list of entries kept as a list of small blocks, so inserting
+#   by time is a binary search and an insert into one block rather than a
+#   scan and an insert into one huge list.  Acts like a list, so can be used
+#   in place of a namespace's list of entries.
+#
+#   Times are always read from the entries themselves (nothing is cached),
+#   so changing ArrivalTimes in a way that keeps the order (like Span does)
+#   is fine.
+#
+##############################################################################
+import heapq
+from collections.abc import MutableSequence
+
+BLOCK_SIZE = 512
+
+
+def _arrivalTime(entry):
+    return entry.ArrivalTime
+
+# index of first entry in a block with ArrivalTime >= arrivalTime (or > if after)
+def _bisectBlock(block,arrivalTime,after):
+    low = 0
+    high = len(block)
+    while low < high:
+        middle = (low + high) // 2
+        middleTime = block[middle].ArrivalTime
+        if middleTime < arrivalTime or (after and middleTime == arrivalTime):
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+## blocked list of entries, in ArrivalTime order
+class Timeline(MutableSequence):
+    def __init__(self,entries=()):
+        self._blocks = []
+        self._setBlocks(list(entries))
+
+    def _setBlocks(self,entries,firstBlock=0):
+        del self._blocks[firstBlock:]
+        for start in range(0,len(entries),BLOCK_SIZE):
+            self._blocks.append(entries[start:start + BLOCK_SIZE])
+        self._offsets = None
+
+    # offset of the first entry of each block, built when needed after a change
+    def _getOffsets(self):
+        if None == self._offsets:
+            offsets = []
+            total = 0
+            for block in self._blocks:
+                offsets.append(total)
+                total += len(block)
+            self._offsets = offsets
+            self._length = total
+        return self._offsets
+
+    # (block number, index in the block) of position index
+    def _locate(self,index):
+        offsets = self._getOffsets()
+        if index < 0:
+            index += self._length
+        if index < 0 or index >= self._length:
+            raise IndexError("Timeline index out of range")
+
+        low = 0
+        high = len(offsets) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if offsets[middle] <= index:
+                low = middle
+            else:
+                high = middle - 1
+        return (low,index - offsets[low])
+
+    def __len__(self):
+        self._getOffsets()
+        return self._length
+
+    def __iter__(self):
+        for block in self._blocks:
+            for entry in block:
+                yield entry
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            start,stop,step = index.indices(len(self))
+            if 1 != step:
+                return list(self)[index]
+            return self._slice(start,stop)
+
+        blockNum,blockIndex = self._locate(index)
+        return self._blocks[blockNum][blockIndex]
+
+    def _slice(self,start,stop):
+        result = []
+        if start >= stop:
+            return result
+
+        blockNum,blockIndex = self._locate(start)
+        remaining = stop - start
+        while remaining > 0:
+            part = self._blocks[blockNum][blockIndex:blockIndex + remaining]
+            result.extend(part)
+            remaining -= len(part)
+            blockNum += 1
+            blockIndex = 0
+        return result
+
+    def __setitem__(self,index,entry):
+        if isinstance(index,slice):
+            entries = list(self)
+            entries[index] = entry
+            self._setBlocks(entries)
+            return
+
+        blockNum,blockIndex = self._locate(index)
+        self._blocks[blockNum][blockIndex] = entry
+
+    def __delitem__(self,index):
+        if isinstance(index,slice):
+            entries = list(self)
+            del entries[index]
+            self._setBlocks(entries)
+            return
+
+        blockNum,blockIndex = self._locate(index)
+        del self._blocks[blockNum][blockIndex]
+        if 0 == len(self._blocks[blockNum]):
+            del self._blocks[blockNum]
+        self._offsets = None
+
+    def insert(self,index,entry):
+        length = len(self)
+        if index < 0:
+            index = max(0,index + length)
+        if index >= length:
+            if 0 == len(self._blocks):
+                self._blocks.append([])
+            blockNum,blockIndex = len(self._blocks) - 1,len(self._blocks[-1])
+        else:
+            blockNum,blockIndex = self._locate(index)
+        self._insertAt(blockNum,blockIndex,entry)
+
+    def _insertAt(self,blockNum,blockIndex,entry):
+        block = self._blocks[blockNum]
+        block.insert(blockIndex,entry)
+        if len(block) > 2 * BLOCK_SIZE:
+            self._blocks[blockNum:blockNum + 1] = [block[:BLOCK_SIZE],block[BLOCK_SIZE:]]
+        self._offsets = None
+
+    # block that an entry at arrivalTime goes in, is a binary search on the first entry of each
+    def _findBlock(self,arrivalTime,after):
+        low = 0
+        high = len(self._blocks)
+        while low < high:
+            middle = (low + high) // 2
+            firstTime = self._blocks[middle][0].ArrivalTime
+            if firstTime < arrivalTime or (after and firstTime == arrivalTime):
+                low = middle + 1
+            else:
+                high = middle
+        return max(0,low - 1)
+
+    # position of the first entry with an ArrivalTime >= arrivalTime (> if after), like bisect
+    def BisectTime(self,arrivalTime,after=False):
+        if 0 == len(self._blocks):
+            return 0
+        blockNum = self._findBlock(arrivalTime,after)
+        blockIndex = _bisectBlock(self._blocks[blockNum],arrivalTime,after)
+        return self._getOffsets()[blockNum] + blockIndex
+
+    # inserts entry in front of the first entry with the same or a later time, returns the position
+    # or None (and does not insert) if it is after everything
+    def InsertByTime(self,entry):
+        if 0 == len(self._blocks) or entry.ArrivalTime > self._blocks[-1][-1].ArrivalTime:
+            return None
+
+        blockNum = self._findBlock(entry.ArrivalTime,False)
+        blockIndex = _bisectBlock(self._blocks[blockNum],entry.ArrivalTime,False)
+        if blockIndex == len(self._blocks[blockNum]): # goes at the start of the next block
+            blockNum += 1
+            blockIndex = 0
+        position = self._getOffsets()[blockNum] + blockIndex
+        self._insertAt(blockNum,blockIndex,entry)
+        return position
+
+    # merges time ordered entries in, in one pass over the part of the timeline they
+    # land in.  New entries go in front of existing ones with the same time.
+    def MergeSorted(self,entries):
+        entries = iter(entries)
+        first = next(entries,None)
+        if None == first:
+            return
+
+        if 0 == len(self._blocks):
+            self._setBlocks([first] + list(entries))
+            return
+
+        blockNum = self._findBlock(first.ArrivalTime,False)
+        tail = [entry for block in self._blocks[blockNum:] for entry in block]
+        merged = list(heapq.merge(_prepend(first,entries),tail,key=_arrivalTime))
+        self._setBlocks(merged,blockNum)
+
+    # inserts entries (in the order given) at position index, in one go
+    def Splice(self,index,entries):
+        entries = list(entries)
+        if 0 == len(entries):
+            return
+
+        if index >= len(self):
+            blockNum = len(self._blocks)
+        else:
+            blockNum,blockIndex = self._locate(index)
+            block = self._blocks[blockNum]
+            entries = block[:blockIndex] + entries + block[blockIndex:]
+
+        tail = [entry for block in self._blocks[blockNum + 1:] for entry in block]
+        self._setBlocks(entries + tail,blockNum)
+
+
+def _prepend(first,rest):
+    yield first
+    for entry in rest:
+        yield entry
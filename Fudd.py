@@ -23,10 +23,17 @@ import sys
 import logging
 import pickle
 import xml.dom.minidom
+from concurrent.futures import ProcessPoolExecutor
 from xml.parsers.expat import ExpatError
 
 from Helpers import Log
 from Helpers import FileHandler
+from Helpers import ConfigPlan
+from Helpers import BuildCache
+from Helpers import BiffStream
+from Helpers import Merge
+from Helpers import ExternalSort
+from Helpers import Planner
 from Helpers import VersionMgr
 
 
@@ -37,58 +44,168 @@ def existFile(filename):
     return True
 
 
-def ReadConfigFile(fileName,outfile):
+# generator of the final entries.  The timed sources are merged by time in one
+# pass, then each Append source follows on, with its times moved to start after
+# the last entry so far as they go by.  Sources are FileHandlers or spilled Runs.
+def MergeSources(timedList,appendList):
+    namespaceLists=[]
+    for fHandler in timedList:
+        namespaceLists.extend(fHandler.getNamespaceLists())
+
+    lastEntry = None
+    for entry in Merge.MergeNamespaces(namespaceLists):
+        lastEntry = entry
+        yield entry
+
+    for fHandler in appendList:
+        if None == lastEntry:
+            lastTime = 0
+            entries = Merge.MergeNamespaces(fHandler.getNamespaceLists())
+        else:
+            lastTime = lastEntry.ArrivalTime
+            entries = Merge.MergeByTime([Merge.TimeOrdered(entryList) for entryList in fHandler.getNamespaceLists()])
+
+        offsetTime = lastTime + 1
+        for entry in entries:
+            if offsetTime > 0:
+                entry.ArrivalTime += offsetTime
+            lastEntry = entry
+            yield entry
+
+
+# generator of (insert time, FileHandler) of each source, one after another
+def LoadSources(sourceList):
+    for source in sourceList:
+        fHandler = FileHandler.FileHandler(source)
+        yield (fHandler.insertTime,fHandler)
+
+def InitWorker(logLevel):
+    Log.setLevel(logLevel)
+
+# loads and processes a source (from its SourcePlan) and writes its entries in time
+# order to runFileName, returns (insert time, count)
+def ProcessSource(sourcePlan,runFileName):
+    fHandler = FileHandler.FileHandler(sourcePlan)
+    return (fHandler.insertTime,ExternalSort.WriteRun(runFileName,fHandler.iterTimeOrdered()))
+
+# generator of (insert time, Run) of each source, in the order given.  The sources
+# ([(SourcePlan, run file name)]) are done jobs at a time, each in its own process,
+# and written out as runs so all that comes back is the count
+def LoadSourcesInParallel(sourceList,jobs):
+    with ProcessPoolExecutor(jobs,initializer=InitWorker,initargs=(Log.getLogger().level,)) as pool:
+        work = []
+        for source,runFileName in sourceList:
+            work.append((runFileName,pool.submit(ProcessSource,source,runFileName)))
+
+        try:
+            for runFileName,job in work:
+                insertTime,count = job.result()
+                yield (insertTime,ExternalSort.Run(runFileName,count))
+
+        except BaseException:
+            # no point doing the rest
+            for runFileName,job in work:
+                job.cancel()
+            raise
+
+# generator of (insert time, Run) of each source, sources whose save file and <Source>
+# are the same as when they were cached come from the cache, the rest are processed
+# (jobs at a time) and cached.  keys are the cache keys of the sources
+def LoadSourcesCached(sourceList,keys,cache,jobs):
+    runMap = {}
+    toDo = []
+    for source,key in zip(sourceList,keys):
+        if not key in runMap:
+            runMap[key] = cache.GetRun(key)
+            if None == runMap[key]:
+                toDo.append((source,key))
+            else:
+                Log.getLogger().info("Using cached " + source.File)
+
+    work = [(source,cache.NewRunFileName(key)) for source,key in toDo]
+    if jobs > 1 and len(work) > 1:
+        made = LoadSourcesInParallel(work,jobs)
+    else:
+        made = ((source.InsertTime,ExternalSort.Run(runFileName,ProcessSource(source,runFileName)[1])) for source,runFileName in work)
+
+    for (source,key),(insertTime,run) in zip(toDo,list(made)):
+        runMap[key] = cache.AddRun(key,len(run),source.File)
+
+    for source,key in zip(sourceList,keys):
+        yield (source.InsertTime,runMap[key])
+
+
+# with memLimit (bytes), once the processed sources take more than that they are
+# written out to disk, so only one source at a time needs to fit in memory.  With
+# jobs (more than 1) that many sources are done at once, each always written to disk.
+# The config is compiled (and checked) into a plan before any source is loaded.
+# With a cacheDir, the plan and the sources that haven't changed come from there (see
+# ConfigPlan.GetPlan() and BuildCache), and if none have and outfile is the one made
+# from them last time it is left alone
+def ReadConfigFile(fileName,outfile,memLimit=None,jobs=1,cacheDir=None):
     if not existFile(fileName):
         return False
         
-    #open the xml file for reading:
-    file = open(fileName,'r')
-    #convert to string:
-    data = file.read()
-    #close file because we dont need it anymore:
-    file.close()
-    inputList=[]
     try:
-        domDoc = xml.dom.minidom.parseString(data)
-
-        sourceList = domDoc.getElementsByTagName('Source')
+        sourceList = ConfigPlan.GetPlan(fileName,cacheDir).Sources
 
-        # run through quickly and verify input files are specified and exist
+        # run through quickly and verify input files exist
         for source in sourceList:
-            if "File" in source.attributes:
-                sourceFile = source.attributes["File"].nodeValue
-                if not existFile(sourceFile):
-                    return False
-                
-            else:
-                Log.getLogger().error("No File specified for source")
+            if not existFile(source.File):
+                return False
 
-        resultList=[]
+        cache = None
+        if None != cacheDir:
+            cache = BuildCache.BuildCache(cacheDir)
+            keys = [cache.SourceKey(source) for source in sourceList]
+            outputKey = cache.OutputKey(keys)
+            count = cache.CurrentOutput(outfile,outputKey)
+            if None != count:
+                print("File [" + outfile + "] with " + str(count) + " entries is up to date.")
+                return True
+
+        timedList=[]
         appendList=[]
+        runStore = None
+        inMemorySize = 0
 
-        lastTime = 0
-        for source in sourceList:
-            fHandler = FileHandler.FileHandler(source)
-            if fHandler.insertTime == "Append":
-                appendList.append(fHandler)
+        try:
+            if None != cache:
+                loadedList = LoadSourcesCached(sourceList,keys,cache,jobs)
+            elif jobs > 1 and len(sourceList) > 1:
+                runStore = ExternalSort.RunStore()
+                loadedList = LoadSourcesInParallel([(source,runStore.NewRunFileName()) for source in sourceList],jobs)
             else:
-                   resultList = FileHandler.mergeLists(resultList,fHandler.createMergedList())
+                loadedList = LoadSources(sourceList)
 
-        if len(resultList) > 0:
-            lastTime = resultList[-1].ArrivalTime
+            for insertTime,fHandler in loadedList:
+                if None != memLimit and isinstance(fHandler,FileHandler.FileHandler):
+                    size = fHandler.MemorySize()
+                    if inMemorySize + size > memLimit:
+                        if None == runStore:
+                            runStore = ExternalSort.RunStore()
+                        fHandler = runStore.AddRun(fHandler.iterTimeOrdered())
+                    else:
+                        inMemorySize += size
 
-        for fHandler in appendList:
-                resultList = FileHandler.mergeLists(resultList,fHandler.createMergedList(lastTime + 1))
-                lastTime = resultList[-1].ArrivalTime
-            
-        try:
-            with open(outfile,'w+b') as fp:
-               pickle.dump(resultList, fp, pickle.DEFAULT_PROTOCOL)
+                if insertTime == "Append":
+                    appendList.append(fHandler)
+                else:
+                    timedList.append(fHandler)
 
-            print("New file [" + outfile + "] created with " + str(len(resultList)) + " entries.")
-        except Exception as ex:
-            print(str(ex))
-            return False
+            try:
+                writtenCount = BiffStream.WriteEntries(outfile,MergeSources(timedList,appendList))
+
+                print("New file [" + outfile + "] created with " + str(writtenCount) + " entries.")
+                if None != cache:
+                    cache.SetOutput(outfile,outputKey,writtenCount)
+            except Exception as ex:
+                print(str(ex))
+                return False
+
+        finally:
+            if None != runStore:
+                runStore.Close()
 
 
 
@@ -101,6 +218,48 @@ def ReadConfigFile(fileName,outfile):
 
     return True
 
+# dry run of a config, prints what each source is expected to do without loading any of them
+def PlanConfigFile(fileName,memLimit=None,jobs=1):
+    if not existFile(fileName):
+        return False
+
+    try:
+        sourceList = ConfigPlan.GetPlan(fileName).Sources
+        heldMemory = 0
+        peakMemory = 0
+        outputSize = 0
+        outputSamples = 0
+        sourcePeaks = []
+        for source in sourceList:
+            if not existFile(source.File):
+                return False
+
+            estimate = Planner.PlanSource(source)
+            estimate.Print()
+
+            # sources are all held until the output is written, unless spilled to disk
+            peakMemory = max(peakMemory,heldMemory + estimate.PeakMemory())
+            if None == memLimit or heldMemory + estimate.Memory() <= memLimit:
+                heldMemory += estimate.Memory()
+            sourcePeaks.append(estimate.PeakMemory())
+            outputSize += estimate.OutputSize()
+            outputSamples += estimate.SampleCount()
+
+        # with --jobs every source goes to disk, but the biggest ones could all be worked on at once
+        if jobs > 1 and len(sourcePeaks) > 1:
+            peakMemory = sum(sorted(sourcePeaks,reverse=True)[:jobs])
+
+        print("Output about {} ({} datapoints), peak memory about {}".format(Planner.FormatSize(outputSize),outputSamples,Planner.FormatSize(peakMemory)))
+
+    except pickle.UnpicklingError:
+        return False
+
+    except Exception as ex:
+        Log.getLogger().error("Bad Content - XML error: " + str(ex))
+        return False
+
+    return True
+
 def main():
     if not HandleCommandlineArguments():
         return
@@ -115,7 +274,11 @@ def HandleCommandlineArguments():
     parser = argparse.ArgumentParser(description='FUDD the fearful')
 
     parser.add_argument("-i","--input",help='specifies application configuration file file',type=str,required=True)
-    parser.add_argument("-o","--output",help='specifies file to generate',type=str,required=True)
+    parser.add_argument("-o","--output",help='specifies file to generate (not needed with --plan)',type=str)
+    parser.add_argument("-p","--plan",help='only print what each step is expected to do, output size and memory, nothing is written',action="store_true")
+    parser.add_argument("-m","--memlimit",help='memory to use (like 4G), sources are written to temporary files to stay within it',type=str)
+    parser.add_argument("-j","--jobs",help="number of sources to do at once, each in its own process (0 is one per CPU)",type=int,default=1)
+    parser.add_argument("-c","--cache",help='directory to keep processed sources in, unchanged sources are not processed again',type=str)
     parser.add_argument("-l","--logfile",help='specifies log file name',type=str)
     parser.add_argument("-v","--verbose",help="prints debug information",action="store_true")
 
@@ -125,6 +288,24 @@ def HandleCommandlineArguments():
     except:
        return False
 
+    if None == args.output and not args.plan:
+        print(parser.format_usage() + "error: the following arguments are required: -o/--output")
+        return False
+
+    if args.jobs < 0:
+        print("Invalid --jobs: " + str(args.jobs))
+        return False
+
+    if 0 == args.jobs:
+        args.jobs = os.cpu_count() or 1
+
+    memLimit = None
+    if None != args.memlimit:
+        memLimit = ExternalSort.ParseSize(args.memlimit)
+        if None == memLimit:
+            print("Invalid --memlimit: " + args.memlimit)
+            return False
+
     if None != args.logfile:
        Log.setLogfile(args.logfile)
 
@@ -137,7 +318,10 @@ def HandleCommandlineArguments():
 
     Log.getLogger().info("")
 
-    ReadConfigFile(args.input,args.output)
+    if args.plan:
+        return PlanConfigFile(args.input,memLimit,args.jobs)
+
+    ReadConfigFile(args.input,args.output,memLimit,args.jobs,args.cache)
 
 
 if __name__ == '__main__':
@@ -26,14 +26,25 @@ import xml.dom.minidom
 import pathlib
 from pprint import pprint as pprint
 import glob
+import json
+from concurrent.futures import ProcessPoolExecutor
+import shlex
 from xml.parsers.expat import ExpatError
 
 from Helpers import Log
 from Helpers import FileHandler
 from Helpers import Actions
+from Helpers import BiffIndex
+from Helpers import BiffStream
+from Helpers import ColumnarFile
+from Helpers import ExternalSort
+from Helpers import Matcher
+from Helpers import Planner
 from Helpers import VersionMgr
 
 g_args=None
+g_memLimit=None
+g_loadCache=None
 
 def existFile(filename):
     if not os.path.exists(filename):
@@ -41,6 +52,10 @@ def existFile(filename):
         return False
     return True
 
+# the save files that match pattern, leaving out the index files FUDD keeps next to them
+def GlobInputFiles(pattern):
+    return [fileName for fileName in glob.glob(pattern) if not BiffIndex.IsIndexFile(fileName)]
+
 
 def GetTargetFileName(inpName,destInfo):
     tDir= os.path.dirname(destInfo)
@@ -57,6 +72,23 @@ def GetTargetFileName(inpName,destInfo):
 
     return newFileName
 
+# the worker class for input files, columnar one if asked to
+def GetHandlerClass(columnar):
+    if columnar:
+        return Actions.ColumnarFileHandler
+
+    return Actions.FileHandler
+
+# creates the worker class for an input file, columnar one if asked to
+# namespaces are the patterns the action works on, files without any are not loaded
+def OpenFileHandler(inpName,namespaces=None):
+    return GetHandlerClass(g_args.columnar)(inpName,namespaces)
+
+def FormatTime(arrivalTime):
+    if None == arrivalTime:
+        return "-"
+    return str(arrivalTime)
+
 def test(inpList,destInfo):
     for inpName in inpList:
         newFileName = GetTargetFileName(inpName,destInfo)
@@ -71,6 +103,7 @@ class ArgObject(object):
     def __init__(self):
         self._parser=None
         self._workerFn=None
+        self._applyFn=None
         self._action=None
         self._desc=None
 
@@ -95,6 +128,10 @@ class ArgObject(object):
     def getWorkerFn(self):
         return self._workerFn
 
+    # makes the function that does the action to one file, None if it can't be a pipeline step
+    def getApplyFn(self):
+        return self._applyFn
+
     def getActionStrings(self):
         if isinstance(self._parser,argparse.ArgumentParser):
             return [self._action]
@@ -105,22 +142,74 @@ class ArgObject(object):
 
         return retList
 
-def deleteNamespace(args):
-    inpFiles =  glob.glob(g_args.input)
-    totalDeleted=0
-    fCount=0
+# does applyMaker(makerArgs)(fileHandler) to one input file and writes the result to
+# targetFn, returns what that returned.  Everything comes in as arguments, not from
+# g_args, so it can be run in a worker process for --jobs.  With memLimit the file is
+# done a chunk at a time so it doesn't have to fit in memory
+def ProcessInputFile(inpName,targetFn,overwrite,namespaces,applyMaker,makerArgs,columnar,memLimit):
+    applyFn = applyMaker(makerArgs)
+    if None != memLimit:
+        return Actions.CountResults(Actions.ProcessFileInChunks(GetHandlerClass(columnar),inpName,targetFn,overwrite,applyFn,namespaces,memLimit))
+
+    fHandler = GetHandlerClass(columnar)(inpName,namespaces)
+    result = applyFn(fHandler)
+    fHandler.writeFile(targetFn,overwrite)
+    return Actions.CountResults(result)
+
+def InitWorker(logLevel):
+    Log.setLevel(logLevel)
+
+# generator that does applyMaker(makerArgs) (one of the xxxFn functions and its arguments,
+# so it can be sent to another process) to each input file and writes the result to its
+# target file, gives (input file name, what it returned), in the order of the input files.
+# With --jobs the files are done in that many processes at once
+def ProcessInputFiles(namespaces,applyMaker,makerArgs):
+    inpFiles = [(inpName,GetTargetFileName(inpName,g_args.output)) for inpName in GlobInputFiles(g_args.input)]
+    if None != g_loadCache: # a manifest, files that were already loaded are reused
+        for inpName,targetFn in inpFiles:
+            fHandler = g_loadCache.Open(inpName)
+            result = applyMaker(makerArgs)(fHandler)
+            fHandler.writeFile(targetFn,g_args.overwrite)
+            g_loadCache.Forget(targetFn)
+            yield (inpName,Actions.CountResults(result))
+        return
 
-    print(inpFiles)
+    targets = set(targetFn for inpName,targetFn in inpFiles)
+    if g_args.jobs < 2 or len(inpFiles) < 2 or len(targets) < len(inpFiles): # files written to the same target are done one at a time, so the last one wins
+        for inpName,targetFn in inpFiles:
+            yield (inpName,ProcessInputFile(inpName,targetFn,g_args.overwrite,namespaces,applyMaker,makerArgs,g_args.columnar,g_memLimit))
+        return
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
+    # the workers can't ask about overwriting, so that is done here first
+    inpFiles = [(inpName,targetFn) for inpName,targetFn in inpFiles if Actions.OkToWrite(targetFn,g_args.overwrite)]
+
+    memLimit = g_memLimit
+    if None != memLimit: # is for all of the workers together
+        memLimit = memLimit // g_args.jobs
+
+    with ProcessPoolExecutor(g_args.jobs,initializer=InitWorker,initargs=(Log.getLogger().level,)) as pool:
+        jobs = [(inpName,pool.submit(ProcessInputFile,inpName,targetFn,True,namespaces,applyMaker,makerArgs,g_args.columnar,memLimit)) for inpName,targetFn in inpFiles]
+        for inpName,job in jobs:
+            yield (inpName,job.result())
+
+# the work deleteNamespace does on one file
+def deleteNamespaceFn(args):
+    def applyFn(fHandler):
         deletedFromFileCount = 0
         for namespace in args.namespace:
             deletedFromFileCount += fHandler.Delete_Namespace(namespace)
+        return deletedFromFileCount
 
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    return applyFn
+
+def deleteNamespace(args):
+    inpFiles =  GlobInputFiles(g_args.input)
+    totalDeleted=0
+    fCount=0
+
+    print(inpFiles)
+
+    for inpName,deletedFromFileCount in ProcessInputFiles(args.namespace,deleteNamespaceFn,args):
         Log.getLogger().info("{} namespaces deleted from {}".format(deletedFromFileCount,inpName))
         totalDeleted+=deletedFromFileCount
         if deletedFromFileCount > 0:
@@ -129,19 +218,18 @@ def deleteNamespace(args):
     Log.getLogger().info("Deleted {} namespaces deleted from {} files".format(totalDeleted,fCount))
 
 
+# the work deleteId does on one file
+def deleteIdFn(args):
+    def applyFn(fHandler):
+        return fHandler.Delete_Id(args.namespace,args.id)
+
+    return applyFn
+
 def deleteId(args):
-    inpFiles =  glob.glob(g_args.input)
     totalDeleted=0
     fCount=0
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
-        deletedFromFileCount = 0
-        for namespace in args.namespace:
-            deletedFromFileCount += fHandler.Delete_Id(namespace,args.id)
-
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    for inpName,deletedFromFileCount in ProcessInputFiles(args.namespace,deleteIdFn,args):
         Log.getLogger().info("{} datapoints deleted from {}".format(deletedFromFileCount,inpName))
         totalDeleted+=deletedFromFileCount
         if deletedFromFileCount > 0:
@@ -149,19 +237,18 @@ def deleteId(args):
 
     Log.getLogger().info("Deleted {} datapoints  from {} files".format(totalDeleted,fCount))
 
+# the work boundId does on one file
+def boundIdFn(args):
+    def applyFn(fHandler):
+        return fHandler.Bound_Id(args.namespace,args.id,args.max,args.min)
+
+    return applyFn
+
 def boundId(args):
-    inpFiles =  glob.glob(g_args.input)
     totalModified=0
     fCount=0
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
-        modifiedFromFileCount = 0
-        for namespace in args.namespace:
-            modifiedFromFileCount = fHandler.Bound_Id(namespace,args.id,args.max,args.min)
-
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    for inpName,modifiedFromFileCount in ProcessInputFiles(args.namespace,boundIdFn,args):
         Log.getLogger().info("{} datapoints bound from {}".format(modifiedFromFileCount,inpName))
         totalModified+=modifiedFromFileCount
         if modifiedFromFileCount > 0:
@@ -169,19 +256,18 @@ def boundId(args):
 
     Log.getLogger().info("bound {} datapoints  from {} files".format(totalModified,fCount))    
 
+# the work deltaId does on one file
+def deltaIdFn(args):
+    def applyFn(fHandler):
+        return fHandler.ApplyDelta_Id(args.namespace,args.id,args.delta)
+
+    return applyFn
+
 def deltaId(args):
-    inpFiles =  glob.glob(g_args.input)
     totalModified=0
     fCount=0
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
-        modifiedFromFileCount = 0
-        for namespace in args.namespace:
-            modifiedFromFileCount = fHandler.ApplyDelta_Id(namespace,args.id,args.delta)
-
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    for inpName,modifiedFromFileCount in ProcessInputFiles(args.namespace,deltaIdFn,args):
         Log.getLogger().info("{} datapoints delta's from {}".format(modifiedFromFileCount,inpName))
         totalModified+=modifiedFromFileCount
         if modifiedFromFileCount > 0:
@@ -189,19 +275,21 @@ def deltaId(args):
 
     Log.getLogger().info("delta'd {} datapoints  from {} files".format(totalModified,fCount))    
 
-def renameNamespace(args):
-    inpFiles =  glob.glob(g_args.input)
-    totalRenamed=0
-    fCount=0
-
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
+# the work renameNamespace does on one file
+def renameNamespaceFn(args):
+    def applyFn(fHandler):
         renamedInFileCount = 0
         for namespace in args.namespace:
             renamedInFileCount += fHandler.Rename_Namespace(namespace,args.new)
+        return renamedInFileCount
 
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    return applyFn
+
+def renameNamespace(args):
+    totalRenamed=0
+    fCount=0
+
+    for inpName,renamedInFileCount in ProcessInputFiles(args.namespace,renameNamespaceFn,args):
         Log.getLogger().info("{} namespaces renamed in {}".format(renamedInFileCount,inpName))
         totalRenamed+=renamedInFileCount
         if renamedInFileCount > 0:
@@ -209,23 +297,19 @@ def renameNamespace(args):
 
     Log.getLogger().info("Renamed {} namespaces int {} files".format(totalRenamed,fCount))
 
+# the work renameId does on one file
+def renameIdFn(args):
+    def applyFn(fHandler):
+        return fHandler.Rename_Id(args.namespace,args.id,args.new)
+
+    return applyFn
+
 def renameId(args):
-    inpFiles =  glob.glob(g_args.input)
     totalRenamedPoints=0
     totalIdsChanged=0
     fCount=0
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
-        pointInFileChanged=0
-        idsInFileChanged=0
-        for namespace in args.namespace:
-            pointCount, idCount = fHandler.Rename_Id(namespace,args.id,args.new)
-            pointInFileChanged += pointCount
-            idsInFileChanged += idCount
-
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    for inpName,(pointInFileChanged,idsInFileChanged) in ProcessInputFiles(args.namespace,renameIdFn,args):
         Log.getLogger().info("{} IDs, {} dataponts renamed in {}".format(idsInFileChanged,pointInFileChanged,inpName))
         totalRenamedPoints+=pointInFileChanged
         totalIdsChanged+=idsInFileChanged
@@ -235,19 +319,21 @@ def renameId(args):
     Log.getLogger().info("Renamed {} ids in {} files, {} datapoints".format(totalIdsChanged,fCount,totalRenamedPoints))
 
 
-def copyNamespace(args):
-    inpFiles =  glob.glob(g_args.input)
-    totalCopied=0
-    fCount=0
-
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
+# the work copyNamespace does on one file
+def copyNamespaceFn(args):
+    def applyFn(fHandler):
         copiedInFileCount = 0
         for namespace in args.namespace:
             copiedInFileCount += fHandler.Copy_Namespace(namespace,args.new)
+        return copiedInFileCount
 
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    return applyFn
+
+def copyNamespace(args):
+    totalCopied=0
+    fCount=0
+
+    for inpName,copiedInFileCount in ProcessInputFiles(args.namespace,copyNamespaceFn,args):
         Log.getLogger().info("{} namespaces copied in {}".format(copiedInFileCount,inpName))
         totalCopied+=copiedInFileCount
         if copiedInFileCount > 0:
@@ -255,20 +341,19 @@ def copyNamespace(args):
 
     Log.getLogger().info("Copied {} namespaces in {} files".format(totalCopied,fCount))
 
+# the work copyId does on one file
+def copyIdFn(args):
+    def applyFn(fHandler):
+        return fHandler.Copy_Id(args.namespace,args.id,args.newNamespace,args.newId)
+
+    return applyFn
+
 def copyId(args):
-    inpFiles =  glob.glob(g_args.input)
     totalCopiedPoints=0
     
     fCount=0
 
-    for inpName in inpFiles:
-        fHandler = Actions.FileHandler(inpName)
-       
-        for namespace in args.namespace:
-            pointsCopied = fHandler.Copy_Id(namespace,args.id,args.newNamespace,args.newId)
-
-        targetFn = GetTargetFileName(inpName,g_args.output)
-        fHandler.writeFile(targetFn,g_args.overwrite)
+    for inpName,pointsCopied in ProcessInputFiles(args.namespace,copyIdFn,args):
         Log.getLogger().info("{} dataponts copied in {}".format(pointsCopied,inpName))
         totalCopiedPoints+=pointsCopied
 
@@ -278,11 +363,211 @@ def copyId(args):
     Log.getLogger().info("Copied {} datapoints in {} files".format(totalCopiedPoints,fCount))
 
 
-def AddActionParserToList(dataList,actionString,parser,fn=None):
+# the steps of a pipeline, from --step and/or the --script file (one step a line, # for comments)
+def ReadSteps(stepList,scriptFile):
+    steps = []
+    if None != stepList:
+        steps.extend(stepList)
+
+    if None != scriptFile:
+        if not existFile(scriptFile):
+            return None
+
+        with open(scriptFile,"rt") as script:
+            for line in script:
+                line = line.strip()
+                if len(line) > 0 and not line.startswith("#"):
+                    steps.append(line)
+
+    return steps
+
+# finds the action for a step like 'rename id -n ns --id foo -new bar' and parses its
+# arguments, returns (step,applyMaker,args) or None if it is not an action that can be a step
+def ParseStep(step,actionList):
+    argList = shlex.split(step)
+    argObj = None
+    while len(argList) > 0 and isinstance(actionList,list):
+        matching = [action for action in actionList if action.getAction() == argList[0]]
+        if len(matching) < 1:
+            break
+
+        argObj = matching[0]
+        actionList = argObj.getActionList()
+        argList = argList[1:]
+
+    if None == argObj or None == argObj.getParser() or None == argObj.getApplyFn():
+        Log.getLogger().error("Not an action that can be a pipeline step or planned: " + step)
+        return None
+
+    return (step,argObj.getApplyFn(),argObj.getParser().parse_args(argList))
+
+# the work a pipeline does on one file, steps is [(applyMaker,args)]
+def pipelineFn(steps):
+    applyFns = [applyMaker(args) for applyMaker,args in steps]
+    def applyFn(fHandler):
+        return tuple(stepFn(fHandler) for stepFn in applyFns)
+
+    return applyFn
+
+# does every step, in order, to each input file with one load and one write of it
+def runPipeline(steps):
+    namespaces = []
+    for step,applyMaker,args in steps:
+        namespaces.extend(args.namespace)
+
+    totals = None
+    fCount=0
+    for inpName,results in ProcessInputFiles(namespaces,pipelineFn,[(applyMaker,args) for step,applyMaker,args in steps]):
+        if None == results: # wasn't written
+            continue
+
+        fCount +=1
+        for (step,applyMaker,args),result in zip(steps,results):
+            Log.getLogger().info("{}: [{}] {}".format(inpName,step,result))
+        totals = Actions.AddResults(totals,results)
+
+    if None == totals:
+        totals = (0,) * len(steps)
+
+    for (step,applyMaker,args),total in zip(steps,totals):
+        Log.getLogger().info("[{}] {} in {} files".format(step,total,fCount))
+
+# dry run of the steps, from the index of each input file only, nothing is written
+def planPipeline(steps):
+    filePeaks = []
+    outputSize = 0
+    for inpName in GlobInputFiles(g_args.input):
+        estimate = Planner.FileEstimate(inpName,g_args.columnar)
+        estimate.Load()
+        for step,applyMaker,args in steps:
+            estimate.Do(step,applyMaker(args))
+        estimate.Print()
+
+        peak = estimate.PeakMemory()
+        if None != g_memLimit: # is done in chunks
+            peak = min(peak,g_memLimit // g_args.jobs)
+        filePeaks.append(peak)
+        outputSize += estimate.OutputSize()
+
+    # with --jobs the biggest ones could all be loaded at once
+    peakMemory = sum(sorted(filePeaks,reverse=True)[:g_args.jobs])
+    print("Output about {} in {} files, peak memory about {}".format(Planner.FormatSize(outputSize),len(filePeaks),Planner.FormatSize(peakMemory)))
+
+# the jobs of a manifest file, a list of {"input": glob, "output": target, "steps": [steps]}
+# or an object with that list as "jobs".  Returns [(input,output,steps)], None if is not valid
+def ReadManifest(fileName):
+    if not existFile(fileName):
+        return None
+
+    try:
+        with open(fileName,"rt") as manifestFile:
+            manifest = json.load(manifestFile)
+
+    except ValueError as ex:
+        Log.getLogger().error("Invalid manifest " + fileName + ": " + str(ex))
+        return None
+
+    if isinstance(manifest,dict):
+        manifest = manifest.get("jobs")
+
+    if not isinstance(manifest,list):
+        Log.getLogger().error("Invalid manifest " + fileName + ": needs a list of jobs")
+        return None
+
+    jobs = []
+    for job in manifest:
+        if not isinstance(job,dict) or not "input" in job or not "output" in job or not isinstance(job.get("steps"),list):
+            Log.getLogger().error("Invalid manifest " + fileName + ": each job needs input, output and a list of steps - " + str(job))
+            return None
+
+        jobs.append((job["input"],job["output"],job["steps"]))
+
+    return jobs
+
+# does every job of a manifest in this process, a file is loaded once even if more
+# than one job works on it (unless --memlimit, then each is done in chunks)
+def runManifest(jobs,actionList):
+    pipelines = [[ParseStep(step,actionList) for step in steps] for inpGlob,output,steps in jobs]
+    for pipeline in pipelines:
+        if None in pipeline:
+            return False
+
+    uses = {}
+    for inpGlob,output,steps in jobs:
+        for inpName in GlobInputFiles(inpGlob):
+            key = os.path.abspath(inpName)
+            uses[key] = uses.get(key,0) + 1
+
+    global g_loadCache
+    if None == g_memLimit and not g_args.plan:
+        g_loadCache = Actions.LoadCache(GetHandlerClass(g_args.columnar),uses)
+
+    for jobNumber,((inpGlob,output,steps),pipeline) in enumerate(zip(jobs,pipelines)):
+        Log.getLogger().info("Manifest job {}: {} -> {}".format(jobNumber + 1,inpGlob,output))
+        g_args.input = inpGlob
+        g_args.output = output
+        if g_args.plan:
+            planPipeline(pipeline)
+        else:
+            runPipeline(pipeline)
+
+    g_loadCache = None
+    return True
+
+
+def listNamespace(args):
+    namespacePatterns = Matcher.PatternSet(args.namespace)
+    for inpName in GlobInputFiles(g_args.input):
+        index = BiffIndex.GetIndex(inpName)
+        startTime,endTime = index.TimeRange()
+        print("{}: {} entries, {} datapoints, {} namespaces, time {} to {}".format(inpName,index.EntryCount,index.SampleCount,len(index.Namespaces()),FormatTime(startTime),FormatTime(endTime)))
+
+        for namespace in index.Namespaces():
+            if not namespacePatterns.Matches(namespace):
+                continue
+
+            info = index.NamespaceInfo(namespace)
+            print("  {}: {} datapoints, {} IDs, time {} to {}".format(namespace,info.SampleCount,len(index.IDs(namespace)),FormatTime(info.MinTime),FormatTime(info.MaxTime)))
+
+def listId(args):
+    idPatterns = Matcher.PatternSet(args.id)
+    for inpName in GlobInputFiles(g_args.input):
+        index = BiffIndex.GetIndex(inpName)
+        print(inpName)
+        for pattern in args.namespace:
+            for namespace in index.getMatchingNamespacesNameList(pattern):
+                print("  " + namespace)
+                for info in index.IDs(namespace):
+                    if idPatterns.Matches(info.Name):
+                        print("    {}: {} datapoints, time {} to {}".format(info.Name,info.SampleCount,FormatTime(info.MinTime),FormatTime(info.MaxTime)))
+
+
+def convertFiles(inpFiles,columnar):
+    fCount=0
+    for inpName in inpFiles:
+        targetFn = GetTargetFileName(inpName,g_args.output)
+        if not Actions.OkToWrite(targetFn,g_args.overwrite):
+            continue
+
+        writtenCount = BiffStream.WriteEntries(targetFn,BiffStream.ReadEntries(inpName),columnar)
+        Log.getLogger().info("Converted {} to {} - {} entries".format(inpName,targetFn,writtenCount))
+        fCount +=1
+
+    Log.getLogger().info("Converted {} files".format(fCount))
+
+def convertToColumnar(args):
+    convertFiles(GlobInputFiles(g_args.input),True)
+
+def convertToBiff(args):
+    convertFiles(GlobInputFiles(g_args.input),False)
+
+
+def AddActionParserToList(dataList,actionString,parser,fn=None,applyFn=None):
     newObj = ArgObject()
     newObj._action = actionString
     newObj._parser = parser
     newObj._workerFn = fn
+    newObj._applyFn = applyFn
 
     dataList.append(newObj)
 
@@ -297,13 +582,13 @@ def SetupActions():
     More than one namespace can be specified''')
     parser.add_argument("-n","--namespace",help="namespace to delete", nargs="+", type=str,required=True)
 
-    AddActionParserToList(actionDeleteList,"namespace",parser,deleteNamespace)
+    AddActionParserToList(actionDeleteList,"namespace",parser,deleteNamespace,deleteNamespaceFn)
 
     parser = argparse.ArgumentParser(description='delete id',add_help=True,usage='''delete id -n namesspace -id id
       wildcard allowed for namespace and id''')
     parser.add_argument("-n","--namespace",type=str,required=True,nargs="+")
     parser.add_argument("--id",type=str,required=True,nargs="+")
-    AddActionParserToList(actionDeleteList,"id",parser,deleteId)
+    AddActionParserToList(actionDeleteList,"id",parser,deleteId,deleteIdFn)
 
     AddActionParserToList(actionList,"delete",actionDeleteList)
 
@@ -313,14 +598,14 @@ def SetupActions():
     More than one namespace can be specified and wildcards''')
     parser.add_argument("-n","--namespace",type=str,required=True,nargs="+")
     parser.add_argument("-new",type=str,required=True)
-    AddActionParserToList(actionRenameList,"namespace",parser,renameNamespace)
+    AddActionParserToList(actionRenameList,"namespace",parser,renameNamespace,renameNamespaceFn)
 
     parser = argparse.ArgumentParser(description='rename id',add_help=True,usage='''rename id -n namesspace -id --new id
     More than one namespace can be specified and wildcards are valid for both hamespace and id''')
     parser.add_argument("-n","--namespace",type=str,required=True,nargs="+")
     parser.add_argument("--id",type=str,required=True,nargs="+")
     parser.add_argument("-new",type=str,required=True)
-    AddActionParserToList(actionRenameList,"id",parser,renameId)
+    AddActionParserToList(actionRenameList,"id",parser,renameId,renameIdFn)
 
     AddActionParserToList(actionList,"rename",actionRenameList)
 
@@ -330,7 +615,7 @@ def SetupActions():
     More than one namespace can be specified and wildcards''')
     parser.add_argument("-n","--namespace",type=str,required=True,nargs="+")
     parser.add_argument("-new",type=str,required=True)
-    AddActionParserToList(actionCopyList,"namespace",parser,copyNamespace)
+    AddActionParserToList(actionCopyList,"namespace",parser,copyNamespace,copyNamespaceFn)
 
     parser = argparse.ArgumentParser(description='copy specified id to another id',add_help=True,usage='''copy id -n namespace -id id --newNamespace namespace --newId id
     More than one namespace can be specified and wildcards are valid for both hamespace and id''')
@@ -338,7 +623,7 @@ def SetupActions():
     parser.add_argument("--id",type=str,required=True,nargs="+")
     parser.add_argument("--newNamespace",type=str,default="*")
     parser.add_argument("--newId",type=str,required=True)
-    AddActionParserToList(actionCopyList,"id",parser,copyId)
+    AddActionParserToList(actionCopyList,"id",parser,copyId,copyIdFn)
 
     AddActionParserToList(actionList,"copy",actionCopyList)
 
@@ -351,7 +636,7 @@ def SetupActions():
     parser.add_argument("--id",type=str,required=True,nargs="+")
     parser.add_argument("--max",type=float)
     parser.add_argument("--min",type=float)
-    AddActionParserToList(actionBoundList,"id",parser,boundId)
+    AddActionParserToList(actionBoundList,"id",parser,boundId,boundIdFn)
 
     AddActionParserToList(actionList,"bound",actionBoundList)
 
@@ -363,10 +648,39 @@ def SetupActions():
     parser.add_argument("-n","--namespace",type=str,required=True,nargs="+")
     parser.add_argument("--id",type=str,required=True,nargs="+")
     parser.add_argument("--delta",type=float)
-    AddActionParserToList(actionBoundList,"id",parser,deltaId)
+    AddActionParserToList(actionBoundList,"id",parser,deltaId,deltaIdFn)
 
     AddActionParserToList(actionList,"delta",actionBoundList)
 
+    ### CONVERT ###
+
+    actionConvertList=[]
+    parser = argparse.ArgumentParser(description='convert to columnar',add_help=True,usage='''convert columnar
+      writes the input file(s) in the FUDD columnar ('''+ ColumnarFile.COLUMNAR_EXTENSION + ''') format''')
+    AddActionParserToList(actionConvertList,"columnar",parser,convertToColumnar)
+
+    parser = argparse.ArgumentParser(description='convert to biff',add_help=True,usage='''convert biff
+      writes the input file(s) as pickled BIFF save files''')
+    AddActionParserToList(actionConvertList,"biff",parser,convertToBiff)
+
+    AddActionParserToList(actionList,"convert",actionConvertList)
+
+    ### LIST ###
+
+    actionListList=[]
+    parser = argparse.ArgumentParser(description='list namespaces',add_help=True,usage='''list namespace [-n namespace]
+      wildcard allowed for namespace, uses the file index so does not load the file''')
+    parser.add_argument("-n","--namespace",type=str,default=["*"],nargs="+")
+    AddActionParserToList(actionListList,"namespace",parser,listNamespace)
+
+    parser = argparse.ArgumentParser(description='list ids',add_help=True,usage='''list id [-n namespace] [--id id]
+      wildcard allowed for namespace and id, uses the file index so does not load the file''')
+    parser.add_argument("-n","--namespace",type=str,default=["*"],nargs="+")
+    parser.add_argument("--id",type=str,default=["*"],nargs="+")
+    AddActionParserToList(actionListList,"id",parser,listId)
+
+    AddActionParserToList(actionList,"list",actionListList)
+
 
     return foo.getActionStrings(), foo
 
@@ -411,15 +725,22 @@ def HandleCommandlineArguments():
     firstLevelActionNames,firstLevelActions=SetupActions()
     parser = argparse.ArgumentParser(description='FUDD the Elmer',add_help=False)
 
-    parser.add_argument("-i","--input",help='specifies input file(s), wildcards allowed',type=str,required=True)
-    parser.add_argument("-o","--output",help='specifies file to generate, wildcards allowed in most cases',type=str,required=True)
-    parser.add_argument('-a','--action', help='action to perform', required=True,
+    parser.add_argument("-i","--input",help='specifies input file(s), wildcards allowed (not needed with --manifest)',type=str)
+    parser.add_argument("-o","--output",help='specifies file to generate, wildcards allowed in most cases (not needed for list)',type=str)
+    parser.add_argument('-a','--action', help='action to perform (or use --step/--script)',
                         nargs="?",
                         choices=firstLevelActionNames,
                         )
 
 
+    parser.add_argument("-s","--step",help='an action to do as a step of a pipeline, like "delete id -n ns --id foo", can be given more than once',type=str,action="append")
+    parser.add_argument("--script",help='file of pipeline steps, one per line',type=str)
+    parser.add_argument("--manifest",help='JSON file of jobs, each with input, output and steps, all done in one go',type=str)
+    parser.add_argument("-p","--plan",help='only print what each step is expected to do, output size and memory, nothing is written',action="store_true")
     parser.add_argument("-y","--overwrite",help="will not prompt if overwriting target",action="store_true")
+    parser.add_argument("-c","--columnar",help="hold datapoints in columnar arrays, uses far less memory",action="store_true")
+    parser.add_argument("-j","--jobs",help="number of input files to do at once, each in its own process (0 is one per CPU)",type=int,default=1)
+    parser.add_argument("-m","--memlimit",help="memory to use (like 4G), bigger files are done in chunks using temporary files",type=str)
     parser.add_argument("-l","--logfile",help='specifies log file name',type=str)
     parser.add_argument("-v","--verbose",help="prints debug information",action="store_true")
     parser.add_argument('-h','--help', action='store_true')
@@ -429,7 +750,7 @@ def HandleCommandlineArguments():
         g_args,sub_args = parser.parse_known_args()
 
         # Manually handle help
-        if len(sub_args) < 1:
+        if len(sub_args) < 1 and None == g_args.step and None == g_args.script and None == g_args.manifest:
                 print(parser.format_help())
                 sys.exit(1)
             # Otherwise pass the help option on to the subcommand
@@ -440,6 +761,48 @@ def HandleCommandlineArguments():
     except:
        return False
 
+    if g_args.jobs < 0:
+        print("Invalid --jobs: " + str(g_args.jobs))
+        return False
+
+    if 0 == g_args.jobs:
+        g_args.jobs = os.cpu_count() or 1
+
+    if None != g_args.memlimit:
+        global g_memLimit
+        g_memLimit = ExternalSort.ParseSize(g_args.memlimit)
+        if None == g_memLimit:
+            print("Invalid --memlimit: " + g_args.memlimit)
+            return False
+
+    steps = ReadSteps(g_args.step,g_args.script)
+    if None == steps:
+        return False
+
+    if None != g_args.manifest:
+        if None != g_args.action or len(steps) > 0 or None != g_args.input:
+            print(parser.format_usage() + "error: --manifest has the inputs and steps, -i, -a, -s and --script can not be used with it")
+            return False
+
+    elif None == g_args.input:
+        print(parser.format_usage() + "error: the following arguments are required: -i/--input")
+        return False
+
+    elif None == g_args.action and len(steps) < 1:
+        print(parser.format_usage() + "error: one of -a/--action, -s/--step, --script or --manifest is required")
+        return False
+
+    if None != g_args.action and len(steps) > 0:
+        print(parser.format_usage() + "error: -a/--action can not be used with -s/--step or --script")
+        return False
+
+    if g_args.plan and None != g_args.action: # planned like a one step pipeline
+        steps = [shlex.join([g_args.action] + sub_args)]
+
+    if None == g_args.output and "list" != g_args.action and not g_args.plan and None == g_args.manifest:
+        print(parser.format_usage() + "error: the following arguments are required: -o/--output")
+        return False
+
     if None != g_args.logfile:
        Log.setLogfile(g_args.logfile)
 
@@ -449,6 +812,31 @@ def HandleCommandlineArguments():
     else:
         Log.setLevel(logging.INFO)
 
+    if None != g_args.manifest:
+        jobs = ReadManifest(g_args.manifest)
+        if None == jobs:
+            return False
+
+        try:
+            return runManifest(jobs,firstLevelActions.getActionList())
+        except Exception as Ex:
+            Log.getLogger().error(str(Ex))
+        return True
+
+    if len(steps) > 0:
+        pipeline = [ParseStep(step,firstLevelActions.getActionList()) for step in steps]
+        if None in pipeline:
+            return False
+
+        try:
+            if g_args.plan:
+                planPipeline(pipeline)
+            else:
+                runPipeline(pipeline)
+        except Exception as Ex:
+            Log.getLogger().error(str(Ex))
+        return True
+
     parseAndRunAction(g_args.action,firstLevelActions.getActionList(),sub_args)
     
 
@@ -1,123 +1,182 @@
 from os.path import exists
+from os.path import samefile
+from os.path import abspath
 import pickle
-import copy
-import fnmatch
+import heapq
+import shutil
 
 from Helpers import Log
+from Helpers import Matcher
+from Helpers import BiffStream
+from Helpers import BiffIndex
+from Helpers import Merge
+from Helpers import ExternalSort
+from Helpers import IdIndex
+from Helpers import Transforms
+from Helpers import CopyOnWrite
 from Data import MarvinGroupData
+from Data import ColumnarData
 
-def Matches(name,pattern):
-    return fnmatch.fnmatch(name.upper(),pattern.upper())
+Matches = Matcher.Matches
 
 def HandleWildcardUpdate(inpString,pattern):
     return pattern.replace('*',inpString)
 
 
 def mergeLists(srcList,listToMerge):
-    if srcList == None:
-        return list(listToMerge)
+    return Merge.MergeLists(srcList,listToMerge)
 
-    if len(srcList) == 0:
-        return list(listToMerge)
 
-    srcList.extend(listToMerge)
+def _ranked(rank,entries):
+    for entry in entries:
+        yield (rank,entry)
 
-    mergedList = sorted(srcList,key=lambda entry: entry.ArrivalTime)
+def _rankedKey(rankedEntry):
+    return (rankedEntry[1].ArrivalTime,rankedEntry[0])
 
-    return mergedList
+# adds up what the action functions return, which is a count or tuple of counts (or of
+# results, for a pipeline of actions).  A set of names is joined, so one found in more
+# than one chunk of a file is only counted once
+def AddResults(total,result):
+    if None == total:
+        return result
 
-def BoundValue(entry,min,max):
-    retVal = False
-    if None == min and None == max:
-        Log.getLogger().error("Invalid <Namespace> - BoundID without Min or Max value specified.")
-        raise pickle.UnpicklingError()
+    if isinstance(result,tuple):
+        return tuple(AddResults(totalItem,item) for totalItem,item in zip(total,result))
 
-    try:
-        float(entry.Value)
-    except:
-        Log.getLogger().info("Invalid <Namespace> - BoundID tried to bound non numeric data point, ID="+entry.ID)
-        return
+    if isinstance(result,set):
+        return total | result
 
-    #entry.Value = "{:.2f}".format(float(entry.Value))
-    #entry.Value = float(entry.Value)
+    return total + result
 
-    if None != min:
-        try:
-            min = float(min)
-            if float(entry.Value) < min:
-                #entry.Value = "{:.2f}".format(min)
-                entry.Value = str(min)
-                retVal = True
-        except:
-            Log.getLogger().error("Invalid <Namespace> - Min BoundID value of " + min +" is invalid.")
-            raise pickle.UnpicklingError()
-
-    if None != max:
-        try:
-            max = float(max)
-            if float(entry.Value) > max:
-                #entry.Value = "{:.2f}".format(max)
-                entry.Value = str(max)
-                retVal = True
-        except:
-            Log.getLogger().error("Invalid <Namespace> - Max BoundID value of " + max +" is invalid.")
-            raise pickle.UnpicklingError()
+# what an action function returned for a whole file, with the sets of names made into counts
+def CountResults(result):
+    if isinstance(result,tuple):
+        return tuple(CountResults(item) for item in result)
 
-    return retVal
+    if isinstance(result,set):
+        return len(result)
 
-def DeltaValue(entry,delta):
-    retVal = False
-    try:
-        float(entry.Value)
-    except:
-        Log.getLogger().info("Invalid <Namespace> - BoundID tried to bound non numeric data point, ID="+entry.ID)
-        return
+    return result
 
 
-    if None != delta:
-        try:
-            delta = float(delta)
-            entry.Value = str(float(entry.Value) + delta)
-            retVal = True
-        except:
-            Log.getLogger().error("Invalid <Namespace> - delta  value of " + delta +" is invalid.")
-            raise pickle.UnpicklingError()
+# asks before overwriting outfile, unless overWrite
+def OkToWrite(outfile,overWrite):
+    if False == overWrite and exists(outfile):
+        overwrite = input('{} already exists. Overwrite? Y = yes, N = no\n'.format(outfile))
+        if overwrite.lower() == 'y':                
+            pass
+        else:
+            Log.getLogger().warn("Skipping writing to file {}".format(outfile))
+            return False
 
-    return retVal    
+    return True
 
 
 class FileHandler(object):
-    def __init__(self,inpFname):
+    # namespaces is the list of namespace patterns the actions will work on, if the
+    # file's index says none of them are in the file it is not loaded at all.
+    # entries (with namespaceOrder) gives the entries to use rather than loading the file
+    def __init__(self,inpFname,namespaces=None,entries=None,namespaceOrder=()):
         self._sourceFile = inpFname
+        self._unchanged = False
+        if None != entries:
+            self.createNamespaceMap(entries,namespaceOrder)
+            return
+
         Log.getLogger().info("Processing " + self._sourceFile)
-        with open(self._sourceFile,'rb') as fp:
-            try:
-                self._entries = pickle.load(fp)
-                
-            except pickle.UnpicklingError as ex:
-                Log.getLogger().error("Invlid BIFF save file specified: " + self._sourceFile)
-                raise
+        index = BiffIndex.ReadIndex(self._sourceFile) # only if there is one, isn't worth reading the file for
+        if None != namespaces and None != index and not self._hasNamespaces(namespaces,index):
+            Log.getLogger().info("{} has no matching namespaces, not loading it".format(self._sourceFile))
+            self._unchanged = True
+            self.createNamespaceMap([])
+            return
 
-        entryCount = self.createNamespaceMap()
+        entries = BiffStream.ReadEntries(self._sourceFile,compact=True)
+        if None == index: # made from what is loaded, for next time
+            entries = BiffIndex.IndexEntries(self._sourceFile,entries)
+
+        try:
+            entryCount = self.createNamespaceMap(entries)
+
+        except pickle.UnpicklingError as ex:
+            Log.getLogger().error("Invlid BIFF save file specified: " + self._sourceFile)
+            raise
 
 #        Log.getLogger().info(self._sourceFile + " contains " + str(len(self._namespaceMap)) + " namespaces and " + str(entryCount) + " datapoints.")
 
-    def getMatchingNamespacesNameList(self,pattern):
-        retList=[]
-        for namespaceName in self._namespaceMap:
-            if Matches(namespaceName,pattern):
-                retList.append(namespaceName)
-        
-        return retList
+    # True if the file has a namespace matching one of namespaces, by index (which is
+    # created if the file doesn't have one yet)
+    def _hasNamespaces(self,namespaces,index=None):
+        try:
+            if None == index:
+                index = BiffIndex.GetIndex(self._sourceFile)
+
+        except pickle.UnpicklingError:
+            return True # let the load report it
+
+        for pattern in namespaces:
+            if len(index.getMatchingNamespacesNameList(pattern)) > 0:
+                return True
 
+        return False
 
-    def createNamespaceMap(self):
+    # pattern can be one pattern or a list of them, each namespace is in the list once
+    def getMatchingNamespacesNameList(self,pattern):
+        if isinstance(pattern,str):
+            return [namespaceName for namespaceName in self._namespaceMap if Matches(namespaceName,pattern)]
+
+        return Matcher.PatternSet(pattern).Filter(self._namespaceMap)
+
+    # logs the pattern(s) in pattern that match no namespace
+    def _logMissingNamespaces(self,pattern):
+        patterns = [pattern] if isinstance(pattern,str) else pattern
+        missing = [name for name in patterns if len(self.getMatchingNamespacesNameList(name)) < 1]
+        if len(missing) > 0:
+            Log.getLogger().error("Namespace: {} does not exist".format(", ".join(missing)))
+
+
+    # index of the IDs in a namespace, built when first needed and again if the
+    # namespace has been given a new list
+    def _getIdIndex(self,namespace):
+        entries = self._namespaceMap[namespace]
+        index = self._idIndexMap.get(namespace)
+        if None == index or not index.IsFor(entries):
+            index = IdIndex.IdIndex(entries)
+            self._idIndexMap[namespace] = index
+
+        return index
+
+    # copies the datapoints of a namespace that are about to be changed (those with one of
+    # IDs, or all of them) if they are shared with another namespace
+    def _makeWritable(self,namespace,IDs=None):
+        entries = self._namespaceMap[namespace]
+        newEntries = self._shared.MakeWritable(namespace,entries,IDs)
+        if not newEntries is entries:
+            self._namespaceMap[namespace] = newEntries
+
+    # the datapoints with an ID matchFn() is True for, ready to be changed
+    def _writableSamples(self,namespace,matchFn):
+        IDs = self._getIdIndex(namespace).MatchingIDs(matchFn)
+        self._makeWritable(namespace,set(IDs))
+        return self._getIdIndex(namespace).Samples(IDs)
+
+    # the entries of each namespace, to be written out
+    def _outputLists(self):
+        return [self._shared.OutputEntries(namespace,entries) for namespace,entries in self._namespaceMap.items()]
+
+    # namespaceOrder are namespaces to create (empty) up front, so they are in that order
+    def createNamespaceMap(self,entries,namespaceOrder=()):
         self._namespaceMap = {}
+        self._idIndexMap = {}
+        self._shared = CopyOnWrite.SharedNamespaces()
+        for namespace in namespaceOrder:
+            self._namespaceMap[namespace] = []
         entryCount = 0
 
         startTime = None
 
-        for entry in self._entries:
+        for entry in entries:
             namespace = entry.Namespace
             if isinstance(entry,MarvinGroupData.MarvinDataGroup):
                 namespace=entry._DataList[0].Namespace
@@ -133,11 +192,18 @@ class FileHandler(object):
             
         return entryCount
 
+    # a handler with the same datapoints that can be changed without changing this one (or
+    # this one without changing it), datapoints are only copied once they are changed
+    def Clone(self):
+        clone = self.__class__(self._sourceFile,entries=[])
+        clone._unchanged = self._unchanged
+        clone._namespaceMap = dict((namespace,list(entries)) for namespace,entries in self._namespaceMap.items())
+        clone._shared = self._shared.Clone(self._namespaceMap)
+        return clone
+
     # retuns the final list of all the namespaces for this file after all the manipulations
     def createMergedList(self,offsetTime=0):
-        resultList=None
-        for namespace in self._namespaceMap:
-                resultList = mergeLists(resultList,self._namespaceMap[namespace])
+        resultList = list(Merge.MergeNamespaces(self._outputLists()))
 
         if offsetTime > 0:
             for entry in resultList:
@@ -146,48 +212,46 @@ class FileHandler(object):
         return resultList
 
 
+    # generator of the same entries as createMergedList(), without building the list
+    def iterMergedList(self):
+        return Merge.MergeNamespaces(self._outputLists())
+
+    # generator of (namespace number,entry) in time order, for ties the one from the earlier namespace first
+    def iterRankedList(self):
+        return heapq.merge(*[_ranked(rank,Merge.TimeOrdered(entries)) for rank,entries in enumerate(self._outputLists())],key=_rankedKey)
+
     def writeFile(self,outfile,overWrite):
-        if False == overWrite and exists(outfile):
-            overwrite = input('{} already exists. Overwrite? Y = yes, N = no\n'.format(outfile))
-            if overwrite.lower() == 'y':                
-                pass
-            else:
-                Log.getLogger().warn("Skipping writing to file {}".format(outfile))
+        if not OkToWrite(outfile,overWrite):
+            return
+
+        if self._unchanged: # nothing was touched, so target can be a copy of the source
+            if BiffStream.IsWrittenAs(self._sourceFile,outfile):
+                if exists(outfile) and samefile(self._sourceFile,outfile):
+                    return
+
+                with open(self._sourceFile,'rb') as source, BiffStream.AtomicOutput(outfile) as target:
+                    shutil.copyfileobj(source,target)
+                Log.getLogger().info("New file [" + outfile + "] copied from " + self._sourceFile)
                 return
 
-        resultList = self.createMergedList()
+            # is another format (or not in order), so has to be loaded after all
+            self.createNamespaceMap(BiffStream.ReadEntries(self._sourceFile,compact=True))
+            self._unchanged = False
+
         try:
-            with open(outfile,'w+b') as fp:
-               pickle.dump(resultList, fp, pickle.DEFAULT_PROTOCOL)
+            writtenCount = BiffStream.WriteEntries(outfile,self.iterMergedList())
 
-            Log.getLogger().info("New file [" + outfile + "] created with " + str(len(resultList)) + " entries.")
+            Log.getLogger().info("New file [" + outfile + "] created with " + str(writtenCount) + " entries.")
         except Exception as ex:
             print(str(ex))
             return False
 
-    # renames a namespace
-    def Rename_Namespace(self,origName,newName):
-        if newName in self._namespaceMap:
-            Log.getLogger().error("<Namespace> rename failed - namespace " + newName + "already exists")
-            raise pickle.UnpicklingError()
-
-        for entry in self._namespaceMap[origName]:  # go through each entry and update namespace
-            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                for subEntry in entry._DataList:
-                    subEntry.Namespace = newName
-            else:
-                entry.Namespace = newName
-
-
-        #self._namespaceMap[newName] = self._namespaceMap.pop(origName)
-
-        Log.getLogger().info("Renamed Namespace {} to {}".format(origName,newName))
-
     def Delete_Namespace(self,namespaceName):
         namespaces = self.getMatchingNamespacesNameList(namespaceName)
         if len(namespaces) > 0:
             for namespace in namespaces:
                 del(self._namespaceMap[namespace])
+                self._shared.Forget(namespace)
                 Log.getLogger().info("Namespace: {} has been deleted".format(namespace))
 
         else:
@@ -199,42 +263,46 @@ class FileHandler(object):
         namespaces = self.getMatchingNamespacesNameList(namespaceName)
         
         totalRemovedCount = 0
-        if not isinstance(ids,list):
-            ids = [ids]
+        idPatterns = Matcher.PatternSet(ids)
 
         if len(namespaces) > 0:
             for namespace in namespaces:
+                index = self._getIdIndex(namespace)
+                deleteIDs = set(index.MatchingIDs(idPatterns.Matches))
+                if 0 == len(deleteIDs):
+                    continue
+
+                self._makeWritable(namespace,deleteIDs)
                 newList = []
                 removedCount = 0
 
                 for entry in self._namespaceMap[namespace]:
-                    for id in ids:
-                        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                            subList=[]
-                            for subEntry in entry._DataList:
-                                if Matches(subEntry,id):
-                                    subList.append(subEntry)
-                                else:
-                                    removedCount += 1
-
-                            if len(subList) != len(entry._DataList):
-                                entry._DataList = subList
+                    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+                        subList=[]
+                        for subEntry in entry._DataList:
+                            if not subEntry.ID in deleteIDs:
+                                subList.append(subEntry)
+                            else:
+                                removedCount += 1
 
-                            newList.append(entry)
+                        if len(subList) != len(entry._DataList):
+                            entry._DataList = subList
 
+                        newList.append(entry)
+
+                    else:
+                        if not entry.ID in deleteIDs:
+                            newList.append(entry)
                         else:
-                            if not Matches(entry.ID,id):
-                                newList.append(entry)
-                            else:
-                                removedCount += 1
+                            removedCount += 1
 
                 if removedCount > 0:
                     self._namespaceMap[namespace] = newList
+                    index.Remove(deleteIDs,newList)
 
                 totalRemovedCount += removedCount
 
-        else:
-            Log.getLogger().error("Namespace: {} does not exist".format(namespaceName))
+        self._logMissingNamespaces(namespaceName)
 
         return totalRemovedCount
 
@@ -242,46 +310,40 @@ class FileHandler(object):
         namespaces = self.getMatchingNamespacesNameList(origName)
 
         for namespace in namespaces:
-            newNamespaceName = HandleWildcardUpdate(namespace,newName)
-            for entry in self._namespaceMap[namespace]:  # go through each entry and update namespace
-                if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                    for subEntry in entry._DataList:
-                        subEntry.Namespace = newNamespaceName
-                else:
-                    entry.Namespace = newNamespaceName
+            self._renameNamespace(namespace,HandleWildcardUpdate(namespace,newName))
 
         return len(namespaces)
 
+    # the datapoints keep the old name until they are written out.  If there already is a
+    # namespace by the new name this one stays where it is, but still gets the new name
+    def _renameNamespace(self,namespace,newNamespaceName):
+        key = namespace
+        if not newNamespaceName in self._namespaceMap:
+            CopyOnWrite.RenameKey(self._namespaceMap,namespace,newNamespaceName)
+            if namespace in self._idIndexMap:
+                self._idIndexMap[newNamespaceName] = self._idIndexMap.pop(namespace)
+            key = newNamespaceName
+
+        self._shared.Rename(namespace,newNamespaceName,key)
+
 
+    # returns (datapoints renamed, set of the new IDs in lower case), see CountResults()
     def Rename_Id(self,namespaces,ids,newName):
         changedCount = 0
         idFoundMap={}
-        if not isinstance(ids,list):
-            ids = [ids]
+        idPatterns = Matcher.PatternSet(ids)
         namespaces = self.getMatchingNamespacesNameList(namespaces)
         for namespace in namespaces:
-            for searchId in ids:
-                for entry in self._namespaceMap[namespace]:
-                    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                        for subEntry in entry._DataList:
-                            if Matches(subEntry.ID,searchId):
-                                NewID =  HandleWildcardUpdate(subEntry.ID,newName)
-                                subEntry.ID = NewID
-                                changedCount += 1
-                                NewID= NewID.lower()
-                                if NewID not in idFoundMap:
-                                    idFoundMap[NewID] = NewID
-
-
-                    elif Matches(entry.ID.lower(),searchId):
-                        NewID =  HandleWildcardUpdate(entry.ID,newName)
-                        entry.ID = NewID
-                        changedCount += 1
-                        NewID= NewID.lower()
-                        if NewID not in idFoundMap:
-                            idFoundMap[NewID] = NewID
+            matchedIDs = self._getIdIndex(namespace).MatchingIDs(idPatterns.Matches)
+            self._makeWritable(namespace,set(matchedIDs))
+            renamed = self._getIdIndex(namespace).Rename(matchedIDs,lambda ID: HandleWildcardUpdate(ID,newName))
+            for NewID,count in renamed:
+                changedCount += count
+                NewID= NewID.lower()
+                if NewID not in idFoundMap:
+                    idFoundMap[NewID] = NewID
 
-        return (changedCount,len(idFoundMap))
+        return (changedCount,set(idFoundMap))
 
     def Copy_Namespace(self,origName,newName):
         namespaces = self.getMatchingNamespacesNameList(origName)
@@ -289,45 +351,37 @@ class FileHandler(object):
 
         for namespace in namespaces:
             newNamespaceName = HandleWildcardUpdate(namespace,newName)
-            if newNamespaceName in self._namespaceMap[namespace]:
+            if newNamespaceName in self._namespaceMap:
                 Log.getLogger().error("Cannot copy namespace {} to {} - it already exists".format(namespace,newNamespaceName))
 
             else:
                 copiedCount+=1
-                self._namespaceMap[newNamespaceName] = copy.deepcopy(self._namespaceMap[namespace])
-                for entry in self._namespaceMap[newNamespaceName]:
-                    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                        for subEntry in entry._DataList:
-                            subEntry.Namespace = newNamespaceName
-                    else:
-                        entry.Namespace = newNamespaceName
+                self._namespaceMap[newNamespaceName] = list(self._namespaceMap[namespace])
+                self._shared.Share(namespace,newNamespaceName)
 
         return copiedCount
 
     def Copy_Id(self,namespaces,ids,newNs,newId):
         changedCount = 0
         
-        if not isinstance(ids,list):
-            ids = [ids]
+        idPatterns = Matcher.PatternSet(ids)
         namespaces = self.getMatchingNamespacesNameList(namespaces)
         for namespace in namespaces:
             temporaryNS=[]
             NewNS =  HandleWildcardUpdate(namespace,newNs)
-            for searchId in ids:
+            matchedIDs = set(self._getIdIndex(namespace).MatchingIDs(idPatterns.Matches))
+            if len(matchedIDs) > 0:
                 for entry in self._namespaceMap[namespace]:
-                    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                        assert(False,"Copy id for MarvinDataGrou not supported yet")
-
-                    elif Matches(entry.ID.lower(),searchId):
-                        NewID =  HandleWildcardUpdate(entry.ID,newId)
-                        newEntry = copy.deepcopy(entry)
-                        newEntry.ID = NewID
-                        newEntry.Namespace = NewNS
-                        temporaryNS.append(newEntry)
-                        changedCount+=1
+                    # a datapoint in a group is copied on its own, as the columnar handler does
+                    subEntries = entry._DataList if isinstance(entry,MarvinGroupData.MarvinDataGroup) else [entry]
+                    for subEntry in subEntries:
+                        if subEntry.ID in matchedIDs:
+                            NewID =  HandleWildcardUpdate(subEntry.ID,newId)
+                            temporaryNS.append(CopyOnWrite.CopyEntry(subEntry,NewNS,NewID))
+                            changedCount+=1
 
             if NewNS in self._namespaceMap:
-                mergeLists(self._namespaceMap[NewNS],temporaryNS)
+                self._namespaceMap[NewNS] = mergeLists(self._namespaceMap[NewNS],temporaryNS)
 
             else:
                 self._namespaceMap[NewNS] = temporaryNS
@@ -339,25 +393,13 @@ class FileHandler(object):
         namespaces = self.getMatchingNamespacesNameList(namespaceName)
         
         totalModifiedCount = 0
-        if not isinstance(ids,list):
-            ids = [ids]
+        idPatterns = Matcher.PatternSet(ids)
 
         if len(namespaces) > 0:
             for namespace in namespaces:
-                for searchId in ids:
-                    for entry in self._namespaceMap[namespace]:
-                        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                            for subEntry in entry._DataList:
-                                if Matches(subEntry.ID,searchId):
-                                    if BoundValue(subEntry,minValue,maxValue):
-                                       totalModifiedCount += 1 
-
-                        elif Matches(entry.ID.lower(),searchId):
-                            if BoundValue(entry,minValue,maxValue):
-                                totalModifiedCount += 1 
+                totalModifiedCount += Transforms.BoundValues(self._writableSamples(namespace,idPatterns.Matches),minValue,maxValue)
 
-        else:
-            Log.getLogger().error("Namespace: {} does not exist".format(namespaceName))
+        self._logMissingNamespaces(namespaceName)
 
         return totalModifiedCount
 
@@ -365,24 +407,268 @@ class FileHandler(object):
         namespaces = self.getMatchingNamespacesNameList(namespaceName)
         
         totalModifiedCount = 0
-        if not isinstance(ids,list):
-            ids = [ids]
+        idPatterns = Matcher.PatternSet(ids)
 
         if len(namespaces) > 0:
             for namespace in namespaces:
-                for searchId in ids:
-                    for entry in self._namespaceMap[namespace]:
-                        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                            for subEntry in entry._DataList:
-                                if Matches(subEntry.ID,searchId):
-                                    if DeltaValue(subEntry,deltaVal):
-                                       totalModifiedCount += 1 
-
-                        elif Matches(entry.ID.lower(),searchId):
-                            if DeltaValue(entry,deltaVal):
-                                totalModifiedCount += 1 
+                totalModifiedCount += Transforms.DeltaValues(self._writableSamples(namespace,idPatterns.Matches),deltaVal)
 
-        else:
-            Log.getLogger().error("Namespace: {} does not exist".format(namespaceName))
+        self._logMissingNamespaces(namespaceName)
+
+        return totalModifiedCount
+
+
+## does the same actions as FileHandler, but holds the datapoints in per namespace
+## arrays (ColumnarData) rather than as a MarvinData object each, which takes
+## a fraction of the memory.  Objects are only created again when writing.
+class ColumnarFileHandler(FileHandler):
+    def createNamespaceMap(self,entries,namespaceOrder=()):
+        self._shared = CopyOnWrite.SharedNamespaces() # columnar copies are cheap, never shared
+        self._tables = ColumnarData.ColumnarTables()
+        self._namespaceMap = {}
+        for namespace in namespaceOrder:
+            self._namespaceMap[namespace] = ColumnarData.ColumnarNamespace(namespace,self._tables)
+        entryCount = 0
+
+        for entry in entries:
+            namespace = entry.Namespace
+            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+                namespace=entry._DataList[0].Namespace
+                entryCount += len(entry._DataList)
+
+            else:
+                entryCount += 1
+
+            if not namespace in self._namespaceMap:
+                self._namespaceMap[namespace] = ColumnarData.ColumnarNamespace(namespace,self._tables)
+
+            self._namespaceMap[namespace].AddEntry(entry)
+
+        return entryCount
+
+    # columnar copies are cheap, so the clone gets its own (the string tables are only ever added to, so are shared)
+    def Clone(self):
+        clone = self.__class__(self._sourceFile,entries=[])
+        clone._unchanged = self._unchanged
+        clone._tables = self._tables
+        for namespace,nsData in self._namespaceMap.items():
+            clone._namespaceMap[namespace] = nsData.Copy(nsData.Name)
+            clone._namespaceMap[namespace].NamespaceOverride = nsData.NamespaceOverride
+
+        return clone
 
-        return totalModifiedCount  
\ No newline at end of file
+    def Rename_Namespace(self,origName,newName):
+        namespaces = self.getMatchingNamespacesNameList(origName)
+
+        for namespace in namespaces:
+            newNamespaceName = HandleWildcardUpdate(namespace,newName)
+            self._namespaceMap[namespace].NamespaceOverride = newNamespaceName
+            if not newNamespaceName in self._namespaceMap:
+                CopyOnWrite.RenameKey(self._namespaceMap,namespace,newNamespaceName)
+
+        return len(namespaces)
+
+    def Delete_Id(self,namespaceName,ids):
+        namespaces = self.getMatchingNamespacesNameList(namespaceName)
+
+        totalRemovedCount = 0
+        idPatterns = Matcher.PatternSet(ids)
+
+        if len(namespaces) > 0:
+            for namespace in namespaces:
+                nsData = self._namespaceMap[namespace]
+                idMask = nsData.IdCodeMask(idPatterns.Matches)
+                keepMask = bytearray(0 if idMask[code] else 1 for code in nsData.IDs)
+                removedCount = len(keepMask) - sum(keepMask)
+
+                if removedCount > 0:
+                    nsData.Compress(keepMask)
+
+                totalRemovedCount += removedCount
+
+        self._logMissingNamespaces(namespaceName)
+
+        return totalRemovedCount
+
+    def Rename_Id(self,namespaces,ids,newName):
+        changedCount = 0
+        idFoundMap={}
+        idPatterns = Matcher.PatternSet(ids)
+        namespaces = self.getMatchingNamespacesNameList(namespaces)
+        for namespace in namespaces:
+            nsData = self._namespaceMap[namespace]
+            rows = nsData.SelectRows(nsData.IdCodeMask(idPatterns.Matches))
+            for NewID in nsData.MapIDs(rows,lambda id: HandleWildcardUpdate(id,newName)):
+                idFoundMap[NewID.lower()] = NewID
+            changedCount += len(rows)
+
+        return (changedCount,set(idFoundMap))
+
+    def Copy_Namespace(self,origName,newName):
+        namespaces = self.getMatchingNamespacesNameList(origName)
+        copiedCount=0
+
+        for namespace in namespaces:
+            newNamespaceName = HandleWildcardUpdate(namespace,newName)
+            if newNamespaceName in self._namespaceMap:
+                Log.getLogger().error("Cannot copy namespace {} to {} - it already exists".format(namespace,newNamespaceName))
+
+            else:
+                copiedCount+=1
+                self._namespaceMap[newNamespaceName] = self._namespaceMap[namespace].Copy(newNamespaceName)
+
+        return copiedCount
+
+    def Copy_Id(self,namespaces,ids,newNs,newId):
+        changedCount = 0
+
+        idPatterns = Matcher.PatternSet(ids)
+        namespaces = self.getMatchingNamespacesNameList(namespaces)
+        for namespace in namespaces:
+            nsData = self._namespaceMap[namespace]
+            NewNS =  HandleWildcardUpdate(namespace,newNs)
+            rows = nsData.SelectRows(nsData.IdCodeMask(idPatterns.Matches))
+
+            if not NewNS in self._namespaceMap:
+                self._namespaceMap[NewNS] = ColumnarData.ColumnarNamespace(NewNS,self._tables)
+
+            changedCount += self._namespaceMap[NewNS].MergeRows(nsData,rows,lambda id: HandleWildcardUpdate(id,newId),NewNS)
+
+        return changedCount
+
+    # runs valueFn once per distinct value of the matching IDs, returns number of datapoints changed
+    def _mapIdValues(self,namespaceName,ids,valueFn):
+        namespaces = self.getMatchingNamespacesNameList(namespaceName)
+
+        totalModifiedCount = 0
+        idPatterns = Matcher.PatternSet(ids)
+
+        if len(namespaces) > 0:
+            for namespace in namespaces:
+                nsData = self._namespaceMap[namespace]
+                rows = nsData.SelectRows(nsData.IdCodeMask(idPatterns.Matches))
+                totalModifiedCount += nsData.MapValues(rows,valueFn)
+
+        self._logMissingNamespaces(namespaceName)
+
+        return totalModifiedCount
+
+    def Bound_Id(self,namespaceName,ids,maxValue,minValue):
+        if None == minValue and None == maxValue:
+            Log.getLogger().error("Invalid <Namespace> - BoundID without Min or Max value specified.")
+            raise pickle.UnpicklingError()
+
+        minValue,maxValue = Transforms.BoundLimits(minValue,maxValue)
+
+        def boundFn(value,number):
+            if None == number:
+                return None
+
+            newValue = None
+            if None != minValue and number < minValue:
+                number = minValue
+                newValue = str(number)
+
+            if None != maxValue and number > maxValue:
+                newValue = str(maxValue)
+
+            return newValue
+
+        return self._mapIdValues(namespaceName,ids,boundFn)
+
+    def ApplyDelta_Id(self,namespaceName,ids,deltaVal):
+        def deltaFn(value,number):
+            if None == number or None == deltaVal:
+                return None
+
+            return str(number + float(deltaVal))
+
+        return self._mapIdValues(namespaceName,ids,deltaFn)
+
+
+## keeps input files loaded so a file is only read once when several jobs work on it.
+## uses is how many times each file (by full path) is going to be opened, once the
+## last one has it the file is let go.  Each gets a Clone() except the last, which
+## gets the loaded one itself
+class LoadCache(object):
+    def __init__(self,handlerClass,uses):
+        self._handlerClass = handlerClass
+        self._uses = dict(uses)
+        self._handlers = {}
+
+    # a handler for inpName that can be changed without it showing up for the next one
+    def Open(self,inpName):
+        key = abspath(inpName)
+        remaining = self._uses.get(key,0) - 1
+        self._uses[key] = remaining
+
+        fHandler = self._handlers.get(key)
+        if None == fHandler:
+            fHandler = self._handlerClass(inpName)
+            if remaining < 1:
+                return fHandler
+
+            self._handlers[key] = fHandler
+
+        elif remaining < 1:
+            del self._handlers[key]
+            return fHandler
+
+        else:
+            Log.getLogger().info("Using already loaded " + inpName)
+
+        return fHandler.Clone()
+
+    # fileName has been written, so what was loaded from it is out of date
+    def Forget(self,fileName):
+        self._handlers.pop(abspath(fileName),None)
+
+
+# fraction of the memory limit a chunk gets, leaves room for what the actions add and the run
+CHUNK_SHARE = 3
+
+# does applyFn(fileHandler) to a file too big to load in one go.  The file is read a
+# chunk at a time, each chunk gets its own handler (made with every namespace of the
+# file, in file order, so they all line up, which needs the index of the file before
+# the first chunk, so it is made first if there isn't one) and applyFn and is spilled to disk as a
+# sorted run.  The runs are then merged into outfile, giving the same order as if it
+# had all been done at once.  Returns what applyFn returned, added up over the chunks.
+def ProcessFileInChunks(handlerClass,inpName,outfile,overWrite,applyFn,namespaces,memLimit):
+    Log.getLogger().info("Processing {} in chunks of {:,} bytes".format(inpName,memLimit // CHUNK_SHARE))
+    fHandler = handlerClass(inpName,namespaces,entries=[])
+    if not fHandler._hasNamespaces(namespaces):
+        fHandler._unchanged = True
+        result = applyFn(fHandler)
+        fHandler.writeFile(outfile,overWrite)
+        return result
+
+    if not OkToWrite(outfile,overWrite):
+        return None
+
+    namespaceOrder = BiffIndex.GetIndex(inpName).Namespaces()
+    result = None
+    with ExternalSort.RunStore() as runStore:
+        runs = []
+        fHandler = None
+        for chunk in ExternalSort.Chunks(BiffStream.ReadEntries(inpName,lowMemory=True,compact=True),memLimit // CHUNK_SHARE):
+            if None != fHandler: # only spill if there is more than one chunk
+                runs.append(runStore.AddRun(fHandler.iterRankedList()))
+
+            fHandler = handlerClass(inpName,entries=chunk,namespaceOrder=namespaceOrder)
+            chunk = None
+            result = AddResults(result,applyFn(fHandler))
+
+        if None == fHandler:
+            fHandler = handlerClass(inpName,entries=[],namespaceOrder=namespaceOrder)
+            result = applyFn(fHandler)
+
+        if len(runs) < 1:
+            fHandler.writeFile(outfile,True)
+            return result
+
+        runs.append(runStore.AddRun(fHandler.iterRankedList()))
+        fHandler = None
+        writtenCount = BiffStream.WriteEntries(outfile,(entry for rank,entry in ExternalSort.MergeRuns(runs,_rankedKey)))
+        Log.getLogger().info("New file [" + outfile + "] created with " + str(writtenCount) + " entries.")
+
+    return result
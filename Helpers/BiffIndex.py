@@ -0,0 +1,283 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Sidecar index (.biffidx) for a BIFF save file.  Holds the namespaces and
+#   IDs in the file with their sample counts, time range and where in the
+#   file they are, so those questions can be answered without unpickling.
+#
+#   Layout (little endian), is read with mmap:
+#     header    : magic, file size, file mtime, file hash, entry count,
+#                 sample count, namespace count, ID count
+#     namespaces: fixed size records, in order of first appearance
+#     IDs       : fixed size records, grouped by namespace
+#     strings   : utf-8 names the records point into
+#
+##############################################################################
+import os
+import mmap
+import struct
+import hashlib
+
+from Helpers import Log
+from Helpers import Matcher
+from Helpers import BiffStream
+from Data import MarvinGroupData
+
+INDEX_EXTENSION = "idx"
+
+_MAGIC = b'FUDDIDX1'
+_HEADER = struct.Struct('<8sqq20sqqII')
+_NS_RECORD = struct.Struct('<IIqqqqqqII')  # name offset/len, samples, entries, min time, max time, first entry, last entry, 1st ID, ID count
+_ID_RECORD = struct.Struct('<IIqqqqq')      # name offset/len, samples, min time, max time, first entry, last entry
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+Matches = Matcher.Matches
+
+
+# the name of the index file for a BIFF file
+def GetIndexFileName(fileName):
+    return fileName + INDEX_EXTENSION
+
+
+# True if fileName is an index file (so not a save file, though it may sit with them)
+def IsIndexFile(fileName):
+    if not fileName.endswith(INDEX_EXTENSION):
+        return False
+
+    try:
+        with open(fileName,'rb') as fp:
+            return fp.read(len(_MAGIC)) == _MAGIC
+
+    except OSError:
+        return False
+
+
+# hash of the start and end of the file, along with size and mtime is what says the index is still valid
+def _fileSignature(fileName):
+    stat = os.stat(fileName)
+    sha = hashlib.sha1()
+    with open(fileName,'rb') as fp:
+        sha.update(fp.read(_HASH_BLOCK_SIZE))
+        if stat.st_size > _HASH_BLOCK_SIZE:
+            fp.seek(max(_HASH_BLOCK_SIZE,stat.st_size - _HASH_BLOCK_SIZE))
+            sha.update(fp.read())
+
+    return (stat.st_size,stat.st_mtime_ns,sha.digest())
+
+
+## stats for one namespace or one ID
+class IndexRecord(object):
+    def __init__(self,name):
+        self.Name = name
+        self.SampleCount = 0
+        self.EntryCount = 0
+        self.MinTime = None
+        self.MaxTime = None
+        self.FirstEntry = None
+        self.LastEntry = None
+
+    def _addSample(self,arrivalTime,entryNumber):
+        self.SampleCount += 1
+        if None == self.MinTime or arrivalTime < self.MinTime:
+            self.MinTime = arrivalTime
+        if None == self.MaxTime or arrivalTime > self.MaxTime:
+            self.MaxTime = arrivalTime
+        if None == self.FirstEntry:
+            self.FirstEntry = entryNumber
+        self.LastEntry = entryNumber
+
+
+## the index for one file
+class BiffIndex(object):
+    def __init__(self):
+        self.EntryCount = 0
+        self.SampleCount = 0
+        self._namespaces = {}   # name -> IndexRecord
+        self._ids = {}          # namespace -> {ID -> IndexRecord}
+
+    def Namespaces(self):
+        return list(self._namespaces)
+
+    def NamespaceInfo(self,namespace):
+        return self._namespaces.get(namespace)
+
+    def IDs(self,namespace):
+        return list(self._ids.get(namespace,{}).values())
+
+    def getMatchingNamespacesNameList(self,pattern):
+        return [namespace for namespace in self._namespaces if Matches(namespace,pattern)]
+
+    # start and end time of the whole file
+    def TimeRange(self):
+        records = [record for record in self._namespaces.values() if None != record.MinTime]
+        if len(records) < 1:
+            return (None,None)
+
+        return (min(record.MinTime for record in records),max(record.MaxTime for record in records))
+
+    # walks the entries (streamed, so is never all in memory) and creates the index
+    def _build(self,entries):
+        for entry in entries:
+            self._add(entry)
+
+    # adds the next entry of the file
+    def _add(self,entry):
+        entryNumber = self.EntryCount
+        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+            namespace = entry._DataList[0].Namespace
+            samples = entry._DataList
+        else:
+            namespace = entry.Namespace
+            samples = [entry]
+
+        if not namespace in self._namespaces:
+            self._namespaces[namespace] = IndexRecord(namespace)
+            self._ids[namespace] = {}
+
+        nsRecord = self._namespaces[namespace]
+        nsRecord.EntryCount += 1
+        idMap = self._ids[namespace]
+        for sample in samples:
+            nsRecord._addSample(sample.ArrivalTime,entryNumber)
+            if not sample.ID in idMap:
+                idMap[sample.ID] = IndexRecord(sample.ID)
+            idMap[sample.ID]._addSample(sample.ArrivalTime,entryNumber)
+            self.SampleCount += 1
+
+        self.EntryCount += 1
+
+    def _write(self,indexFileName,signature):
+        strings = bytearray()
+        def addString(name):
+            data = name.encode('utf-8','surrogatepass')
+            offset = len(strings)
+            strings.extend(data)
+            return (offset,len(data))
+
+        idCount = sum(len(idMap) for idMap in self._ids.values())
+        nsData = bytearray()
+        idData = bytearray()
+        idIndex = 0
+        for namespace,record in self._namespaces.items():
+            offset,length = addString(namespace)
+            idMap = self._ids[namespace]
+            nsData += _NS_RECORD.pack(offset,length,record.SampleCount,record.EntryCount,_orNeg(record.MinTime),_orNeg(record.MaxTime),
+                                      _orNeg(record.FirstEntry),_orNeg(record.LastEntry),idIndex,len(idMap))
+            for id,idRecord in idMap.items():
+                offset,length = addString(id)
+                idData += _ID_RECORD.pack(offset,length,idRecord.SampleCount,idRecord.MinTime,idRecord.MaxTime,idRecord.FirstEntry,idRecord.LastEntry)
+            idIndex += len(idMap)
+
+        size,mtime,hash = signature
+        with BiffStream.AtomicOutput(indexFileName) as fp:
+            fp.write(_HEADER.pack(_MAGIC,size,mtime,hash,self.EntryCount,self.SampleCount,len(self._namespaces),idCount))
+            fp.write(nsData)
+            fp.write(idData)
+            fp.write(strings)
+
+    def _read(self,buffer):
+        magic,size,mtime,hash,self.EntryCount,self.SampleCount,nsCount,idCount = _HEADER.unpack_from(buffer,0)
+        nsStart = _HEADER.size
+        idStart = nsStart + nsCount * _NS_RECORD.size
+        stringStart = idStart + idCount * _ID_RECORD.size
+
+        def getString(offset,length):
+            return bytes(buffer[stringStart + offset:stringStart + offset + length]).decode('utf-8','surrogatepass')
+
+        for nsNum in range(nsCount):
+            offset,length,samples,entries,minTime,maxTime,first,last,firstId,nsIdCount = _NS_RECORD.unpack_from(buffer,nsStart + nsNum * _NS_RECORD.size)
+            record = IndexRecord(getString(offset,length))
+            record.SampleCount,record.EntryCount = samples,entries
+            record.MinTime,record.MaxTime,record.FirstEntry,record.LastEntry = _orNone(minTime),_orNone(maxTime),_orNone(first),_orNone(last)
+            self._namespaces[record.Name] = record
+
+            idMap = {}
+            for idNum in range(firstId,firstId + nsIdCount):
+                offset,length,samples,minTime,maxTime,first,last = _ID_RECORD.unpack_from(buffer,idStart + idNum * _ID_RECORD.size)
+                idRecord = IndexRecord(getString(offset,length))
+                idRecord.SampleCount = samples
+                idRecord.MinTime,idRecord.MaxTime,idRecord.FirstEntry,idRecord.LastEntry = minTime,maxTime,first,last
+                idMap[idRecord.Name] = idRecord
+            self._ids[record.Name] = idMap
+
+
+def _orNeg(value):
+    return -1 if None == value else value
+
+def _orNone(value):
+    return None if -1 == value else value
+
+
+# reads the index for fileName if there is one and it is still valid for the file, otherwise None
+def ReadIndex(fileName):
+    indexFileName = GetIndexFileName(fileName)
+    if not os.path.exists(indexFileName):
+        return None
+
+    try:
+        with open(indexFileName,'rb') as fp:
+            with mmap.mmap(fp.fileno(),0,access=mmap.ACCESS_READ) as buffer:
+                if buffer[:len(_MAGIC)] != _MAGIC:
+                    return None
+
+                magic,size,mtime,hash = _HEADER.unpack_from(buffer,0)[:4]
+                if (size,mtime,hash) != _fileSignature(fileName):
+                    Log.getLogger().info("Index for " + fileName + " is out of date")
+                    return None
+
+                index = BiffIndex()
+                index._read(buffer)
+                return index
+
+    except (OSError,ValueError,struct.error) as ex:
+        Log.getLogger().info("Unable to read index " + indexFileName + ": " + str(ex))
+        return None
+
+
+# returns the index for a BIFF file, (re)building it if is missing or stale
+def GetIndex(fileName):
+    index = ReadIndex(fileName)
+    if None != index:
+        return index
+
+    Log.getLogger().info("Creating index for " + fileName)
+    signature = _fileSignature(fileName)
+    index = BiffIndex()
+    index._build(BiffStream.ReadEntries(fileName,lowMemory=True,compact=True))
+    _save(index,fileName,signature)
+    return index
+
+def _save(index,fileName,signature):
+    try:
+        index._write(GetIndexFileName(fileName),signature)
+
+    except OSError as ex:
+        Log.getLogger().info("Unable to save index for " + fileName + ": " + str(ex))
+
+
+# generator that hands on the entries of fileName as they are read (by a load of it)
+# and builds the index from them as they go by, so the file isn't read again just for
+# the index.  The index is saved once all of them have been read
+def IndexEntries(fileName,entries):
+    signature = _fileSignature(fileName)
+    index = BiffIndex()
+    for entry in entries:
+        index._add(entry)
+        yield entry
+
+    Log.getLogger().info("Created index for " + fileName)
+    _save(index,fileName,signature)
@@ -0,0 +1,382 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Streaming reader and writer for BIFF save files.  A save file is a single
+#   pickled list of MarvinData objects, these routines let you walk it or
+#   create it one entry at a time without ever holding the whole list.
+#
+##############################################################################
+import gc
+import io
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import contextlib
+import types
+
+from Helpers import Log
+from Helpers import ColumnarFile
+from Helpers import Compression
+from Data import MarvinData
+from Data import MarvinGroupData
+
+# Oscar writes protocol 3.  The writer below splices independently pickled
+# chunks into one list, which only works without protocol 4 framing/MEMOIZE.
+BIFF_PROTOCOL = 3
+WRITE_CHUNK_SIZE = 1000
+
+_LIST_HEADER = pickle.PROTO + bytes([BIFF_PROTOCOL]) + pickle.EMPTY_LIST + pickle.BINPUT + b'\x00'
+
+# memo entries of these types are shared between entries (dictionary keys,
+# classes, repeated strings) so are kept, everything else is dropped once
+# the entry it belongs to has been handed out
+_SHARED_MEMO_TYPES = (str, bytes, int, float, complex, bool, type(None), tuple, frozenset,
+                      type, types.FunctionType, types.BuiltinFunctionType)
+
+
+# classes in a save file that get loaded as their compact (__slots__) version
+_COMPACT_CLASSES = {
+    ('Data.MarvinData','MarvinData') : MarvinData.CompactMarvinData,
+    ('Data.MarvinGroupData','MarvinDataGroup') : MarvinGroupData.CompactMarvinDataGroup,
+}
+
+
+## C unpickler that creates CompactMarvinData/CompactMarvinDataGroup rather than the
+## plain classes.  They pickle back out as the plain classes.
+class CompactUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        compactClass = _COMPACT_CLASSES.get((module, name))
+        if None != compactClass:
+            return compactClass
+
+        return pickle.Unpickler.find_class(self, module, name)
+
+
+# unpickling a whole file creates lots of objects which triggers the garbage collector
+# over and over, wasted time as unpickling does not create garbage - so hold it off
+def _load(unpickler):
+    gcWasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        return unpickler.load()
+
+    finally:
+        if gcWasEnabled:
+            gc.enable()
+
+
+# stands in for the top level list, gets entries as the unpickler appends them
+class _EntrySink(object):
+    def __init__(self):
+        self.ready = []
+
+    def append(self, entry):
+        self.ready.append(entry)
+
+    def extend(self, entries):
+        self.ready.extend(entries)
+
+
+## pure python unpickler that hands out the entries of the top level list as they complete
+class _StreamingUnpickler(pickle._Unpickler):
+    dispatch = pickle._Unpickler.dispatch.copy()
+
+    def __init__(self, fp, compact=False):
+        pickle._Unpickler.__init__(self, fp)
+        self._compact = compact
+        self._sink = None
+        self._entryMemo = []
+        self._memoCount = 0
+
+    def find_class(self, module, name):
+        if self._compact and (module, name) in _COMPACT_CLASSES:
+            return _COMPACT_CLASSES[(module, name)]
+
+        return pickle._Unpickler.find_class(self, module, name)
+
+    def _remember(self, index):
+        obj = self.stack[-1]
+        self.memo[index] = obj
+        if not isinstance(obj, _SHARED_MEMO_TYPES):
+            self._entryMemo.append(index)
+
+    def _forgetEntryMemo(self):
+        for index in self._entryMemo:
+            self.memo.pop(index, None)
+        self._entryMemo = []
+
+    def load_empty_list(self):
+        if None == self._sink and 0 == len(self.stack) and 0 == len(self.metastack):
+            self._sink = _EntrySink()
+            self.append(self._sink)
+        else:
+            self.append([])
+    dispatch[pickle.EMPTY_LIST[0]] = load_empty_list
+
+    # protocol 0 starts the list with MARK LIST rather than EMPTY_LIST
+    def load_list(self):
+        items = self.pop_mark()
+        if None == self._sink and 0 == len(self.stack) and 0 == len(self.metastack):
+            self._sink = _EntrySink()
+            self._sink.extend(items)
+            self.append(self._sink)
+        else:
+            self.append(items)
+    dispatch[pickle.LIST[0]] = load_list
+
+    def load_put(self):
+        index = int(self.readline()[:-1])
+        if index < 0:
+            raise ValueError("negative PUT argument")
+        self._remember(index)
+    dispatch[pickle.PUT[0]] = load_put
+
+    def load_binput(self):
+        self._remember(self.read(1)[0])
+    dispatch[pickle.BINPUT[0]] = load_binput
+
+    def load_long_binput(self):
+        index, = struct.unpack('<I', self.read(4))
+        self._remember(index)
+    dispatch[pickle.LONG_BINPUT[0]] = load_long_binput
+
+    # memo gets trimmed, so can't use len(memo) like the stock unpickler
+    def load_memoize(self):
+        self._remember(self._memoCount)
+        self._memoCount += 1
+    dispatch[pickle.MEMOIZE[0]] = load_memoize
+
+    # same loop as pickle._Unpickler.load(), but is a generator
+    def Entries(self):
+        self._unframer = pickle._Unframer(self._file_read, self._file_readline)
+        self.read = self._unframer.read
+        self.readinto = self._unframer.readinto
+        self.readline = self._unframer.readline
+        self.metastack = []
+        self.stack = []
+        self.append = self.stack.append
+        self.proto = 0
+        read = self.read
+        dispatch = self.dispatch
+        try:
+            while True:
+                key = read(1)
+                if not key:
+                    raise EOFError
+                dispatch[key[0]](self)
+
+                if None != self._sink and len(self._sink.ready) > 0:
+                    ready = self._sink.ready
+                    self._sink.ready = []
+                    self._forgetEntryMemo()
+                    for entry in ready:
+                        yield entry
+
+        except pickle._Stop as stopInst:
+            if None == self._sink or stopInst.value is not self._sink:
+                raise pickle.UnpicklingError("BIFF save file does not contain a list of entries")
+
+
+# generator that handles out the entries of a file written by BiffWriter, each
+# chunk is prefixed with its length so can go straight to the C unpickler
+def _readChunkedEntries(fp, compact):
+    while True:
+        opcode = fp.read(1)
+        if opcode == pickle.STOP:
+            return
+
+        if opcode != pickle.BININT:
+            raise pickle.UnpicklingError("Corrupt chunk in BIFF save file")
+
+        chunkLen, = struct.unpack('<i', fp.read(4))
+        if fp.read(1) != pickle.POP:
+            raise pickle.UnpicklingError("Corrupt chunk in BIFF save file")
+
+        chunk = fp.read(chunkLen)
+        if len(chunk) != chunkLen:
+            raise EOFError("BIFF save file is truncated")
+
+        data = io.BytesIO(_LIST_HEADER + chunk + pickle.STOP)
+        if compact:
+            entries = CompactUnpickler(data).load()
+        else:
+            entries = pickle.Unpickler(data).load()
+
+        for entry in entries:
+            yield entry
+
+
+# generator that returns each entry of a BIFF save file, in file order.  Files
+# written by FUDD are always streamed, columnar ones (see ColumnarFile) come
+# straight from the mmap'd arrays.  Files straight from Oscar are one big
+# pickle, by default they are loaded with the (much faster) C unpickler and the
+# entries released as they are handed out, lowMemory walks them with the
+# streaming unpickler instead so the objects are never all in memory at once.
+# compact creates the __slots__ versions of MarvinData/MarvinDataGroup.
+# .gz/.xz/.bz2 files are decompressed as they are read.
+def ReadEntries(fileName,lowMemory=False,compact=False):
+    with Compression.OpenRead(fileName) as fp:
+        try:
+            header = fp.read(len(ColumnarFile.MAGIC))
+            if ColumnarFile.IsColumnarHeader(header):
+                for entry in ColumnarFile.ReadEntries(fileName, compact):
+                    yield entry
+
+            elif header[:len(_LIST_HEADER) + 1] == _LIST_HEADER + pickle.BININT:
+                fp.seek(len(_LIST_HEADER))
+                for entry in _readChunkedEntries(fp, compact):
+                    yield entry
+
+            elif lowMemory:
+                fp.seek(0)
+                for entry in _StreamingUnpickler(fp, compact).Entries():
+                    yield entry
+
+            else:
+                fp.seek(0)
+                if compact:
+                    entries = _load(CompactUnpickler(fp))
+                else:
+                    entries = _load(pickle.Unpickler(fp))
+
+                if not isinstance(entries, list):
+                    raise pickle.UnpicklingError("BIFF save file does not contain a list of entries")
+
+                entries.reverse()
+                while len(entries) > 0:
+                    yield entries.pop()
+
+        except pickle.UnpicklingError:
+            raise
+
+        except (KeyError, IndexError, ValueError, struct.error) + Compression.DECOMPRESS_ERRORS as ex:
+            Log.getLogger().error("Error reading BIFF save file " + fileName + ": " + str(ex))
+            raise pickle.UnpicklingError(str(ex))
+
+
+## writes a BIFF save file one entry at a time, result loads as one list with pickle.load().
+## Each chunk is prefixed with a BININT/POP pair holding its length, which a
+## normal unpickler just pushes and throws away, but lets ReadEntries() find the chunks.
+class BiffWriter(object):
+    def __init__(self, fp):
+        self._fp = fp
+        self._pending = []
+        self._count = 0
+        self._fp.write(_LIST_HEADER)
+
+    def Write(self, entry):
+        self._pending.append(entry)
+        if len(self._pending) >= WRITE_CHUNK_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if len(self._pending) < 1:
+            return
+
+        # pickle the chunk as its own list, strip the list header and STOP and
+        # what is left are the opcodes that append the chunk onto the list
+        data = pickle.dumps(self._pending, BIFF_PROTOCOL)
+        chunk = data[len(_LIST_HEADER):-1]
+        self._fp.write(pickle.BININT + struct.pack('<i', len(chunk)) + pickle.POP)
+        self._fp.write(chunk)
+        self._count += len(self._pending)
+        self._pending = []
+
+    def Close(self):
+        self._flush()
+        self._fp.write(pickle.STOP)
+        return self._count
+
+    def getCount(self):
+        return self._count + len(self._pending)
+
+
+# context manager that gives a file to write that only replaces fileName once it
+# is complete. Is written to a temp file in the same directory, which is fsync'd
+# then renamed over fileName, so a crash never leaves a partial file behind.
+@contextlib.contextmanager
+def AtomicOutput(fileName):
+    directory = os.path.dirname(os.path.abspath(fileName))
+    fd, tmpName = tempfile.mkstemp(prefix="." + os.path.basename(fileName) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w+b') as fp:
+            yield fp
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        if os.path.exists(fileName):
+            shutil.copymode(fileName, tmpName)
+        else: # mkstemp makes it private, give it what open() would have
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(tmpName, 0o666 & ~umask)
+
+        os.replace(tmpName, fileName)
+
+    except BaseException:
+        if os.path.exists(tmpName):
+            os.remove(tmpName)
+        raise
+
+    try: # make the rename itself durable
+        dirFd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dirFd)
+        finally:
+            os.close(dirFd)
+    except OSError:
+        pass
+
+
+# True if fileName is a save file as WriteEntries() would write targetName: same
+# compression and format, and written by FUDD (so it is in time order already, one
+# straight from Oscar may not be).  Then a copy of the bytes is as good as a rewrite
+def IsWrittenAs(fileName, targetName):
+    if Compression.GetCompression(fileName) != Compression.GetCompression(targetName):
+        return False
+
+    try:
+        with Compression.OpenRead(fileName) as fp:
+            header = fp.read(max(len(ColumnarFile.MAGIC), len(_LIST_HEADER) + 1))
+
+    except Compression.DECOMPRESS_ERRORS:
+        return False
+
+    if ColumnarFile.IsColumnarFileName(targetName):
+        return ColumnarFile.IsColumnarHeader(header)
+
+    return header[:len(_LIST_HEADER) + 1] == _LIST_HEADER + pickle.BININT
+
+
+# writes all the entries (list, generator, whatever) to fileName, returns number written.
+# columnar (True/False) picks the file format, by default it goes by the extension.
+# Is compressed if the name ends in .gz/.xz/.bz2, and is written with AtomicOutput()
+def WriteEntries(fileName, entries, columnar=None):
+    if None == columnar:
+        columnar = ColumnarFile.IsColumnarFileName(fileName)
+
+    with AtomicOutput(fileName) as rawFp:
+        with Compression.OpenWrite(fileName, rawFp) as fp:
+            if columnar:
+                return ColumnarFile.WriteEntries(fp, entries)
+
+            writer = BiffWriter(fp)
+            for entry in entries:
+                writer.Write(entry)
+
+            return writer.Close()
@@ -0,0 +1,132 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Cache of processed sources for Fudd, so rerunning a config after changing
+#   one <Source> only redoes that one.  A source is kept as a run (its entries
+#   in time order) under a hash of the bytes of its save file and of its
+#   compiled SourcePlan, so any change to either gives a new key.  The hash of
+#   all the sources of a config is recorded for the output file it made, if
+#   the output is still the one written, there is nothing to do.
+#
+##############################################################################
+import os
+import json
+import hashlib
+
+from Helpers import Log
+from Helpers import ExternalSort
+
+# part of every key, so a change to what is cached doesn't pick up old entries
+_CACHE_VERSION = 1
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+# a plan as plain lists and dicts, so it can be hashed the same way however it was made
+def _normalized(value):
+    if isinstance(value,list):
+        return [_normalized(item) for item in value]
+
+    if hasattr(value,"__dict__"):
+        return [value.__class__.__name__,dict((name,_normalized(item)) for name,item in vars(value).items())]
+
+    return value
+
+
+## a directory of cached sources and of the outputs made from them
+class BuildCache(object):
+    def __init__(self,cacheDir):
+        self._dir = cacheDir
+        os.makedirs(cacheDir,exist_ok=True)
+
+    # key of a source, from its save file and its SourcePlan
+    def SourceKey(self,sourcePlan):
+        sha = hashlib.sha1(str(_CACHE_VERSION).encode())
+        with open(sourcePlan.File,'rb') as fp:
+            for block in iter(lambda: fp.read(_HASH_BLOCK_SIZE),b''):
+                sha.update(block)
+
+        sha.update(json.dumps(_normalized(sourcePlan),sort_keys=True).encode())
+        return sha.hexdigest()
+
+    # key of an output, from the keys of its sources in order
+    def OutputKey(self,sourceKeys):
+        return hashlib.sha1(" ".join([str(_CACHE_VERSION)] + list(sourceKeys)).encode()).hexdigest()
+
+    def _runFileName(self,key):
+        return os.path.join(self._dir,key + ".biff")
+
+    # file to write the run of a source to, before AddRun()
+    def NewRunFileName(self,key):
+        if os.path.exists(self._infoFileName(key)):
+            os.remove(self._infoFileName(key))
+        return self._runFileName(key)
+
+    def _infoFileName(self,key):
+        return os.path.join(self._dir,key + ".json")
+
+    def _readInfo(self,fileName):
+        try:
+            with open(fileName,'r') as fp:
+                return json.load(fp)
+
+        except (OSError,ValueError):
+            return None
+
+    def _writeInfo(self,fileName,info):
+        try:
+            with open(fileName,'w') as fp:
+                json.dump(info,fp)
+
+        except OSError as ex:
+            Log.getLogger().info("Unable to update cache " + fileName + ": " + str(ex))
+
+    # the cached run of a source, None if it isn't there
+    def GetRun(self,key):
+        info = self._readInfo(self._infoFileName(key))
+        if None == info or not os.path.exists(self._runFileName(key)):
+            return None
+
+        return ExternalSort.Run(self._runFileName(key),info["count"])
+
+    # the run of a source has been written to NewRunFileName(key), the info is written last so
+    # a run that was only partly written is never used
+    def AddRun(self,key,count,sourceFile):
+        self._writeInfo(self._infoFileName(key),{"count" : count, "source" : sourceFile})
+        return ExternalSort.Run(self._runFileName(key),count)
+
+    def _outputInfoFileName(self,outfile):
+        return os.path.join(self._dir,"output-" + hashlib.sha1(os.path.abspath(outfile).encode()).hexdigest() + ".json")
+
+    def _outputSignature(self,outfile):
+        stat = os.stat(outfile)
+        return [stat.st_size,stat.st_mtime_ns]
+
+    # number of entries in outfile if it was made from the sources of outputKey and hasn't
+    # been changed since, otherwise None
+    def CurrentOutput(self,outfile,outputKey):
+        info = self._readInfo(self._outputInfoFileName(outfile))
+        if None == info or info["key"] != outputKey or not os.path.exists(outfile):
+            return None
+
+        if info["signature"] != self._outputSignature(outfile):
+            return None
+
+        return info["count"]
+
+    # outfile has just been written from the sources of outputKey
+    def SetOutput(self,outfile,outputKey,count):
+        info = {"output" : os.path.abspath(outfile), "key" : outputKey, "count" : count, "signature" : self._outputSignature(outfile)}
+        self._writeInfo(self._outputInfoFileName(outfile),info)
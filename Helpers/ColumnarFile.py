@@ -0,0 +1,424 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   FUDD native columnar save file.  Rather than a pickled list of objects,
+#   the datapoints are stored as blocks of raw arrays (one array per field)
+#   plus a dictionary of every distinct namespace/ID/value/etc.  The file is
+#   read with mmap, the arrays are used in place.
+#
+#   Layout (little endian):
+#     magic
+#     blocks     : each is the column arrays for up to BLOCK_ROWS rows, in
+#                  time order, 8 byte aligned.  A group never spans blocks.
+#     dictionary : count, then per entry a type tag, length and the bytes
+#     block table: per block offset, rows, entries, min and max time
+#     trailer    : dictionary offset, block table offset, block count, magic
+#
+#   A compressed columnar file is decompressed to a temporary file first, as
+#   it has to be mmap'd.
+#
+#   Each row is a datapoint, a group (its sub datapoints are the rows that
+#   follow it) or anything else as a pickle, so converting to and from a
+#   pickled BIFF save file gives back exactly the same entries.
+#
+##############################################################################
+import sys
+import mmap
+import struct
+import pickle
+import shutil
+import tempfile
+from array import array
+
+from Helpers import Compression
+
+from Data import MarvinData
+from Data import MarvinGroupData
+
+MAGIC = b'FUDDCOL1'
+COLUMNAR_EXTENSION = ".fcol"
+BLOCK_ROWS = 64 * 1024
+
+_TRAILER = struct.Struct('<qqq8s')
+_BLOCK_ENTRY = struct.Struct('<qqqqq')  # offset, rows, entries, min time, max time
+_DICT_ENTRY = struct.Struct('<BI')      # type tag, length
+
+# (name, array type) of the columns in a block, in file order
+_COLUMNS = (('Times','q'),('Kinds','B'),('Namespaces','I'),('IDs','I'),('Values','I'),('Formats','I'),('Lives','I'))
+
+# what a row is
+_KIND_DATA = 0
+_KIND_GROUP = 1
+_KIND_MEMBER = 2
+_KIND_PICKLED = 3
+
+# dictionary type tags
+_TAG_STR = 0
+_TAG_INT = 1
+_TAG_FLOAT = 2
+_TAG_BOOL = 3
+_TAG_NONE = 4
+_TAG_PICKLE = 5
+_TAG_BYTES = 6
+
+# attributes of a MarvinData, in the order its __init__ creates them
+_FIELDS = ('FormatVersion','Value','ArrivalTime','Namespace','ID','Live')
+_GROUP_FIELDS = _FIELDS + ('_DataList',)
+
+
+def _padding(size):
+    return (8 - size % 8) % 8
+
+
+def _encodeValue(value):
+    valueType = type(value)
+    if valueType is str:
+        return (_TAG_STR,value.encode('utf-8','surrogatepass'))
+    if valueType is bool:
+        return (_TAG_BOOL,b'1' if value else b'0')
+    if valueType is int:
+        return (_TAG_INT,str(value).encode('ascii'))
+    if valueType is float:
+        return (_TAG_FLOAT,repr(value).encode('ascii'))
+    if value is None:
+        return (_TAG_NONE,b'')
+    if valueType is bytes:
+        return (_TAG_BYTES,value)
+
+    return (_TAG_PICKLE,pickle.dumps(value,3))
+
+
+def _decodeValue(tag,data):
+    if _TAG_STR == tag:
+        return data.decode('utf-8','surrogatepass')
+    if _TAG_BOOL == tag:
+        return data == b'1'
+    if _TAG_INT == tag:
+        return int(data)
+    if _TAG_FLOAT == tag:
+        return float(data)
+    if _TAG_NONE == tag:
+        return None
+    if _TAG_PICKLE == tag:
+        return pickle.loads(data)
+    if _TAG_BYTES == tag:
+        return bytes(data)
+
+    raise pickle.UnpicklingError("Unknown value type {} in columnar save file".format(tag))
+
+
+## every distinct value in the file, is keyed by type as well so 1, 1.0 and True stay different
+class _Dictionary(object):
+    def __init__(self):
+        self._codes = {}
+        self._encoded = []
+
+    def Code(self,value):
+        try:
+            key = (type(value),value)
+            code = self._codes.get(key)
+        except TypeError: # not hashable
+            key = (_TAG_PICKLE,pickle.dumps(value,3))
+            code = self._codes.get(key)
+
+        if None == code:
+            code = len(self._encoded)
+            self._codes[key] = code
+            self._encoded.append(_encodeValue(value))
+        return code
+
+    def Write(self,fp):
+        fp.write(struct.pack('<q',len(self._encoded)))
+        for tag,data in self._encoded:
+            fp.write(_DICT_ENTRY.pack(tag,len(data)))
+            fp.write(data)
+
+
+def _isTime(value):
+    return type(value) is int and -2**63 <= value < 2**63
+
+# True if the entry only has the usual MarvinData attributes, so can go in the columns
+def _isPlainData(entry):
+    entryType = type(entry)
+    if entryType is MarvinData.MarvinData:
+        plain = tuple(entry.__dict__) == _FIELDS
+    elif entryType is MarvinData.CompactMarvinData:
+        plain = all(hasattr(entry,name) for name in _FIELDS)
+    else:
+        return False
+
+    return plain and _isTime(entry.ArrivalTime)
+
+def _isPlainGroup(entry):
+    entryType = type(entry)
+    if entryType is MarvinGroupData.MarvinDataGroup:
+        plain = tuple(entry.__dict__) == _GROUP_FIELDS
+    elif entryType is MarvinGroupData.CompactMarvinDataGroup:
+        plain = all(hasattr(entry,name) for name in _GROUP_FIELDS)
+    else:
+        return False
+
+    return plain and _isTime(entry.ArrivalTime) and type(entry._DataList) is list and all(_isPlainData(subEntry) for subEntry in entry._DataList)
+
+
+## writes a columnar save file one entry at a time
+class ColumnarWriter(object):
+    def __init__(self,fp):
+        self._fp = fp
+        self._dictionary = _Dictionary()
+        self._blocks = []
+        self._count = 0
+        self._fp.write(MAGIC)
+        self._newBlock()
+
+    def _newBlock(self):
+        self._columns = [array(typeCode) for name,typeCode in _COLUMNS]
+        self._blockEntries = 0
+
+    def _addRow(self,kind,entry):
+        code = self._dictionary.Code
+        times,kinds,namespaces,ids,values,formats,lives = self._columns
+        times.append(entry.ArrivalTime)
+        kinds.append(kind)
+        namespaces.append(code(entry.Namespace))
+        ids.append(code(entry.ID))
+        values.append(code(entry.Value))
+        formats.append(code(entry.FormatVersion))
+        lives.append(code(entry.Live))
+
+    def Write(self,entry):
+        if _isPlainGroup(entry):
+            self._addRow(_KIND_GROUP,entry)
+            for subEntry in entry._DataList:
+                self._addRow(_KIND_MEMBER,subEntry)
+
+        elif _isPlainData(entry):
+            self._addRow(_KIND_DATA,entry)
+
+        else:
+            times,kinds,namespaces,ids,values,formats,lives = self._columns
+            arrivalTime = getattr(entry,'ArrivalTime',0)
+            times.append(arrivalTime if _isTime(arrivalTime) else 0)
+            kinds.append(_KIND_PICKLED)
+            for column in (namespaces,ids,formats,lives):
+                column.append(0)
+            values.append(self._dictionary.Code(pickle.dumps(entry,3)))
+
+        self._blockEntries += 1
+        self._count += 1
+        if len(self._columns[0]) >= BLOCK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        times = self._columns[0]
+        if len(times) < 1:
+            return
+
+        offset = self._fp.tell()
+        for column in self._columns:
+            if 'big' == sys.byteorder:
+                column.byteswap()
+            data = column.tobytes()
+            self._fp.write(data)
+            self._fp.write(bytes(_padding(len(data))))
+
+        self._blocks.append((offset,len(times),self._blockEntries,min(times),max(times)))
+        self._newBlock()
+
+    def Close(self):
+        self._flush()
+        fp = self._fp
+        fp.write(bytes(_padding(fp.tell())))
+        dictOffset = fp.tell()
+        self._dictionary.Write(fp)
+        fp.write(bytes(_padding(fp.tell())))
+
+        tableOffset = fp.tell()
+        for block in self._blocks:
+            fp.write(_BLOCK_ENTRY.pack(*block))
+
+        fp.write(_TRAILER.pack(dictOffset,tableOffset,len(self._blocks),MAGIC))
+        return self._count
+
+    def getCount(self):
+        return self._count
+
+
+## one block of a columnar file, the columns are memoryviews straight onto the mmap
+class ColumnarBlock(object):
+    def __init__(self,buffer,offset,rows,entries,minTime,maxTime):
+        self.Rows = rows
+        self.EntryCount = entries
+        self.MinTime = minTime
+        self.MaxTime = maxTime
+        self._views = []
+        for name,typeCode in _COLUMNS:
+            size = rows * array(typeCode).itemsize
+            view = memoryview(buffer)[offset:offset + size]
+            if 'big' == sys.byteorder: # file is little endian, so need a swapped copy
+                column = array(typeCode,view.tobytes())
+                column.byteswap()
+                view.release()
+            else:
+                column = view.cast(typeCode)
+                self._views.append(view)
+            self._views.append(column)
+            setattr(self,name,column)
+            offset += size + _padding(size)
+
+    # has to be done before the file can be closed
+    def Release(self):
+        for name,typeCode in _COLUMNS:
+            setattr(self,name,None)
+        for view in reversed(self._views):
+            if isinstance(view,memoryview):
+                view.release()
+        self._views = []
+
+
+## read access to a columnar save file
+class ColumnarReader(object):
+    def __init__(self,fileName):
+        self._fileName = fileName
+        if None == Compression.GetCompression(fileName):
+            self._fp = open(fileName,'rb')
+        else:
+            self._fp = tempfile.TemporaryFile()
+            try:
+                with Compression.OpenRead(fileName) as source:
+                    shutil.copyfileobj(source,self._fp)
+                self._fp.flush()
+            except Compression.DECOMPRESS_ERRORS as ex:
+                self._fp.close()
+                raise pickle.UnpicklingError("Unable to decompress {}: {}".format(fileName,ex))
+
+        try:
+            self._buffer = mmap.mmap(self._fp.fileno(),0,access=mmap.ACCESS_READ)
+        except ValueError: # empty file
+            self._fp.close()
+            raise pickle.UnpicklingError("Columnar save file " + fileName + " is empty")
+
+        try:
+            self._readTables()
+        except (struct.error,ValueError,UnicodeDecodeError) as ex:
+            self.Close()
+            raise pickle.UnpicklingError("Corrupt columnar save file {}: {}".format(fileName,ex))
+
+    def _readTables(self):
+        buffer = self._buffer
+        if len(buffer) < len(MAGIC) + _TRAILER.size or buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError("not a columnar save file")
+
+        dictOffset,tableOffset,blockCount,magic = _TRAILER.unpack_from(buffer,len(buffer) - _TRAILER.size)
+        if magic != MAGIC:
+            raise ValueError("file is truncated")
+
+        self._values = []
+        count, = struct.unpack_from('<q',buffer,dictOffset)
+        offset = dictOffset + 8
+        for num in range(count):
+            tag,length = _DICT_ENTRY.unpack_from(buffer,offset)
+            offset += _DICT_ENTRY.size
+            self._values.append(_decodeValue(tag,buffer[offset:offset + length]))
+            offset += length
+
+        self._blockTable = [_BLOCK_ENTRY.unpack_from(buffer,tableOffset + num * _BLOCK_ENTRY.size) for num in range(blockCount)]
+
+    # the decoded dictionary, is what the Namespaces/IDs/... columns index into
+    def Dictionary(self):
+        return self._values
+
+    def EntryCount(self):
+        return sum(block[2] for block in self._blockTable)
+
+    # generator of ColumnarBlock, each is released once the next one is asked for
+    def Blocks(self):
+        for blockInfo in self._blockTable:
+            block = ColumnarBlock(self._buffer,*blockInfo)
+            try:
+                yield block
+            finally:
+                block.Release()
+
+    # generator that re-creates the entries, exactly as they were written
+    def Entries(self,compact=False):
+        if compact:
+            dataClass,groupClass = MarvinData.CompactMarvinData,MarvinGroupData.CompactMarvinDataGroup
+        else:
+            dataClass,groupClass = MarvinData.MarvinData,MarvinGroupData.MarvinDataGroup
+
+        values = self._values
+        for block in self.Blocks():
+            ready = []
+            group = None
+            for times,kind,namespace,id,value,formatVersion,live in zip(block.Times,block.Kinds,block.Namespaces,block.IDs,block.Values,block.Formats,block.Lives):
+                if _KIND_PICKLED == kind:
+                    ready.append(pickle.loads(values[value]))
+                    continue
+
+                entryClass = groupClass if _KIND_GROUP == kind else dataClass
+                entry = entryClass.__new__(entryClass)
+                entry.FormatVersion = values[formatVersion]
+                entry.Value = values[value]
+                entry.ArrivalTime = times
+                entry.Namespace = values[namespace]
+                entry.ID = values[id]
+                entry.Live = values[live]
+
+                if _KIND_MEMBER == kind:
+                    group._DataList.append(entry)
+                    continue
+
+                if _KIND_GROUP == kind:
+                    entry._DataList = []
+                    group = entry
+                ready.append(entry)
+
+            block.Release()
+            for entry in ready:
+                yield entry
+
+    def Close(self):
+        self._buffer.close()
+        self._fp.close()
+
+
+# True if the start of a file (at least len(MAGIC) bytes) is a columnar save file
+def IsColumnarHeader(header):
+    return header[:len(MAGIC)] == MAGIC
+
+def IsColumnarFileName(fileName):
+    return Compression.StripCompression(fileName).lower().endswith(COLUMNAR_EXTENSION)
+
+
+# generator that returns each entry of a columnar save file
+def ReadEntries(fileName,compact=False):
+    reader = ColumnarReader(fileName)
+    try:
+        for entry in reader.Entries(compact):
+            yield entry
+
+    finally:
+        reader.Close()
+
+
+# writes all the entries to an open file, returns number written
+def WriteEntries(fp,entries):
+    writer = ColumnarWriter(fp)
+    for entry in entries:
+        writer.Write(entry)
+
+    return writer.Close()
@@ -0,0 +1,172 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Transparent compression of save files, picked by the file extension
+#   (.gz, .xz or .bz2).  Writes are split into blocks that are compressed on
+#   a thread pool (zlib/bz2/lzma let go of the GIL while they work) and each
+#   is written as its own gzip member/bz2 stream/xz stream, which the stdlib
+#   readers read back as one.
+#
+##############################################################################
+import os
+import bz2
+import gzip
+import lzma
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from Helpers import Log
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# what a corrupt compressed file raises while being read
+DECOMPRESS_ERRORS = (OSError, EOFError, lzma.LZMAError)
+
+# extension -> (open for read, compress a block)
+_CODECS = {
+    ".gz"  : (gzip.open, lambda data: gzip.compress(data,6)),
+    ".xz"  : (lzma.open, lambda data: lzma.compress(data,lzma.FORMAT_XZ,preset=3)),
+    ".bz2" : (bz2.open,  lambda data: bz2.compress(data,9)),
+}
+
+
+# returns the compression extension of fileName, or None if it is not compressed
+def GetCompression(fileName):
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension in _CODECS:
+        return extension
+
+    return None
+
+# fileName without the compression extension
+def StripCompression(fileName):
+    if None == GetCompression(fileName):
+        return fileName
+
+    return os.path.splitext(fileName)[0]
+
+
+# opens a save file for reading, decompressing on the fly if need be
+def OpenRead(fileName):
+    compression = GetCompression(fileName)
+    if None == compression:
+        return open(fileName,'rb')
+
+    return _CODECS[compression][0](fileName,'rb')
+
+
+# wraps fp (opened for writing fileName) so it compresses if the extension says so.
+# Closing what is returned does not close fp.
+def OpenWrite(fileName,fp):
+    compression = GetCompression(fileName)
+    if None == compression:
+        return _Uncompressed(fp)
+
+    return BlockCompressor(fp,_CODECS[compression][1],fileName)
+
+
+## passes straight through to the file
+class _Uncompressed(object):
+    def __init__(self,fp):
+        self._fp = fp
+        self.write = fp.write
+        self.tell = fp.tell
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        pass
+
+    def close(self):
+        pass
+
+
+## file like object that compresses blocks of what is written to it in parallel
+class BlockCompressor(object):
+    def __init__(self,fp,compressFn,fileName,blockSize=BLOCK_SIZE,workers=None):
+        self._fp = fp
+        self._compressFn = compressFn
+        self._fileName = fileName
+        self._blockSize = blockSize
+        self._workers = workers if None != workers else (os.cpu_count() or 1)
+        self._pool = ThreadPoolExecutor(self._workers)
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._inBytes = 0
+        self._outBytes = 0
+        self._startTime = time.time()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        if None == excType:
+            self.close()
+        else:
+            self._abort()
+
+    def write(self,data):
+        self._buffer += data
+        self._inBytes += len(data)
+        if len(self._buffer) >= self._blockSize:
+            self._submit()
+        return len(data)
+
+    # position in the uncompressed data
+    def tell(self):
+        return self._inBytes
+
+    def _submit(self):
+        if len(self._buffer) > 0:
+            self._pending.append(self._pool.submit(self._compressFn,bytes(self._buffer)))
+            self._buffer = bytearray()
+
+        # blocks are written in order, don't let too many pile up in memory
+        while len(self._pending) > self._workers * 2:
+            self._writeBlock()
+
+    def _writeBlock(self):
+        data = self._pending.popleft().result()
+        self._fp.write(data)
+        self._outBytes += len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+
+        try:
+            self._submit()
+            while len(self._pending) > 0:
+                self._writeBlock()
+        finally:
+            self._closed = True
+            self._pool.shutdown()
+
+        elapsed = max(time.time() - self._startTime,0.000001)
+        ratio = self._inBytes / self._outBytes if self._outBytes > 0 else 0
+        Log.getLogger().info("Compressed {} to {:,} bytes from {:,} (ratio {:.1f}:1) at {:.1f} MB/s".format(self._fileName,self._outBytes,self._inBytes,ratio,self._inBytes / elapsed / (1024 * 1024)))
+
+    def _abort(self):
+        self._closed = True
+        for future in self._pending:
+            future.cancel()
+        self._pool.shutdown()
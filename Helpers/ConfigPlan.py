@@ -0,0 +1,391 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   A Fudd config compiled into a plan before any save file is loaded.  Each
+#   <Source> becomes a SourcePlan, its <Namespace> options and file actions
+#   become Operations with every attribute checked and converted, so a bad
+#   config fails straight away rather than part way through a long run.
+#   FileHandler runs the plan.  With a cache directory the compiled plan is
+#   kept there as JSON, under a hash of the config and of this file, and is
+#   used from there until either changes.
+#
+##############################################################################
+import os
+import json
+import hashlib
+import pickle
+import xml.dom.minidom
+
+from Helpers import Log
+from Helpers import BiffStream
+
+# saved plans made by a different version are compiled again
+_PLAN_VERSION = 2
+
+
+# Just a helper in parsing XML, sends just the child nodes that match
+def getChildNodes(baseNode,childName):
+    retList=[]
+    for child in baseNode.childNodes:
+        if child.nodeName == childName:  # could make this case independent if wanted to
+            retList.append(child)
+
+    return retList
+
+
+## one thing to do to a namespace (or to every namespace, for <Trim> and <Span>).
+## Name is the element it came from, the checked values of its attributes are
+## attributes of the Operation (ID, Value, Time ...)
+class Operation(object):
+    def __init__(self,name,description,**args):
+        self.Name = name
+        self.Description = description
+        self.__dict__.update(args)
+
+## the options for a <Namespace>, Name can be a wildcard pattern
+class NamespacePlan(object):
+    def __init__(self,name,operations):
+        self.Name = name
+        self.Operations = operations
+
+## everything to be done to one <Source>, in the order FileHandler does it
+class SourcePlan(object):
+    def __init__(self,fileName):
+        self.File = fileName
+        self.InsertTime = None # None, 'Append' or a time
+        self.Namespaces = []
+        self.FileActions = [] # <Trim> and <Span>, done after the namespaces
+        self.RemoveNamespaces = []
+
+## a whole config
+class ConfigPlan(object):
+    def __init__(self,sources):
+        self.Sources = sources
+
+
+def _invalid(errorMsg):
+    Log.getLogger().error(errorMsg)
+    raise pickle.UnpicklingError()
+
+def _attributes(node):
+    if None == node.attributes:
+        return {}
+
+    return dict((name,node.attributes[name].nodeValue) for name in node.attributes.keys())
+
+# the text of an element, None if there is none
+def _text(node):
+    if None == node.firstChild:
+        return None
+
+    return node.firstChild.nodeValue
+
+def _toInt(value,errorMsg):
+    try:
+        return int(value)
+    except Exception:
+        _invalid(errorMsg + str(value))
+
+# the text of the only childName of node
+def _childInt(node,childName,errorMsg):
+    children = getChildNodes(node,childName)
+    if 1 != len(children):
+        _invalid(errorMsg)
+
+    return _toInt(_text(children[0]),errorMsg)
+
+# like '<BoundID ID="Total*" Max="10">' or '<RenameNS> X'
+def _describe(node,attributes,text):
+    description = "<" + node.nodeName
+    for name,value in attributes.items():
+        description += ' {}="{}"'.format(name,value)
+    description += ">"
+
+    if len(attributes) < 1 and None != text and len(text.strip()) > 0:
+        description += " " + text.strip()
+
+    return description
+
+
+# (start, end) of a <Trim> or <TrimNS>
+def _trimTimes(node,what):
+    try:
+        trimStart = int(_text(getChildNodes(node,"StartTime")[0]))
+        trimEnd = int(_text(getChildNodes(node,"EndTime")[0]))
+    except Exception:
+        _invalid("Invalid " + what + ".  Must have valid <StartTime> and <EndTime>.")
+
+    if trimStart < 0:
+        _invalid("Invalid " + what + " - StartTime < 0.")
+
+    if trimEnd < 0:
+        _invalid("Invalid " + what + " - EndTime < 0.")
+
+    if trimEnd < trimStart:
+        _invalid("Invalid " + what + " - EndTime < StartTime.")
+
+    return trimStart,trimEnd
+
+def _compileOption(node):
+    nodeName = node.nodeName
+    attributes = _attributes(node)
+    text = _text(node)
+    description = _describe(node,attributes,text)
+
+    def required(name,what):
+        if not name in attributes:
+            _invalid("Invalid <Namespace> - " + what + " - no " + name + " specified.")
+        return attributes[name]
+
+    if nodeName in ("RenameNS","DuplicateNS","MergeWithNS"):
+        if None == text or 0 == len(text.strip()):
+            _invalid("Invalid <Namespace> - " + nodeName + " - no namespace specified.")
+        return Operation(nodeName,description,Namespace=text)
+
+    if nodeName == "DeleteID":
+        return Operation(nodeName,description,ID=required("ID","DeleteID"))
+
+    if nodeName == "TrimNS":
+        trimStart,trimEnd = _trimTimes(node,"Namespace <TrimNS>")
+        return Operation(nodeName,description,StartTime=trimStart,EndTime=trimEnd)
+
+    if nodeName == "ScaleID":
+        factor = required("Factor","Scale")
+        ID = required("ID","Scale")
+        precision = None
+        if "Precision" in attributes:
+            precision = _toInt(attributes["Precision"],"Invalid <Namespace> - Scale Precision - invalid value: ")
+        try:
+            factor = float(factor)
+        except Exception:
+            _invalid("Invalid <Namespace> - Scale - invalid value: " + factor)
+        return Operation(nodeName,description,ID=ID,Factor=factor,Precision=precision)
+
+    if nodeName == "BoundID":
+        ID = required("ID","Bound")
+        maxValue = attributes.get("Max")
+        minValue = attributes.get("Min")
+        if None == minValue and None == maxValue:
+            _invalid("Invalid <Namespace> - BoundID without Min or Max value specified.")
+        for limit,name in ((minValue,"Min"),(maxValue,"Max")):
+            if None != limit:
+                try:
+                    float(limit)
+                except Exception:
+                    _invalid("Invalid <Namespace> - " + name + " BoundID value of " + limit +" is invalid.")
+        # left as text, it is converted the same way when used
+        return Operation(nodeName,description,ID=ID,Min=minValue,Max=maxValue)
+
+    if nodeName == "AddValue":
+        ID = required("ID","AddValue")
+        value = required("Value","AddValue")
+        try:
+            valueToAdd = float(value)
+        except Exception:
+            _invalid("Invalid <Namespace> - AddValue - ID: " + ID + " has invalid Value: " + value)
+        parts = value.split(".")
+        precision = len(parts[1]) if len(parts) > 1 else 0
+        return Operation(nodeName,description,ID=ID,Value=valueToAdd,Precision=precision)
+
+    if nodeName == "InsertID":
+        ID = required("ID","Insert")
+        value = required("Value","Insert")
+        insertTime = _toInt(required("Time","Insert"),"Invalid <Namespace> - Insert - invalid Time specified:")
+        interval = None
+        if "Interval" in attributes:
+            interval = _toInt(attributes["Interval"],"Invalid <Namespace> - Insert - invalid Interval specified:")
+            if interval <= 0:
+                _invalid("Invalid <Namespace> - Insert - Interval must be > 0:" + attributes["Interval"])
+        return Operation(nodeName,description,ID=ID,Value=value,Time=insertTime,Interval=interval)
+
+    if nodeName == "InitAllID":
+        value = required("Value","InitAll")
+        insertTime = _toInt(required("Time","InitAll"),"Invalid <Namespace> - InitAll - invalid Time specified:")
+        return Operation(nodeName,description,Value=value,Time=insertTime)
+
+    if nodeName == "RenameID":
+        return Operation(nodeName,description,ID=required("ID","RenameID"),NewID=required("NewID","RenameID"))
+
+    if nodeName == "SpanNS":
+        runTime = _childInt(node,"RunTime","Invalid <Namespace> - SpanNS - needs one numeric <RunTime>: ")
+        return Operation(nodeName,description,RunTime=runTime)
+
+    _invalid("Invalid Namespace Option <" + nodeName +">.")
+
+
+# plan for the options of a <Namespace>
+def CompileNamespace(node):
+    if not "Name" in node.attributes:
+        _invalid("Invalid <Namespace> - requires Name attribute.")
+
+    if len(getChildNodes(node,"TrimNS")) > 1:
+        _invalid("Only 1 <TrimNS> per Namespace.")
+
+    operations = []
+    renamed = False
+    for childNode in node.childNodes:
+        if childNode.nodeName == "#text" or childNode.nodeName == '#comment':
+            continue
+
+        # only the first rename of a namespace has ever counted
+        if childNode.nodeName == "RenameNS":
+            if renamed:
+                continue
+            renamed = True
+
+        operations.append(_compileOption(childNode))
+
+    return NamespacePlan(node.attributes["Name"].nodeValue,operations)
+
+
+# plan for a <Source>
+def CompileSource(sourceNode):
+    if not "File" in sourceNode.attributes:
+        _invalid("No File specified for source")
+
+    source = SourcePlan(sourceNode.attributes["File"].nodeValue)
+
+    insertTimeEntry = getChildNodes(sourceNode,"InsertTime")
+    if len(insertTimeEntry) > 1:
+        _invalid("Only 1 insert time per source.")
+
+    elif 1 == len(insertTimeEntry):
+        if _text(insertTimeEntry[0]) == "Append":
+            source.InsertTime = "Append"
+        else:
+            source.InsertTime = _toInt(_text(insertTimeEntry[0]),"Invalid numeric value for <InsertTime>: ")
+
+    for name in ("Trim","Span"):
+        if len(getChildNodes(sourceNode,name)) > 1:
+            _invalid("Only 1 <" + name + "> per source.")
+
+    for childNode in sourceNode.childNodes:
+        nodeName = childNode.nodeName
+        if nodeName == "#text" or nodeName == '#comment':
+            continue
+
+        action = nodeName.lower()
+        if action == "namespace":
+            if nodeName == "Namespace":
+                source.Namespaces.append(CompileNamespace(childNode))
+
+        elif action == "removenamespace":
+            if nodeName == "RemoveNamespace":
+                if None == _text(childNode):
+                    _invalid("Invalid <RemoveNamespace> - no namespace specified.")
+                source.RemoveNamespaces.append(_text(childNode))
+
+        elif action == "trim":
+            if nodeName == "Trim":
+                trimStart,trimEnd = _trimTimes(childNode,"<Trim>")
+                source.FileActions.append(Operation(nodeName,"<Trim> {} to {}".format(trimStart,trimEnd),StartTime=trimStart,EndTime=trimEnd))
+
+        elif action == "span":
+            if nodeName == "Span":
+                runTime = _childInt(childNode,"RunTime","Invalid <Span>, must have one numeric <RunTime>: ")
+                source.FileActions.append(Operation(nodeName,"<Span> {}".format(runTime),RunTime=runTime))
+
+        elif action != "inserttime":
+            _invalid("Invalid <Source> option <" + nodeName + ">")
+
+    return source
+
+
+# plan for a config, from its XML
+def Compile(data):
+    domDoc = xml.dom.minidom.parseString(data)
+    return ConfigPlan([CompileSource(source) for source in domDoc.getElementsByTagName('Source')])
+
+
+# hash of this file, the plan classes and how they are filled in are in it, so a change
+# to them means plans saved before are not used even if _PLAN_VERSION wasn't changed
+def _moduleHash():
+    try:
+        with open(__file__,'rb') as fp:
+            return hashlib.sha1(fp.read()).hexdigest()
+
+    except OSError:
+        return "-"
+
+# the name of the saved plan of a config, from the hash of it
+def GetPlanFileName(cacheDir,configHash):
+    key = hashlib.sha1(" ".join([str(_PLAN_VERSION),_moduleHash(),configHash]).encode()).hexdigest()
+    return os.path.join(cacheDir,"plan-" + key + ".json")
+
+
+_PLAN_CLASSES = dict((planClass.__name__,planClass) for planClass in (ConfigPlan,SourcePlan,NamespacePlan,Operation))
+
+# a plan as plain lists and dicts, for json
+def _toJson(value):
+    if isinstance(value,list):
+        return [_toJson(item) for item in value]
+
+    if value.__class__.__name__ in _PLAN_CLASSES:
+        return {"class" : value.__class__.__name__, "fields" : dict((name,_toJson(item)) for name,item in vars(value).items())}
+
+    return value
+
+# the other way, only ever makes the plan classes
+def _fromJson(value):
+    if isinstance(value,list):
+        return [_fromJson(item) for item in value]
+
+    if isinstance(value,dict):
+        planClass = _PLAN_CLASSES[value["class"]]
+        plan = planClass.__new__(planClass)
+        plan.__dict__.update((name,_fromJson(item)) for name,item in value["fields"].items())
+        return plan
+
+    return value
+
+def _readSaved(planFileName):
+    try:
+        with open(planFileName,'r') as fp:
+            plan = _fromJson(json.load(fp))
+
+    except (OSError,ValueError,KeyError,TypeError):
+        return None
+
+    if not isinstance(plan,ConfigPlan):
+        return None
+
+    return plan
+
+# the plan for a config file.  With a cacheDir the saved one if it was made from the same
+# config, otherwise it is compiled and saved there for next time
+def GetPlan(fileName,cacheDir=None):
+    with open(fileName,'rb') as fp:
+        data = fp.read()
+
+    if None == cacheDir:
+        return Compile(data)
+
+    planFileName = GetPlanFileName(cacheDir,hashlib.sha1(data).hexdigest())
+    plan = _readSaved(planFileName)
+    if None != plan:
+        Log.getLogger().info("Using compiled plan " + planFileName)
+        return plan
+
+    plan = Compile(data)
+    try:
+        os.makedirs(cacheDir,exist_ok=True)
+        with BiffStream.AtomicOutput(planFileName) as fp:
+            fp.write(json.dumps(_toJson(plan)).encode())
+
+    except OSError as ex:
+        Log.getLogger().info("Unable to save plan for " + fileName + ": " + str(ex))
+
+    return plan
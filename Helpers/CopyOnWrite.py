@@ -0,0 +1,199 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Lets a duplicated namespace share the datapoint objects of the one it was
+#   copied from rather than deep copying them all.  Namespaces that share are
+#   tracked, and before a datapoint in one of those is changed it is copied
+#   (only the ones being changed if the change is to some IDs).  The name of
+#   a copied or renamed namespace is kept once for the namespace and put on its
+#   datapoints as they are written out, so a rename doesn't touch them.
+#
+##############################################################################
+import copy
+
+from Helpers import Merge
+from Data import MarvinGroupData
+from Data import Timeline
+
+
+# shallow copy of an entry, a group gets its own list of copied datapoints.  Namespace
+# and ID (if not None) are set on the copy
+def CopyEntry(entry,namespace=None,ID=None):
+    newEntry = copy.copy(entry)
+    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+        newEntry._DataList = [CopyEntry(subEntry,namespace,ID) for subEntry in entry._DataList]
+        return newEntry
+
+    if None != namespace:
+        newEntry.Namespace = namespace
+    if None != ID:
+        newEntry.ID = ID
+
+    return newEntry
+
+# entries with the ones that have a datapoint with one of IDs (all if IDs is None) copied,
+# a group only gets copies of those datapoints.  Is the same kind of list as entries
+def CopyEntries(entries,IDs=None,namespace=None):
+    newEntries = []
+    for entry in entries:
+        if None == IDs:
+            entry = CopyEntry(entry,namespace)
+
+        elif isinstance(entry,MarvinGroupData.MarvinDataGroup):
+            if any(subEntry.ID in IDs for subEntry in entry._DataList):
+                group = copy.copy(entry)
+                group._DataList = [CopyEntry(subEntry,namespace) if subEntry.ID in IDs else subEntry for subEntry in entry._DataList]
+                entry = group
+
+        elif entry.ID in IDs:
+            entry = CopyEntry(entry,namespace)
+
+        newEntries.append(entry)
+
+    if isinstance(entries,Timeline.Timeline):
+        return Timeline.Timeline(newEntries)
+
+    return newEntries
+
+
+# renames a key of a dict, keeping it in the same place in the order
+def RenameKey(mapping,oldKey,newKey):
+    items = list(mapping.items())
+    mapping.clear()
+    for key,value in items:
+        mapping[newKey if key == oldKey else key] = value
+
+
+## entries of a namespace, written out with the namespace set on them (if it is
+## given).  If copyEntries each is a copy, as the datapoints are shared and what the
+## output does to them, like moving their time, must not show up in another namespace
+class StampedEntries(object):
+    def __init__(self,entries,namespace,copyEntries):
+        self._entries = entries
+        self._namespace = namespace
+        self._copyEntries = copyEntries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        for entry in self._entries:
+            if self._copyEntries:
+                yield CopyEntry(entry,self._namespace)
+
+            else:
+                if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+                    for subEntry in entry._DataList:
+                        subEntry.Namespace = self._namespace
+                else:
+                    entry.Namespace = self._namespace
+                yield entry
+
+    # saves making copies just to check
+    def IsTimeOrdered(self):
+        return Merge.IsTimeOrdered(self._entries)
+
+
+## one namespace (in one handler) sharing datapoints with others, Group is the set
+## of all the members sharing them, itself included
+class _Member(object):
+    def __init__(self,group):
+        self.Group = group
+        group.add(self)
+
+## which namespaces share datapoints, and which have to have their name put on their
+## datapoints when written (they were copied or renamed, so the datapoints still have
+## the old one).  Both sides of a copy have to copy a datapoint before changing it, once
+## all the others have their own copies the one left doesn't
+class SharedNamespaces(object):
+    def __init__(self):
+        self._members = {}
+        self._stampNames = {}
+
+    def _member(self,namespace):
+        if not namespace in self._members:
+            self._members[namespace] = _Member(set())
+        return self._members[namespace]
+
+    # True if namespace still shares datapoints with another one
+    def IsShared(self,namespace):
+        return namespace in self._members and len(self._members[namespace].Group) > 1
+
+    def _leave(self,namespace):
+        member = self._members.pop(namespace,None)
+        if None != member:
+            member.Group.discard(member)
+
+    # toName was given fromName's datapoints
+    def Share(self,fromName,toName):
+        self._leave(toName)
+        self._members[toName] = _Member(self._member(fromName).Group)
+        self._stampNames[toName] = toName
+
+    # fromName's datapoints were merged into toName, which keeps its own as well, so it
+    # shares with everything either of them shared with
+    def Merge(self,fromName,toName):
+        group = self._member(toName).Group
+        otherGroup = self._member(fromName).Group
+        if not otherGroup is group:
+            for member in otherGroup:
+                member.Group = group
+            group.update(otherGroup)
+        self._stampNames[toName] = toName
+
+    # namespace oldName is now called newName, and is kept under key (newName unless that was taken)
+    def Rename(self,oldName,newName,key):
+        if oldName in self._members:
+            self._members[key] = self._members.pop(oldName)
+        self._stampNames.pop(oldName,None)
+        self._stampNames[key] = newName
+
+    # for a handler given the same lists of datapoints as this one's, everything is shared
+    # between the two of them from now on
+    def Clone(self,namespaces):
+        clone = SharedNamespaces()
+        for namespace in namespaces:
+            clone._members[namespace] = _Member(self._member(namespace).Group)
+        clone._stampNames = dict(self._stampNames)
+        return clone
+
+    # namespace has its own copy of everything now, with the right name (or has gone away)
+    def Forget(self,namespace):
+        self._leave(namespace)
+        self._stampNames.pop(namespace,None)
+
+    # copies what is about to be changed in a namespace (the datapoints with one of IDs,
+    # or everything if IDs is None), returns the entries to use from now on
+    def MakeWritable(self,namespace,entries,IDs=None):
+        if not self.IsShared(namespace):
+            return entries
+
+        newEntries = CopyEntries(entries,IDs,self._stampNames.get(namespace))
+        if None == IDs:
+            self.Forget(namespace)
+
+        return newEntries
+
+    # the entries of a namespace, to be written out
+    def OutputEntries(self,namespace,entries):
+        stampName = self._stampNames.get(namespace)
+        if self.IsShared(namespace):
+            return StampedEntries(entries,stampName,True)
+
+        if None != stampName:
+            return StampedEntries(entries,stampName,False)
+
+        return entries
@@ -0,0 +1,155 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Out of core support for files that don't fit in memory once unpickled.
+#   Input is cut into chunks that fit within a memory limit, each chunk is
+#   processed and written to disk as a sorted 'run', then the runs are
+#   merged back together one entry at a time.
+#
+##############################################################################
+import os
+import sys
+import heapq
+import shutil
+import tempfile
+
+from Helpers import Log
+from Helpers import BiffStream
+from Data import MarvinGroupData
+
+_SIZE_UNITS = {'K' : 1024, 'M' : 1024**2, 'G' : 1024**3, 'T' : 1024**4}
+
+
+# converts a size like 512M or 4G (or plain bytes) to bytes, None if is not valid
+def ParseSize(sizeStr):
+    sizeStr = sizeStr.strip().upper()
+    if sizeStr.endswith('B'):
+        sizeStr = sizeStr[:-1]
+
+    multiplier = 1
+    if len(sizeStr) > 0 and sizeStr[-1] in _SIZE_UNITS:
+        multiplier = _SIZE_UNITS[sizeStr[-1]]
+        sizeStr = sizeStr[:-1]
+
+    try:
+        size = int(float(sizeStr) * multiplier)
+    except ValueError:
+        return None
+
+    if size <= 0:
+        return None
+
+    return size
+
+
+def _dataSize(entry):
+    size = sys.getsizeof(entry)
+    for name in ('FormatVersion','Value','ArrivalTime','Namespace','ID','Live'):
+        size += sys.getsizeof(getattr(entry,name,None))
+    return size
+
+# rough number of bytes an entry takes in memory, strings are counted for every
+# entry even though some are shared, so errs on the high side
+def EntrySize(entry):
+    if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+        return _dataSize(entry) + sys.getsizeof(entry._DataList) + sum(_dataSize(subEntry) for subEntry in entry._DataList)
+
+    return _dataSize(entry)
+
+
+# generator that cuts entries into lists that take about memLimit bytes of memory at most
+def Chunks(entries,memLimit):
+    chunk = []
+    chunkSize = 0
+    for entry in entries:
+        chunk.append(entry)
+        chunkSize += EntrySize(entry)
+        if chunkSize >= memLimit:
+            yield chunk
+            chunk = []
+            chunkSize = 0
+
+    if len(chunk) > 0:
+        yield chunk
+
+
+## a sorted run written out to disk, is read back a chunk at a time
+class Run(object):
+    def __init__(self,fileName,count):
+        self._fileName = fileName
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return BiffStream.ReadEntries(self._fileName,compact=True)
+
+    # runs are always written in order
+    def IsTimeOrdered(self):
+        return True
+
+    # so a Run can be used where the namespace lists of a handler are
+    def getNamespaceLists(self):
+        return [self]
+
+
+# writes the items (already in order) to fileName, returns how many there were
+def WriteRun(fileName,items):
+    with open(fileName,'wb') as fp:
+        writer = BiffStream.BiffWriter(fp)
+        for item in items:
+            writer.Write(item)
+        return writer.Close()
+
+
+## temporary directory of runs, removed on Close()
+class RunStore(object):
+    def __init__(self,tmpDir=None):
+        self._dir = tempfile.mkdtemp(prefix="fudd-",dir=tmpDir)
+        self._runCount = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,excType,excValue,traceback):
+        self.Close()
+
+    # name for a new run in the store, for when it is written somewhere else (like another process)
+    def NewRunFileName(self):
+        fileName = os.path.join(self._dir,"run{}.biff".format(self._runCount))
+        self._runCount += 1
+        return fileName
+
+    # writes the items (already in order) out as a run
+    def AddRun(self,items):
+        fileName = self.NewRunFileName()
+        count = WriteRun(fileName,items)
+
+        Log.getLogger().info("Spilled {} entries to {}".format(count,fileName))
+        return Run(fileName,count)
+
+    def Close(self):
+        shutil.rmtree(self._dir,ignore_errors=True)
+
+
+# generator that merges runs by key, for equal keys items from the earlier run come first
+def MergeRuns(runs,key):
+    runs = list(runs)
+    if 1 == len(runs):
+        return iter(runs[0])
+
+    return heapq.merge(*runs,key=key)
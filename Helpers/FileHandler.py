@@ -14,258 +14,151 @@
 #  limitations under the License.
 ##############################################################################
 #    File Abstract: 
-#   Where the processing of the namespaces, files etc occurs
+#   Where the processing of the namespaces, files etc occurs, runs the plan
+#   ConfigPlan made of a <Source>
 #
 ##############################################################################
 import os
 import logging
 import xml.dom.minidom
 import pickle
-import copy
-import fnmatch
 from  pprint import pprint
 
 from Helpers import Log
+from Helpers import Matcher
+from Helpers import BiffStream
+from Helpers import Merge
+from Helpers import IdIndex
+from Helpers import Transforms
+from Helpers import CopyOnWrite
+from Helpers import ConfigPlan
+from Helpers import ExternalSort
 from Data import MarvinGroupData
 from Data import MarvinData
+from Data import Timeline
 
 
-def Matches(name,pattern):
-    return fnmatch.fnmatch(name.upper(),pattern.upper())
-
-# Just a helper in parsing XML, sends just the child nodes that match
-def getChildNodes(baseNode,childName):
-    retList=[]
-    for child in baseNode.childNodes:
-        if child.nodeName == childName:  # could make this case independent if wanted to
-            retList.append(child)
-
-    return retList
-
-# Will scale a given value - must be numeric
-def ScaleValue(entry,scaleVal,Precision):
-    try:
-        fVal = float(entry.Value)
-        scaleVal = float(scaleVal)
-    except:
-        Log.getLogger().info("Failed to scale ID: "  + entry.ID + " as it is not a numeric value.  Ignoring.")
-        return
-
-    fVal *= scaleVal
-    if None != Precision:
-        fVal = format( fVal,'.' + str(Precision) + 'f')
-
-    entry.Value = str(fVal)
-        
-
-# if the value is outside of the min/max passed, set it to the min/max value
-def BoundValue(entry,min,max):
-    retVal = False
-    if None == min and None == max:
-        Log.getLogger().error("Invalid <Namespace> - BoundID without Min or Max value specified.")
-        raise pickle.UnpicklingError()
-
-    try:
-        float(entry.Value)
-    except:
-        Log.getLogger().info("Invalid <Namespace> - BoundID tried to bound non numeric data point, ID="+entry.ID)
-        return
-
-
-    if None != min:
-        try:
-            min = float(min)
-            if float(entry.Value) < min:
-                entry.Value = str(min)
-                retVal = True
-        except:
-            Log.getLogger().error("Invalid <Namespace> - Min BoundID value of " + min +" is invalid.")
-            raise pickle.UnpicklingError()
-
-    if None != max:
-        try:
-            max = float(max)
-            if float(entry.Value) > max:
-                entry.Value = str(max)
-                retVal = True
-        except:
-            Log.getLogger().error("Invalid <Namespace> - Max BoundID value of " + max +" is invalid.")
-            raise pickle.UnpicklingError()
-
-    return retVal
+Matches = Matcher.Matches
 
+getChildNodes = ConfigPlan.getChildNodes
 
 ## helper routine, combines list 1 and list 2, sorted by Arrival Time
 def mergeLists(srcList,listToMerge):
-    if srcList == None:
-        return list(listToMerge)
-
-    if len(srcList) == 0:
-        return list(listToMerge)
-
-    srcList.extend(listToMerge)
-
-    mergedList = sorted(srcList,key=lambda entry: entry.ArrivalTime)
+    return Merge.MergeLists(srcList,listToMerge)
+
+## helper routine, binary search of a time ordered list, returns how many entries
+## at the start of it have an ArrivalTime <= arrivalTime
+def countUpToTime(entries,arrivalTime):
+    if isinstance(entries,Timeline.Timeline):
+        return entries.BisectTime(arrivalTime,after=True)
+
+    low = 0
+    high = len(entries)
+    while low < high:
+        middle = (low + high) // 2
+        if entries[middle].ArrivalTime <= arrivalTime:
+            low = middle + 1
+        else:
+            high = middle
 
-    return mergedList
+    return low
 
-## my worker class that does all the real work
+## my worker class that does all the real work.  Is given the SourcePlan of a <Source>
+## (or the <Source> itself, which is compiled first)
 class FileHandler(object):
-    def __init__(self,baseNode):
-        self._sourceFile = baseNode.attributes["File"].nodeValue
-        Log.getLogger().info("Processing " + self._sourceFile)
-        with open(self._sourceFile,'rb') as fp:
-            try:
-                self._entries = pickle.load(fp)
-                
-            except pickle.UnpicklingError as ex:
-                Log.getLogger().error("Invlid BIFF save file specified: " + self._sourceFile)
-                raise
-
-        self.getInsertTime(baseNode)
-        entryCount = self.createNamespaceMap()
-        Log.getLogger().info(self._sourceFile + " contains " + str(len(self._namespaceMap)) + " namespaces and " + str(entryCount) + " datapoints.")
+    def __init__(self,source):
+        if not isinstance(source,ConfigPlan.SourcePlan):
+            source = ConfigPlan.CompileSource(source)
 
-        self.HandleIndividualNamespaceProcessing(baseNode)
-        self.ProcessFileActions(baseNode)
+        self._sourceFile = source.File
+        Log.getLogger().info("Processing " + self._sourceFile)
+        self.insertTime = source.InsertTime
+        try:
+            entryCount = self.createNamespaceMap(BiffStream.ReadEntries(self._sourceFile,compact=True))
 
-    # reads time to insert from config time, could be 'Append' or an actual value, or doesn't exist
-    def getInsertTime(self,baseNode):
-        insertTimeEntry = getChildNodes(baseNode,"InsertTime")
-        
-        if None == insertTimeEntry or 0 == len(insertTimeEntry):
-            self.insertTime = None
+        except pickle.UnpicklingError as ex:
+            Log.getLogger().error("Invlid BIFF save file specified: " + self._sourceFile)
+            raise
 
-        elif len(insertTimeEntry) > 1:
-            Log.getLogger().error("Only 1 insert time per source.")
-            raise pickle.UnpicklingError()
+        Log.getLogger().info(self._sourceFile + " contains " + str(len(self._namespaceMap)) + " namespaces and " + str(entryCount) + " datapoints.")
 
-        elif insertTimeEntry[0].firstChild.nodeValue == "Append":
-            self.insertTime = "Append"
-        else:
-            try:
-                self.insertTime = int(insertTimeEntry[0].firstChild.nodeValue)
-            except:
-                Log.getLogger().error("Invalid numeric value for <InsertTime>: " + insertTimeEntry[0].firstChild.nodeValue)
-                raise pickle.UnpicklingError()
+        self.HandleIndividualNamespaceProcessing(source)
+        self.ProcessFileActions(source)
 
     ## nukes namespace from stream
-    def ProcessRemoveNamespaces(self,baseNode):
-        childNodes = getChildNodes(baseNode,"RemoveNamespace")
-        for node in childNodes:
-            namespace = node.firstChild.nodeValue
+    def ProcessRemoveNamespaces(self,source):
+        for namespace in source.RemoveNamespaces:
             if namespace in self._namespaceMap:
                 del(self._namespaceMap[namespace])
+                self._shared.Forget(namespace)
             else:
                 Log.getLogger().info("xxxInvalid <RemoveNamespace> namespace: " + namespace + " does not exist")
                 #raise pickle.UnpicklingError()
 
-    ## goes through the valid actions to perform on entire file, like when to insert, trim, etc.
-    def ProcessFileActions(self,baseNode):
-        for childNode in baseNode.childNodes:
-            nodeName = childNode.nodeName
-            if nodeName == "#text" or nodeName == '#comment':
-                continue
+    ## the actions to perform on entire file (trim, span), then the namespaces to remove
+    def ProcessFileActions(self,source):
+        for operation in source.FileActions:
+            if operation.Name == "Trim":
+                for namespace in self._namespaceMap:
+                    self.TrimNamespace(namespace,operation.StartTime,operation.EndTime)
 
-            action = nodeName.lower()
-
-            if action == "inserttime":
-                pass
-            elif action == "trim":
-                ## Handle <Trim>
-                trimEntry = getChildNodes(baseNode,"Trim")
-        
-                if None == trimEntry or 0 == len(trimEntry):
-                    trimStart = None #indicate natural insertion time
-                    trimEnd = None #indicate natural insertion time
-
-                elif len(trimEntry) > 1:
-                    Log.getLogger().error("Only 1 <Trim> per source.")
-                    raise pickle.UnpicklingError()
-                else:
-                    try:
-                        trimStart = int(getChildNodes(trimEntry[0],"StartTime")[0].firstChild.nodeValue)
-                        trimEnd = int(getChildNodes(trimEntry[0],"EndTime")[0].firstChild.nodeValue)
-                    except Exception as Ex:
-                        Log.getLogger().error("Invalid <Trim>.  Must have valid <StartTime> and <EndTime>.")
-                        raise pickle.UnpicklingError()
-
-                    for namespace in self._namespaceMap:
-                        self.TrimNamespace(namespace,trimStart,trimEnd)
-            
-            elif action == "span":
-                ## Handle <Span>
-                spanEntry = getChildNodes(baseNode,"Span")
-        
-                if None == spanEntry or 0 == len(spanEntry):
-                    spanTime = None #indicate natural insertion time
+            elif operation.Name == "Span":
+                for namespace in self._namespaceMap:
+                    self.SpanNamespaceWorker(namespace,operation.RunTime)
 
-                elif len(spanEntry) > 1:
-                    Log.getLogger().error("Only 1 <Span> per source.")
-                    raise pickle.UnpicklingError()
+        self.ProcessRemoveNamespaces(source)
 
-                else:
-                    try:
-                        runTime = getChildNodes(spanEntry[0],"RunTime")
-                        if len(runTime) == 0:
-                            Log.getLogger().error("Invalid <Span>, must have <Runtime>: ")
-                            raise pickle.UnpicklingError()
-
-                        if len(runTime) > 1:
-                            Log.getLogger().error("Invalid <Span>, only 1 <Runtime>")
-                            raise pickle.UnpicklingError()
-
-                        spanTime = int(runTime[0].firstChild.nodeValue)
-                    except Exception as Ex:
-                        Log.getLogger().error("Invalid numeric value for <Span>: " + runTime[0].firstChild.nodeValue)
-                        raise pickle.UnpicklingError()
-
-                    for namespace in self._namespaceMap:
-                        self.SpanNamespaceWorker(namespace,spanTime)
-
-            elif action == "removenamespace":
-                pass
-            elif action == "namespace":
-                pass
-            else:
-                Log.getLogger().error("Invalid <Source> option <" + nodeName + ">")
-                raise pickle.UnpicklingError()
-        self.ProcessRemoveNamespaces(baseNode)
-                    
-
-    def HandleIndividualNamespaceProcessing(self,baseNode):
-        ## Handle <Namespace>
-        namespaces = getChildNodes(baseNode,"Namespace")
-        for namespace in namespaces:
-            if "Name" in namespace.attributes:
-                name = namespace.attributes["Name"].nodeValue
-                self.ProcessNamespaceManipulation(namespace,name)
-
-            else:
-                Log.getLogger().error("Invalid <Namespace> - requires Name attribute.")
-                raise pickle.UnpicklingError()
+    def HandleIndividualNamespaceProcessing(self,source):
+        for namespacePlan in source.Namespaces:
+            self.ProcessNamespaceManipulation(namespacePlan,namespacePlan.Name)
 
     # checks to see if an ID exists in a namespace
     def existsID(self,namespace,ID):
-        ID = ID.lower()
-        for entry in self._namespaceMap[namespace]:
-            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                for subEntry in entry._DataList:
-                    if subEntry.ID.lower() == ID:
-                        return True
-            elif entry.ID.lower() == ID:
-                return True
+        return self.__getIdIndex(namespace).Exists(ID)
+
+    # index of the IDs in a namespace, built when first needed and again if the namespace
+    # has been given a new list.  Things that change the entries in a list keep it up to date
+    def __getIdIndex(self,namespace):
+        entries = self._namespaceMap[namespace]
+        index = self._idIndexMap.get(namespace)
+        if None == index or not index.IsFor(entries):
+            index = IdIndex.IdIndex(entries)
+            self._idIndexMap[namespace] = index
+
+        return index
+
+    # copies the datapoints of a namespace that are about to be changed (those with one of
+    # IDs, or all of them) if they are shared with another namespace
+    def __makeWritable(self,namespace,IDs=None):
+        entries = self._namespaceMap[namespace]
+        newEntries = self._shared.MakeWritable(namespace,entries,IDs)
+        if not newEntries is entries:
+            self._namespaceMap[namespace] = newEntries
+
+    # the datapoints with an ID matchFn() is True for, ready to be changed
+    def __writableSamples(self,namespace,matchFn):
+        IDs = self.__getIdIndex(namespace).MatchingIDs(matchFn)
+        self.__makeWritable(namespace,set(IDs))
+        return self.__getIdIndex(namespace).Samples(IDs)
+
+    # the index for a namespace if there is a current one, else None
+    def __currentIdIndex(self,namespace):
+        index = self._idIndexMap.get(namespace)
+        if None != index and index.IsFor(self._namespaceMap[namespace]):
+            return index
 
-        return False
+        return None
 
-    # creates an array of data entries for every namespace in the file
-    def createNamespaceMap(self):
+    # creates an array of data entries for every namespace in the file, entries can be streamed in
+    def createNamespaceMap(self,entries):
         self._namespaceMap = {}
+        self._idIndexMap = {}
+        self._shared = CopyOnWrite.SharedNamespaces()
         entryCount = 0
 
         startTime = None
 
-        for entry in self._entries:
+        for entry in entries:
             namespace = entry.Namespace
             if isinstance(entry,MarvinGroupData.MarvinDataGroup):
                 namespace=entry._DataList[0].Namespace
@@ -293,43 +186,34 @@ class FileHandler(object):
             Log.getLogger().error("<Namespace> rename failed - namespace " + newName + "already exists")
             raise pickle.UnpicklingError()
 
-        for entry in self._namespaceMap[origName]:  # go through each entry and update namespace
-            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                for subEntry in entry._DataList:
-                    subEntry.Namespace = newName
-            else:
-                entry.Namespace = newName
-
-
-        #self._namespaceMap[newName] = self._namespaceMap.pop(origName)
+        # the datapoints keep the old name until they are written out
+        CopyOnWrite.RenameKey(self._namespaceMap,origName,newName)
+        if origName in self._idIndexMap:
+            self._idIndexMap[newName] = self._idIndexMap.pop(origName)
+        self._shared.Rename(origName,newName,newName)
 
         Log.getLogger().info("Renamed Namespace {} to {}".format(origName,newName))
-        #self._namespaceMap[newName] = self._namespaceMap[origName]
-        #del self._namespaceMap[origName]
 
-    # makes a copy of a given namespace, with another name - is a copy not a rename
+    # makes a copy of a given namespace, with another name - is a copy not a rename.
+    # The datapoints are shared until one side changes them
     def DuplicateNamespace(self,origName,newName):
         if newName in self._namespaceMap:
             Log.getLogger().error("<Namespace> duplicate failed - namespace " + newName + "already exists")
             raise pickle.UnpicklingError()
 
-        self._namespaceMap[newName] = copy.deepcopy(self._namespaceMap[origName])
-        for entry in self._namespaceMap[newName]:
-            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                for subEntry in entry._DataList:
-                    subEntry.Namespace = newName
-            else:
-                entry.Namespace = newName
+        self._namespaceMap[newName] = list(self._namespaceMap[origName])
+        self._shared.Share(origName,newName)
 
 
     # delete a datapoint from a namespace
-    def DeleteDatapoint(self,namespace,baseNode):
-        if not "ID" in baseNode.attributes:
-            Log.getLogger().error("<Namespace> DeleteID failed - no ID attribute.")
-            raise pickle.UnpicklingError()
-
-        id = baseNode.attributes["ID"].nodeValue
+    def DeleteDatapoint(self,namespace,id):
+        index = self.__getIdIndex(namespace)
+        deleteIDs = set(index.MatchingIDs(lambda ID: Matches(ID,id)))
+        if 0 == len(deleteIDs):
+            Log.getLogger().error("<Namespace> Delete ID failed - no ID " + id + " not found.")
+            return 0
 
+        self.__makeWritable(namespace,deleteIDs)
         newList = []
         removedCount = 0
 
@@ -337,7 +221,7 @@ class FileHandler(object):
             if isinstance(entry,MarvinGroupData.MarvinDataGroup):
                 subList=[]
                 for subEntry in entry._DataList:
-                    if Matches(subEntry,id):
+                    if not subEntry.ID in deleteIDs:
                         subList.append(subEntry)
                     else:
                         removedCount += 1
@@ -348,13 +232,14 @@ class FileHandler(object):
                 newList.append(entry)
 
             else:
-                if not Matches(entry.ID,id):
+                if not entry.ID in deleteIDs:
                     newList.append(entry)
                 else:
                     removedCount += 1
 
         if removedCount > 0:
             self._namespaceMap[namespace] = newList
+            index.Remove(deleteIDs,newList)
 
         else:
             Log.getLogger().error("<Namespace> Delete ID failed - no ID " + id + " not found.")
@@ -365,22 +250,10 @@ class FileHandler(object):
         return removedCount
 
     # trims the namespace to a start and stop time
+    # (the times have been checked by ConfigPlan)
     def TrimNamespace(self,namespace,trimStart,trimEnd):
-        if trimStart < 0:
-            Log.getLogger().error("Invalid <Namespace> Trim - StartTime < 0.")
-            raise pickle.UnpicklingError()
-
-        if trimEnd < 0:
-            Log.getLogger().error("Invalid <Namespace> Trim - EndTime < 0.")
-            raise pickle.UnpicklingError()
-
-        if trimEnd < trimStart:
-            Log.getLogger().error("Invalid <Namespace> Trim - EndTime < StartTime.")
-            raise pickle.UnpicklingError()
-
-        newList=list(self._namespaceMap[namespace])
-        l = len(newList)
-        if len(newList) < 1:
+        entries = self._namespaceMap[namespace]
+        if len(entries) < 1:
             Log.getLogger().info("Asked to trim Namespace: " + namespace + ", however it is empty.  Skipping")
             return
 
@@ -389,32 +262,19 @@ class FileHandler(object):
         else:
             offset = self.insertTime
 
-        index = 0
+        startIndex = 0
         if trimStart > 0:
-            for entry in self._namespaceMap[namespace]:
-                if entry.ArrivalTime - offset <= trimStart:
-                    index +=1
-                else:
-                    break
+            startIndex = countUpToTime(entries,trimStart + offset)
 
-        startIndex = index
-        lastTime = newList[-1].ArrivalTime
-        if trimEnd > newList[-1].ArrivalTime:
+        if trimEnd > entries[-1].ArrivalTime - offset:
             Log.getLogger().info("<Namespace> Trim - EndTime > stream.  Ignoring.")
+            endIndex = len(entries)
 
         else:
-            index = 0
-            for entry in newList:
-                if entry.ArrivalTime - offset <= trimEnd:
-                    index +=1
-                else:
-                    break
+            endIndex = countUpToTime(entries,trimEnd + offset)
 
-        endIndex = index
-        try:
-            self._namespaceMap[namespace] = self._namespaceMap[namespace][startIndex:endIndex]
-        except:
-            Log.getLogger().error("Can't trim Namespace: " + namespace + " to specified range, outside of bounds")
+        if startIndex > 0 or endIndex < len(entries):
+            self._namespaceMap[namespace] = entries[startIndex:endIndex]
 
 
     # takes a 2nd namespace, renames it to the 1st namespace and returns one list with both contents
@@ -424,313 +284,185 @@ class FileHandler(object):
             raise pickle.UnpicklingError()
 
         base = self._namespaceMap[basenamespace]
-        del self._namespaceMap[basenamespace]
-        self.DuplicateNamespace(additionalNamespace,basenamespace)
-        other = self._namespaceMap[basenamespace]
-    
-        merged = mergeLists(base,other)
-        
-        self._namespaceMap[basenamespace] = merged
+        del self._namespaceMap[basenamespace] # goes back in at the end, as it always has
+        other = self._namespaceMap[additionalNamespace]
 
-    # worker fucntion to Scale an ID within a namespace
-    def ScaleID(self,namespace,node):
-        if not "Factor" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Scale - no Factor specified.")
-            raise pickle.UnpicklingError()
-
-        if not "ID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Scale - no ID specified.")
-            raise pickle.UnpicklingError()
-
-        idLow = node.attributes["ID"].nodeValue.lower()
-
-        # if not self.existsID(namespace,idLow):
-        #     Log.getLogger().error("Invalid <Namespace> - Scale - ID: " + node.attributes["ID"].nodeValue + " does not exist.")
-        #     raise pickle.UnpicklingError()
-
-        if "Precision" in node.attributes:
-            try:
-                Precision = int(node.attributes["Precision"].nodeValue)
-            except Exception as Ex:
-                Log.getLogger().error("Invalid <Namespace> - Scale Precision - invalid value: " + node.attributes["Precision"])
-                raise pickle.UnpicklingError()
-        else:
-            Precision = None
-        try:
-            factorVal = float(node.attributes["Factor"].nodeValue)
-        except Exception as Ex:
-            Log.getLogger().error("Invalid <Namespace> - Scale - invalid value: " + node.attributes["Factor"])
-            raise pickle.UnpicklingError()
+        # both lists' datapoints are still shared with whatever they were shared with
+        self._namespaceMap[basenamespace] = mergeLists(base,other)
+        self._shared.Merge(additionalNamespace,basenamespace)
 
+    # worker fucntion to Scale an ID within a namespace
+    def ScaleID(self,namespace,id,factorVal,Precision):
         scaleCount=0
 
-        for entryObj in self._namespaceMap[namespace]:
-            if isinstance(entryObj,MarvinGroupData.MarvinDataGroup):
-                for entry in entryObj._DataList:
-                    if Matches(entry.ID,idLow):
-                        ScaleValue(entry,factorVal,Precision)
-                        scaleCount += 1
-
-            elif Matches(entryObj.ID,idLow):
-                ScaleValue(entryObj,factorVal,Precision)
-                scaleCount += 1
+        samples = list(self.__writableSamples(namespace,lambda ID: Matches(ID,id)))
+        Transforms.ScaleValues(samples,factorVal,Precision)
+        scaleCount += len(samples)
 
         return scaleCount
 
     # worker to bound and ID in a namespace
-    def BoundID(self,namespace,node):
-        if not "ID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Bound - no ID specified.")
-            raise pickle.UnpicklingError()
-
-        id = node.attributes["ID"].nodeValue
-
-        # if not self.existsID(namespace,idLow):
-        #     Log.getLogger().error("Invalid <Namespace> - Bound - ID: " + node.attributes["ID"].nodeValue + " does not exist.")
-        #     raise pickle.UnpicklingError()
-        
-        max=None
-        min=None
-
-        if "Max" in node.attributes:
-            max = node.attributes['Max'].nodeValue
-
-        if "Min" in node.attributes:
-            min = node.attributes['Min'].nodeValue
-
+    def BoundID(self,namespace,id,min,max):
         boundCount=0
 
-        for entryObj in self._namespaceMap[namespace]:
-            if isinstance(entryObj,MarvinGroupData.MarvinDataGroup):
-                for entry in entryObj._DataList:
-                    if Matches(entryObj.ID,id):
-                        if BoundValue(entry,min,max):
-                            boundCount += 1
-
-            elif Matches(entryObj.ID,id):
-                oldVAl = entryObj.Value
-                if BoundValue(entryObj,min,max):
-                    boundCount += 1
+        boundCount += Transforms.BoundValues(self.__writableSamples(namespace,lambda ID: Matches(ID,id)),min,max)
 
         Log.getLogger().info("Bound {} entries".format(boundCount))
         return boundCount
 
     # worker to bound and ID in a namespace
-    def AddValueToID(self,namespace,node):
-        if not "ID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - AddValue - no ID specified.")
-            raise pickle.UnpicklingError()
-
-        id = node.attributes["ID"].nodeValue
-        idLow = node.attributes["ID"].nodeValue.lower()
+    def AddValueToID(self,namespace,id,valueToAdd,valuePrecision):
+        idLow = id.lower()
 
         if not self.existsID(namespace,idLow):
-            Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + node.attributes["ID"].nodeValue + " does not exist.")
+            Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + id + " does not exist.")
             raise pickle.UnpicklingError()
-        
-        if "Value" in node.attributes:
-            try:
-                valueToAdd = float(node.attributes['Value'].nodeValue)
-                parts = node.attributes['Value'].nodeValue.split(".")
-                valuePrecision = 0
-                if len(parts) > 1:
-                  valuePrecision = len(parts[1])
-                
-            except Exception as Ex:
-                Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + node.attributes["ID"].nodeValue + " has invalid Value: " + node.attributes['Value'].nodeValue)
-                raise pickle.UnpicklingError()
-        else:
-           Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + node.attributes["ID"].nodeValue + " has no Value.")
-           raise pickle.UnpicklingError()
 
         changedCount=0
 
-        for entryObj in self._namespaceMap[namespace]:
-            if isinstance(entryObj,MarvinGroupData.MarvinDataGroup):
-                for entry in entryObj._DataList:
-                    if entry.ID.lower() == idLow:
-                        try:
-                           fValue = float(entry.Value)
-                           parts = entry.Value.split(".")
-                           dataPtPrecision = 0
-                           if len(parts) > 1:
-                              dataPtPrecision = len(parts[1])
-                              
-                           if valuePrecision > dataPtPrecision:
-                              dataPtPrecision = valuePrecision
-                              
-                           entry.Value = str(round(valueToAdd + fValue,dataPtPrecision))
-                           changedCount += 1
-                        except:
-                           Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + node.attributes["ID"].nodeValue + " is not a numberic data point.")
-                           raise pickle.UnpicklingError()
-
-
-            elif entryObj.ID.lower() == idLow:
-                try:
-                    fValue = float(entryObj.Value)
-                    parts = entryObj.Value.split(".")
-                    dataPtPrecision = 0
-                    if len(parts) > 1:
-                        dataPtPrecision = len(parts[1])
-                        
-                    if valuePrecision > dataPtPrecision:
-                     dataPtPrecision = valuePrecision
-                    
-                    entryObj.Value = str(round(valueToAdd + fValue,dataPtPrecision))
-                    if len(entryObj.Value) > 6:
-                        print(entryObj.Value)
-                    changedCount += 1
-                except Exception as Ex:
-                    Log.getLogger().error("Invalid <Namespace> - AddValue - ID: " + node.attributes["ID"].nodeValue + " is not a numeric data point.")
-                    raise pickle.UnpicklingError()
+        samples = self.__writableSamples(namespace,lambda ID: ID.lower() == idLow)
+        errorMsg = "Invalid <Namespace> - AddValue - ID: " + id + " is not a numeric data point."
+        changedCount += Transforms.AddValues(samples,valueToAdd,valuePrecision,errorMsg)
 
         Log.getLogger().info("Added Value of {0} to {1} instances of {2}".format(valueToAdd,changedCount,id))
 
         return changedCount
 
-    def __InsertHelper(self,namespace,newEntry):
-        Found = False
-        for index,entry in enumerate(self._namespaceMap[namespace]):
-            if newEntry.ArrivalTime <= entry.ArrivalTime:
-                Found = True
-                break
-
-        if Found:
-            self._namespaceMap[namespace].insert(index,newEntry)
-            return index
+    # the namespace as a Timeline, so inserts by time are a binary search.  Is only
+    # switched over if the namespace is in time order, otherwise None
+    def __getTimeline(self,namespace):
+        entries = self._namespaceMap[namespace]
+        if isinstance(entries,Timeline.Timeline):
+            return entries
 
-        return None
+        if not Merge.IsTimeOrdered(entries):
+            return None
 
+        index = self.__currentIdIndex(namespace)
+        timeline = Timeline.Timeline(entries)
+        self._namespaceMap[namespace] = timeline
+        if None != index:
+            index.SetEntries(timeline)
+        return timeline
 
-    # insert a datapoint into a namesapce
-    def InsertDatapoint(self,namespace,node):
-        if not "ID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Insert - no ID specified.")
-            raise pickle.UnpicklingError()
+    def __InsertHelper(self,namespace,newEntry):
+        idIndex = self.__currentIdIndex(namespace)
+        timeline = self.__getTimeline(namespace)
+        if None != timeline:
+            index = timeline.InsertByTime(newEntry)
 
-        if not "Value" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Insert - no Value specified.")
-            raise pickle.UnpicklingError()
+        else:
+            index = None
+            for position,entry in enumerate(self._namespaceMap[namespace]):
+                if newEntry.ArrivalTime <= entry.ArrivalTime:
+                    index = position
+                    break
 
-        if not "Time" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - Insert - no Time specified.")
-            raise pickle.UnpicklingError()
+            if None != index:
+                self._namespaceMap[namespace].insert(index,newEntry)
 
-        if "Interval" in node.attributes:
-            try:
-                Interval = int(node.attributes["Interval"].nodeValue)
-            except:
-                Log.getLogger().error("Invalid <Namespace> - Insert - invalid Interval specified:" + node.attributes['Interval'].nodeValue)
-                raise pickle.UnpicklingError()
-        else:
-            Interval = None
+        if None != index and None != idIndex:
+            idIndex.Add(newEntry)
 
-        try:
-            insertTime = int(node.attributes['Time'].nodeValue)
-        except:
-            Log.getLogger().error("Invalid <Namespace> - Insert - invalid Time specified:" + node.attributes['Time'].nodeValue)
-            raise pickle.UnpicklingError()
+        return index
 
+
+    # insert a datapoint into a namesapce
+    def InsertDatapoint(self,namespace,ID,Value,insertTime,Interval):
         if None == Interval:
-            newObj = MarvinData.MarvinData(namespace,node.attributes['ID'].nodeValue,node.attributes['Value'].nodeValue,insertTime,'1.0',False)
+            newObj = MarvinData.MarvinData(namespace,ID,Value,insertTime,'1.0',False)
             return self.__InsertHelper(namespace,newObj)
-        else:
+
+        timeline = self.__getTimeline(namespace)
+        if None == timeline:
             retVal = True
             insertCount = 0
             while None != retVal:
-                newObj = MarvinData.MarvinData(namespace,node.attributes['ID'].nodeValue,node.attributes['Value'].nodeValue,insertTime,'1.0',False)
+                newObj = MarvinData.MarvinData(namespace,ID,Value,insertTime,'1.0',False)
                 retVal = self.__InsertHelper(namespace,newObj)
                 insertTime += Interval
                 insertCount += 1
 
-        return insertCount
+            return insertCount
 
+        if 0 == len(timeline):
+            return 1
 
+        # pulse goes up to the last entry in the namespace, generated as it is merged in
+        lastTime = timeline[-1].ArrivalTime
+        pulseTimes = range(insertTime,lastTime + 1,Interval)
+        timeline.MergeSorted(self.__pulse(namespace,ID,Value,pulseTimes))
 
+        return len(pulseTimes) + 1 # has always counted the attempt past the end
 
-    # finds all unique IDs in a namesapce, and then at beginning of the namespace inserts a defined value
-    def InitializeAll(self,namespace,node):
-        if not "Value" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - InitAll - no Value specified.")
-            raise pickle.UnpicklingError()
 
-        if not "Time" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - InitAll - no Time specified.")
-            raise pickle.UnpicklingError()
-
-        try:
-            insertTime = int(node.attributes['Time'].nodeValue)
-        except:
-            Log.getLogger().error("Invalid <Namespace> - InitAll - invalid Time specified:" + node.attributes['Time'].nodeValue)
-            raise pickle.UnpicklingError()
+    # generator of the entries of an InsertID Interval, as they are merged in
+    def __pulse(self,namespace,ID,Value,pulseTimes):
+        idIndex = self.__currentIdIndex(namespace)
+        for pulseTime in pulseTimes:
+            newObj = MarvinData.MarvinData(namespace,ID,Value,pulseTime,'1.0',False)
+            if None != idIndex:
+                idIndex.Add(newObj)
+            yield newObj
 
+    # finds all unique IDs in a namesapce, and then at beginning of the namespace inserts a defined value
+    def InitializeAll(self,namespace,Value,insertTime):
         uniqueMap={}
-        Value = node.attributes['Value'].nodeValue
 
-        index = 0
-        for entry in self._namespaceMap[namespace]:
-            if insertTime <= entry.ArrivalTime:
-                break
-            index += 1
-        
-        startList = list(self._namespaceMap[namespace]) # dup list for processing
-
-        initCount = 0
+        timeline = self.__getTimeline(namespace)
+        if None != timeline:
+            index = timeline.BisectTime(insertTime)
+        else:
+            index = 0
+            for entry in self._namespaceMap[namespace]:
+                if insertTime <= entry.ArrivalTime:
+                    break
+                index += 1
 
-        for entry in startList:
+        newEntries = []
+        for entry in self._namespaceMap[namespace]:
             if isinstance(entry,MarvinGroupData.MarvinDataGroup):
                 for subEntry in entry._DataList:
                     if not subEntry.ID in uniqueMap:
                         uniqueMap[subEntry.ID] = subEntry.ID # just keep track of them
-                        newObj = MarvinData.MarvinData(namespace,subEntry.ID,Value,insertTime,'1.0',False)
-                        self._namespaceMap[namespace].insert(index,newObj)
-                        initCount += 1
+                        newEntries.append(MarvinData.MarvinData(namespace,subEntry.ID,Value,insertTime,'1.0',False))
 
             elif not entry.ID in uniqueMap:
                 uniqueMap[entry.ID] = entry.ID # just keep track of them
-                newObj = MarvinData.MarvinData(namespace,entry.ID,Value,insertTime,'1.0',False)
-                self._namespaceMap[namespace].insert(index,newObj)
-                initCount += 1
-
-        return initCount
-                
-    # rename an ID within a namespace
-    def RenameID(self,namespace,node):
-        if not "ID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - RenameID - no ID specified.")
-            raise pickle.UnpicklingError()
+                newEntries.append(MarvinData.MarvinData(namespace,entry.ID,Value,insertTime,'1.0',False))
 
-        if not "NewID" in node.attributes:
-            Log.getLogger().error("Invalid <Namespace> - RenameID - no NewID specified.")
-            raise pickle.UnpicklingError()
+        # each one used to be inserted at index in turn, so they end up in reverse order
+        newEntries.reverse()
+        idIndex = self.__currentIdIndex(namespace)
+        if None != timeline:
+            timeline.Splice(index,newEntries)
+        else:
+            self._namespaceMap[namespace][index:index] = newEntries
 
-        ID = node.attributes["ID"].nodeValue
-        NewID = node.attributes["NewID"].nodeValue
+        if None != idIndex:
+            for newObj in newEntries:
+                idIndex.Add(newObj)
 
-        if not self.existsID(namespace,ID):
+        return len(newEntries)
+                
+    # rename an ID within a namespace
+    def RenameID(self,namespace,ID,NewID):
+        index = self.__getIdIndex(namespace)
+        if not index.Exists(ID):
             Log.getLogger().error("Invalid <Namespace> - RenameID - ID: " + ID + " does not exist.")
             raise pickle.UnpicklingError()
 
-        if self.existsID(namespace,NewID):
+        if index.Exists(NewID):
             Log.getLogger().error("Invalid <Namespace> - RenameID - ID: " + NewID + " already exists.")
             raise pickle.UnpicklingError()
 
         ID = ID.lower()
 
-        changedCount = 0
-        for entry in self._namespaceMap[namespace]:
-            if isinstance(entry,MarvinGroupData.MarvinDataGroup):
-                for subEntry in entry._DataList:
-                    if ID == subEntry.ID.lower():
-                        subEntry.ID = NewID
-                        changedCount += 1
+        renameIDs = index.MatchingIDs(lambda knownID: knownID.lower() == ID)
+        self.__makeWritable(namespace,set(renameIDs))
+        renamed = self.__getIdIndex(namespace).Rename(renameIDs,lambda knownID: NewID)
 
-            elif ID == entry.ID.lower():
-                entry.ID = NewID
-                changedCount += 1
-
-        return changedCount
+        return sum(count for NewID,count in renamed)
 
     # stretches or shrinks runtime for a namespace
     def SpanNamespaceWorker(self,namespace,runtime):
@@ -739,36 +471,17 @@ class FileHandler(object):
         delta = lastTime - firstTime
         factor = runtime/delta
 
+        self.__makeWritable(namespace)
         for entry in self._namespaceMap[namespace]:
             entry.ArrivalTime = int(float(entry.ArrivalTime) * factor)
 
-    # stretches or shrinks runtime for a namespace
-    def SpanNamespace(self,namespace,node):
-        children = getChildNodes(node,"RunTime")
-        if len(children) == 0:
-            Log.getLogger().error("Invalid <Namespace> - SpanNS - RunTime not specified.")
-            raise pickle.UnpicklingError()
-        
-        if len(children) > 1:
-            Log.getLogger().error("Invalid <Namespace> - SpanNS - only 1 RunTime allowed.")
-            raise pickle.UnpicklingError()
-
-        try:
-            runTime = int(children[0].firstChild.nodeValue)
-        except:
-            Log.getLogger().error("Invalid <Namespace> - SpanNS RunTime value: " + children[0].firstChild.nodeValue)
-            
-        self.SpanNamespaceWorker(namespace,runTime)
-
-        return runTime
-
-    # gets all the differnt options specified for a given namespace internal manipulation and performs them  
-    def ProcessNamespaceManipulation(self,baseNode,namespace):
+    # performs the options of a <Namespace> on a namespace (or each that matches, if it is a pattern)
+    def ProcessNamespaceManipulation(self,namespacePlan,namespace):
         if not namespace in self._namespaceMap:
             matched=False
-            for ns in self._namespaceMap:
+            for ns in list(self._namespaceMap): # processing can add or rename namespaces
                 if Matches(ns,namespace):
-                    self.ProcessNamespaceManipulation(baseNode,ns)
+                    self.ProcessNamespaceManipulation(namespacePlan,ns)
                     matched = True
 
             if not matched:
@@ -778,73 +491,74 @@ class FileHandler(object):
             return
 
         Log.getLogger().info("Processing Namespace: " + namespace)
-        first = True
-        for childNode in baseNode.childNodes:
-            nodeName = childNode.nodeName
-            if nodeName == "#text" or nodeName == '#comment':
-                continue
-            
+        for operation in namespacePlan.Operations:
+            nodeName = operation.Name
             if nodeName == "RenameNS":
-                if True == first:
-                    self.RenameNamespace(namespace,childNode.firstChild.nodeValue)
-                    first = False
+                self.RenameNamespace(namespace,operation.Namespace)
+                namespace = operation.Namespace # rest of the options work on it by its new name
 
             elif nodeName == "DuplicateNS":
-                self.DuplicateNamespace(namespace,childNode.firstChild.nodeValue)
+                self.DuplicateNamespace(namespace,operation.Namespace)
 
             elif nodeName == "DeleteID":
-                self.DeleteDatapoint(namespace,childNode)
+                self.DeleteDatapoint(namespace,operation.ID)
 
             elif nodeName == "MergeWithNS":
-                self.MergeNamespace(namespace,childNode.firstChild.nodeValue)
-                
-            elif nodeName == "TrimNS":
-                trimEntry = getChildNodes(baseNode,"TrimNS")
-        
-                if len(trimEntry) > 1:
-                    Log.getLogger().error("Only 1 <TrimNS> per Namespace.")
-                    raise pickle.UnpicklingError()
-
-                try:
-                    trimStart = int(getChildNodes(trimEntry[0],"StartTime")[0].firstChild.nodeValue)
-                    trimEnd = int(getChildNodes(trimEntry[0],"EndTime")[0].firstChild.nodeValue)
-                except:
-                    Log.getLogger().error("Invalid Namespace <TrimNS>.")
-                    raise pickle.UnpicklingError()
+                self.MergeNamespace(namespace,operation.Namespace)
 
-                self.TrimNamespace(namespace,trimStart,trimEnd)
+            elif nodeName == "TrimNS":
+                self.TrimNamespace(namespace,operation.StartTime,operation.EndTime)
 
             elif nodeName == "ScaleID":
-                count = self.ScaleID(namespace,childNode)
+                count = self.ScaleID(namespace,operation.ID,operation.Factor,operation.Precision)
                 Log.getLogger().info("Scaled {} entries for namespace {}".format(count,namespace))
-            
+
             elif nodeName == "BoundID":
-                self.BoundID(namespace,childNode)
+                self.BoundID(namespace,operation.ID,operation.Min,operation.Max)
 
             elif nodeName == "AddValue":
-                self.AddValueToID(namespace,childNode)
+                self.AddValueToID(namespace,operation.ID,operation.Value,operation.Precision)
 
             elif nodeName == "InsertID":
-                self.InsertDatapoint(namespace,childNode)
-        
+                self.InsertDatapoint(namespace,operation.ID,operation.Value,operation.Time,operation.Interval)
+
             elif nodeName == "InitAllID":
-                self.InitializeAll(namespace,childNode)
-                
+                self.InitializeAll(namespace,operation.Value,operation.Time)
+
             elif nodeName == "RenameID":
-                self.RenameID(namespace,childNode)
+                self.RenameID(namespace,operation.ID,operation.NewID)
 
             elif nodeName == "SpanNS":
-                self.SpanNamespace(namespace,childNode)
+                self.SpanNamespaceWorker(namespace,operation.RunTime)
+
+    # bytes the datapoints take as they are held, without making the copies writing them
+    # out would.  A datapoint shared by namespaces is counted once
+    def MemorySize(self):
+        size = 0
+        seen = set()
+        for namespace,entries in self._namespaceMap.items():
+            if not self._shared.IsShared(namespace):
+                size += sum(ExternalSort.EntrySize(entry) for entry in entries)
+                continue
 
-            else:
-                Log.getLogger().error("Invalid Namespace Option <" + nodeName +">.")
-                raise pickle.UnpicklingError()
+            for entry in entries:
+                if not id(entry) in seen:
+                    seen.add(id(entry))
+                    size += ExternalSort.EntrySize(entry)
+
+        return size
+
+    # returns the list of entries of each namespace, after all the manipulations
+    def getNamespaceLists(self):
+        return [self._shared.OutputEntries(namespace,entries) for namespace,entries in self._namespaceMap.items()]
+
+    # generator of all the entries in time order
+    def iterTimeOrdered(self):
+        return Merge.MergeByTime([Merge.TimeOrdered(entries) for entries in self.getNamespaceLists()])
 
     # retuns the final list of all the namespaces for this file after all the manipulations
     def createMergedList(self,offsetTime=0):
-        resultList=None
-        for namespace in self._namespaceMap:
-                resultList = mergeLists(resultList,self._namespaceMap[namespace])
+        resultList = list(Merge.MergeNamespaces(self.getNamespaceLists()))
 
         if offsetTime > 0:
             for entry in resultList:
@@ -0,0 +1,103 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Index of the datapoints of a namespace by ID (including the ones inside
+#   of a MarvinDataGroup), so working on an ID only touches its datapoints
+#   and a pattern is only matched once per distinct ID, not once per entry.
+#
+#   Holds the datapoint objects themselves rather than where they are in the
+#   list, so inserting into the namespace doesn't move anything around.  An
+#   index is tied to the list it was built from, if the namespace is given a
+#   new list the index is built again.
+#
+##############################################################################
+from Data import MarvinGroupData
+
+
+## ID -> datapoints with that ID for one namespace
+class IdIndex(object):
+    def __init__(self,entries):
+        self._entries = entries
+        self._samples = {}
+        for entry in entries:
+            self.Add(entry)
+
+    # True if this is the index for entries
+    def IsFor(self,entries):
+        return self._entries is entries
+
+    # the namespace was moved to a new list with the same entries in it
+    def SetEntries(self,entries):
+        self._entries = entries
+
+    # adds an entry that was put into the namespace
+    def Add(self,entry):
+        if isinstance(entry,MarvinGroupData.MarvinDataGroup):
+            for subEntry in entry._DataList:
+                self._addSample(subEntry)
+        else:
+            self._addSample(entry)
+
+    def _addSample(self,sample):
+        if not sample.ID in self._samples:
+            self._samples[sample.ID] = []
+        self._samples[sample.ID].append(sample)
+
+    # IDs in the namespace, in the order first seen
+    def IDs(self):
+        return list(self._samples)
+
+    # is case independant, like it always has been
+    def Exists(self,ID):
+        ID = ID.lower()
+        for knownID in self._samples:
+            if knownID.lower() == ID:
+                return True
+
+        return False
+
+    # IDs matchFn(ID) returns True for, is called once per ID
+    def MatchingIDs(self,matchFn):
+        return [ID for ID in self._samples if matchFn(ID)]
+
+    # generator of the datapoints with any of the IDs
+    def Samples(self,IDs):
+        for ID in IDs:
+            for sample in self._samples.get(ID,()):
+                yield sample
+
+    # renames every datapoint with one of the IDs to newIdFn(ID), all at once so a new
+    # ID that is also one of the IDs is not renamed twice.  Returns [(NewID,count)], one per ID
+    def Rename(self,IDs,newIdFn):
+        moved = [(ID,self._samples.pop(ID)) for ID in IDs if ID in self._samples]
+        renamed = []
+        for ID,samples in moved:
+            NewID = newIdFn(ID)
+            for sample in samples:
+                sample.ID = NewID
+
+            if not NewID in self._samples:
+                self._samples[NewID] = []
+            self._samples[NewID].extend(samples)
+            renamed.append((NewID,len(samples)))
+
+        return renamed
+
+    # forget about the datapoints of IDs, after they have been taken out of the namespace
+    def Remove(self,IDs,entries):
+        for ID in IDs:
+            self._samples.pop(ID,None)
+        self._entries = entries
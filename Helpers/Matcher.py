@@ -0,0 +1,81 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Case independant wildcard matching of namespaces and IDs, same rules as
+#   fnmatch.  Each pattern is compiled once, and the answer for a pattern and
+#   name is remembered, as the same few hundred IDs come up over and over.
+#   PatternSet matches a name against several patterns with one regex.
+#
+##############################################################################
+import re
+import fnmatch
+
+# the remembered answers are thrown away once there are this many
+MAX_CACHED = 100000
+
+_compiledMap = {}
+_matchMap = {}
+
+
+def _compile(pattern):
+    matchFn = _compiledMap.get(pattern)
+    if None == matchFn:
+        matchFn = _remember(_compiledMap,pattern,re.compile(fnmatch.translate(pattern.upper())).match)
+
+    return matchFn
+
+def _remember(cache,key,result):
+    if len(cache) >= MAX_CACHED:
+        cache.clear()
+    cache[key] = result
+    return result
+
+
+# True if name matches the wildcard pattern, ignoring case
+def Matches(name,pattern):
+    key = (pattern,name)
+    result = _matchMap.get(key)
+    if None == result:
+        result = _remember(_matchMap,key,None != _compile(pattern)(name.upper()))
+
+    return result
+
+
+## a number of patterns, a name matches the set if it matches any of them
+class PatternSet(object):
+    def __init__(self,patterns):
+        if isinstance(patterns,str):
+            patterns = [patterns]
+
+        self._patterns = list(patterns)
+        combined = "|".join("(?:{})".format(fnmatch.translate(pattern.upper())) for pattern in self._patterns)
+        self._matchFn = re.compile(combined).match if len(self._patterns) > 0 else None
+        self._matchMap = {}
+
+    def Patterns(self):
+        return list(self._patterns)
+
+    def Matches(self,name):
+        result = self._matchMap.get(name)
+        if None == result:
+            result = None != self._matchFn and None != self._matchFn(name.upper())
+            _remember(self._matchMap,name,result)
+
+        return result
+
+    # the names that match, in the order given
+    def Filter(self,names):
+        return [name for name in names if self.Matches(name)]
@@ -0,0 +1,81 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Merges lists of entries by ArrivalTime one entry at a time, rather than
+#   building the merged list.  Gives the same order as appending the lists
+#   one after the other and doing a (stable) sort by time.
+#
+##############################################################################
+import heapq
+
+
+def _arrivalTime(entry):
+    return entry.ArrivalTime
+
+def IsTimeOrdered(entries):
+    lastTime = None
+    for entry in entries:
+        if None != lastTime and entry.ArrivalTime < lastTime:
+            return False
+        lastTime = entry.ArrivalTime
+
+    return True
+
+# the list as is if it is in time order, otherwise a sorted copy.  Anything
+# with its own IsTimeOrdered() (ColumnarNamespace) gets asked, saves walking it
+def TimeOrdered(entries):
+    isOrderedFn = getattr(entries,'IsTimeOrdered',None)
+    if None != isOrderedFn:
+        if isOrderedFn():
+            return entries
+
+    elif IsTimeOrdered(entries):
+        return entries
+
+    return sorted(entries,key=_arrivalTime)
+
+
+# generator that merges lists (or iterators) that are each in time order. For
+# equal times entries come from the earlier list first, so is stable.
+def MergeByTime(sources):
+    sources = list(sources)
+    if 1 == len(sources):
+        return iter(sources[0])
+
+    return heapq.merge(*sources,key=_arrivalTime)
+
+
+# merges two lists into a new one, same result as a stable sort of srcList + listToMerge,
+# though like it always has if srcList is empty listToMerge is returned as it is
+def MergeLists(srcList,listToMerge):
+    if None == srcList or 0 == len(srcList):
+        return list(listToMerge)
+
+    return list(MergeByTime([TimeOrdered(srcList),TimeOrdered(listToMerge)]))
+
+
+# generator giving the entries of all the namespace lists in time order, in the
+# same order FileHandler.mergeLists() gives when called on each one in turn.
+# Like it, a single (non empty) list is left in the order it is in.
+def MergeNamespaces(namespaceLists):
+    namespaceLists = list(namespaceLists)
+    for index,entries in enumerate(namespaceLists):
+        if len(entries) > 0:
+            if index == len(namespaceLists) - 1:
+                return iter(entries)
+            break
+
+    return MergeByTime([TimeOrdered(entries) for entries in namespaceLists])
@@ -0,0 +1,440 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Dry run of a Fudd config or of Fudd2 actions.  Works only from the index
+#   of each file (datapoints per namespace and ID, and their time ranges), so
+#   nothing is unpickled, and goes through the same steps the real run would
+#   keeping an estimate of how many datapoints there are.  Gives how many
+#   datapoints each step touches, the expected output size and memory.
+#
+#   Numbers are estimates: a trim assumes datapoints are spread evenly over
+#   time, and memory is the high side (shared copies are counted in full).
+#
+##############################################################################
+import os
+
+from Helpers import Log
+from Helpers import Matcher
+from Helpers import BiffIndex
+from Helpers import ExternalSort
+from Data import MarvinData
+from Data import ColumnarData
+
+Matches = Matcher.Matches
+
+
+# bytes as something easier to read, like 12.3 MB
+def FormatSize(size):
+    for unit in ('bytes','KB','MB','GB'):
+        if size < 1024:
+            break
+        size /= 1024.0
+    else:
+        unit = 'TB'
+
+    if 'bytes' == unit:
+        return "{} bytes".format(int(size))
+
+    return "{:.1f} {}".format(size,unit)
+
+
+# memory a loaded datapoint of namespace/ID takes, same way --memlimit measures it
+def _sampleMemory(namespace,ID):
+    return ExternalSort.EntrySize(MarvinData.CompactMarvinData(namespace,ID,"0.0",0,"1.0",False))
+
+# memory a datapoint takes in a columnar namespace, one item in each of its arrays
+def _columnarRowSize():
+    nsData = ColumnarData.ColumnarNamespace("",None)
+    return sum(getattr(nsData,column).itemsize for column in ('Times','IDs','Values','Extras','Groups'))
+
+
+## estimate for one ID of a namespace
+class IdEstimate(object):
+    def __init__(self,ID,sampleCount,minTime,maxTime):
+        self.ID = ID
+        self.SampleCount = sampleCount
+        self.MinTime = minTime
+        self.MaxTime = maxTime
+
+    def Copy(self,ID=None):
+        return IdEstimate(ID if None != ID else self.ID,self.SampleCount,self.MinTime,self.MaxTime)
+
+    # count datapoints added at times minTime to maxTime
+    def Add(self,count,minTime,maxTime):
+        if count < 1:
+            return
+
+        self.SampleCount += count
+        self.MinTime = minTime if None == self.MinTime else min(self.MinTime,minTime)
+        self.MaxTime = maxTime if None == self.MaxTime else max(self.MaxTime,maxTime)
+
+    # keeps the datapoints from start to end (None for no limit), returns how many
+    # are dropped.  Datapoints are taken to be spread evenly over the time range
+    def Trim(self,start,end):
+        if self.SampleCount < 1:
+            return 0
+
+        low = self.MinTime if None == start else max(start,self.MinTime)
+        high = self.MaxTime if None == end else min(end,self.MaxTime)
+        if high < low:
+            kept = 0
+        elif self.MaxTime == self.MinTime:
+            kept = self.SampleCount
+        else:
+            kept = int(round(self.SampleCount * (high - low) / float(self.MaxTime - self.MinTime)))
+            kept = max(1,min(self.SampleCount,kept))
+
+        dropped = self.SampleCount - kept
+        self.SampleCount = kept
+        self.MinTime,self.MaxTime = (low,high) if kept > 0 else (None,None)
+        return dropped
+
+
+## one step of a plan, with the state after it
+class PlanStep(object):
+    def __init__(self,description,touched,sampleCount,memory):
+        self.Description = description
+        self.Touched = touched
+        self.SampleCount = sampleCount
+        self.Memory = memory
+
+
+## what a file is expected to look like as steps are done to it.  Has the same action
+## functions as Actions.FileHandler, so the Fudd2 actions run on it as is, but they
+## return the number of datapoints they touch
+class FileEstimate(object):
+    def __init__(self,fileName,columnar=False):
+        index = BiffIndex.GetIndex(fileName)
+        self.FileName = fileName
+        self.FileSize = os.path.getsize(fileName)
+        self.InputSamples = index.SampleCount
+        self.insertTime = None
+        self.Steps = []
+        self._columnar = columnar
+        self._memoryMap = {}
+        self._namespaceMap = {}
+        for namespace in index.Namespaces():
+            self._namespaceMap[namespace] = {}
+            for info in index.IDs(namespace):
+                self._namespaceMap[namespace][info.Name] = IdEstimate(info.Name,info.SampleCount,info.MinTime,info.MaxTime)
+
+    def SampleCount(self):
+        return sum(idEst.SampleCount for idMap in self._namespaceMap.values() for idEst in idMap.values())
+
+    def _memoryPerSample(self,namespace,ID):
+        if self._columnar:
+            return _columnarRowSize()
+
+        key = (namespace,ID)
+        if not key in self._memoryMap:
+            self._memoryMap[key] = _sampleMemory(namespace,ID)
+        return self._memoryMap[key]
+
+    def Memory(self):
+        return sum(idEst.SampleCount * self._memoryPerSample(namespace,ID) for namespace,idMap in self._namespaceMap.items() for ID,idEst in idMap.items())
+
+    # written size, from how many bytes a datapoint takes in the input file
+    def OutputSize(self):
+        if self.InputSamples < 1:
+            return 0
+
+        return int(self.SampleCount() * self.FileSize / float(self.InputSamples))
+
+    def PeakMemory(self):
+        return max([step.Memory for step in self.Steps] + [0])
+
+    # does fn(self), which returns the datapoints it touched, as a step of the plan
+    def Do(self,description,fn):
+        touched = fn(self)
+        self.Steps.append(PlanStep(description,touched,self.SampleCount(),self.Memory()))
+        return touched
+
+    # moves every time back by startTime, like FileHandler does to make times start at the first entry
+    def Rebase(self,startTime):
+        for idMap in self._namespaceMap.values():
+            for idEst in idMap.values():
+                if idEst.SampleCount > 0:
+                    idEst.MinTime -= startTime
+                    idEst.MaxTime -= startTime
+
+    def Load(self):
+        return self.Do("load " + self.FileName,lambda estimate: estimate.SampleCount())
+
+    def Print(self):
+        print("{}: {} datapoints in {} namespaces, {}".format(self.FileName,self.InputSamples,len(self._namespaceMap),FormatSize(self.FileSize)))
+        for stepNumber,step in enumerate(self.Steps):
+            print("  {:>3}. {} - touches {} datapoints, leaves {} using {}".format(stepNumber + 1,step.Description,step.Touched,step.SampleCount,FormatSize(step.Memory)))
+
+        print("  output about {} ({} datapoints), peak memory about {}".format(FormatSize(self.OutputSize()),self.SampleCount(),FormatSize(self.PeakMemory())))
+
+    def getMatchingNamespacesNameList(self,pattern):
+        if isinstance(pattern,str):
+            return [namespace for namespace in self._namespaceMap if Matches(namespace,pattern)]
+
+        return Matcher.PatternSet(pattern).Filter(self._namespaceMap)
+
+    def _namespaceSamples(self,namespace):
+        return sum(idEst.SampleCount for idEst in self._namespaceMap.get(namespace,{}).values())
+
+    def _namespaceTimes(self,namespace):
+        idEsts = [idEst for idEst in self._namespaceMap.get(namespace,{}).values() if idEst.SampleCount > 0]
+        if len(idEsts) < 1:
+            return (None,None)
+
+        return (min(idEst.MinTime for idEst in idEsts),max(idEst.MaxTime for idEst in idEsts))
+
+    # the IDs of a namespace matchFn is True for
+    def _matchingIds(self,namespace,matchFn):
+        return [idEst for ID,idEst in self._namespaceMap[namespace].items() if matchFn(ID)]
+
+    def _copy(self,namespace,newName):
+        self._namespaceMap[newName] = dict((ID,idEst.Copy()) for ID,idEst in self._namespaceMap[namespace].items())
+        return self._namespaceSamples(newName)
+
+    def _rename(self,namespace,newName):
+        if newName in self._namespaceMap:
+            return self._namespaceSamples(namespace) # keeps its key, gets the name at write time
+
+        self._namespaceMap = dict((newName if key == namespace else key,idMap) for key,idMap in self._namespaceMap.items())
+        return self._namespaceSamples(newName)
+
+    def _renameIds(self,namespace,idEsts,newIdFn):
+        idMap = self._namespaceMap[namespace]
+        for idEst in idEsts:
+            del idMap[idEst.ID]
+        for idEst in idEsts:
+            NewID = newIdFn(idEst.ID)
+            if NewID in idMap:
+                idMap[NewID].Add(idEst.SampleCount,idEst.MinTime,idEst.MaxTime)
+            else:
+                idMap[NewID] = idEst.Copy(NewID)
+
+        return sum(idEst.SampleCount for idEst in idEsts)
+
+    #### Fudd2 actions, same arguments as Actions.FileHandler ####
+    def Delete_Namespace(self,namespaceName):
+        touched = 0
+        for namespace in self.getMatchingNamespacesNameList(namespaceName):
+            touched += self._namespaceSamples(namespace)
+            del self._namespaceMap[namespace]
+
+        return touched
+
+    def Delete_Id(self,namespaceName,ids):
+        idPatterns = Matcher.PatternSet(ids)
+        touched = 0
+        for namespace in self.getMatchingNamespacesNameList(namespaceName):
+            for idEst in self._matchingIds(namespace,idPatterns.Matches):
+                touched += idEst.SampleCount
+                del self._namespaceMap[namespace][idEst.ID]
+
+        return touched
+
+    def Rename_Namespace(self,origName,newName):
+        return sum(self._rename(namespace,newName.replace('*',namespace)) for namespace in self.getMatchingNamespacesNameList(origName))
+
+    def Rename_Id(self,namespaces,ids,newName):
+        idPatterns = Matcher.PatternSet(ids)
+        touched = 0
+        for namespace in self.getMatchingNamespacesNameList(namespaces):
+            touched += self._renameIds(namespace,self._matchingIds(namespace,idPatterns.Matches),lambda ID: newName.replace('*',ID))
+
+        return touched
+
+    def Copy_Namespace(self,origName,newName):
+        touched = 0
+        for namespace in self.getMatchingNamespacesNameList(origName):
+            newNamespaceName = newName.replace('*',namespace)
+            if not newNamespaceName in self._namespaceMap:
+                touched += self._copy(namespace,newNamespaceName)
+
+        return touched
+
+    def Copy_Id(self,namespaces,ids,newNs,newId):
+        idPatterns = Matcher.PatternSet(ids)
+        touched = 0
+        for namespace in self.getMatchingNamespacesNameList(namespaces):
+            NewNS = newNs.replace('*',namespace)
+            idEsts = self._matchingIds(namespace,idPatterns.Matches)
+            if not NewNS in self._namespaceMap:
+                self._namespaceMap[NewNS] = {}
+
+            for idEst in idEsts:
+                NewID = newId.replace('*',idEst.ID)
+                if NewID in self._namespaceMap[NewNS]:
+                    self._namespaceMap[NewNS][NewID].Add(idEst.SampleCount,idEst.MinTime,idEst.MaxTime)
+                else:
+                    self._namespaceMap[NewNS][NewID] = idEst.Copy(NewID)
+                touched += idEst.SampleCount
+
+        return touched
+
+    def _touchIds(self,namespaceName,ids):
+        idPatterns = Matcher.PatternSet(ids)
+        return sum(idEst.SampleCount for namespace in self.getMatchingNamespacesNameList(namespaceName) for idEst in self._matchingIds(namespace,idPatterns.Matches))
+
+    def Bound_Id(self,namespaceName,ids,maxValue,minValue):
+        return self._touchIds(namespaceName,ids)
+
+    def ApplyDelta_Id(self,namespaceName,ids,deltaVal):
+        return self._touchIds(namespaceName,ids)
+
+    #### Fudd config, same steps as FileHandler.FileHandler ####
+    def Trim(self,namespace,trimStart,trimEnd):
+        offset = self.insertTime if isinstance(self.insertTime,int) else 0
+        firstTime,lastTime = self._namespaceTimes(namespace)
+        if None == firstTime:
+            return 0
+
+        start = trimStart + offset if trimStart > 0 else None
+        end = trimEnd + offset if trimEnd <= lastTime - offset else None
+        return sum(idEst.Trim(start,end) for idEst in self._namespaceMap[namespace].values())
+
+    def Span(self,namespace,runTime):
+        firstTime,lastTime = self._namespaceTimes(namespace)
+        if None == firstTime or lastTime == firstTime:
+            return 0
+
+        factor = runTime / (lastTime - firstTime)
+        for idEst in self._namespaceMap[namespace].values():
+            if idEst.SampleCount > 0:
+                idEst.MinTime = int(float(idEst.MinTime) * factor)
+                idEst.MaxTime = int(float(idEst.MaxTime) * factor)
+
+        return self._namespaceSamples(namespace)
+
+    def Insert(self,namespace,ID,insertTime,interval):
+        firstTime,lastTime = self._namespaceTimes(namespace)
+        if None == lastTime or insertTime > lastTime:
+            return 0
+
+        count = 1
+        if None != interval and interval > 0:
+            count = len(range(insertTime,lastTime + 1,interval))
+
+        idMap = self._namespaceMap[namespace]
+        if not ID in idMap:
+            idMap[ID] = IdEstimate(ID,0,None,None)
+        idMap[ID].Add(count,insertTime,insertTime + (count - 1) * (interval or 0))
+        return count
+
+    def InitAll(self,namespace,insertTime):
+        idEsts = list(self._namespaceMap[namespace].values())
+        for idEst in idEsts:
+            idEst.Add(1,insertTime,insertTime)
+
+        return len(idEsts)
+
+    def Merge(self,additionalNamespace,baseNamespace):
+        if not baseNamespace in self._namespaceMap:
+            return 0
+
+        baseMap = self._namespaceMap[baseNamespace]
+        for ID,idEst in self._namespaceMap[additionalNamespace].items():
+            if ID in baseMap:
+                baseMap[ID].Add(idEst.SampleCount,idEst.MinTime,idEst.MaxTime)
+            else:
+                baseMap[ID] = idEst.Copy()
+
+        return self._namespaceSamples(additionalNamespace)
+
+    def Remove(self,namespace):
+        if not namespace in self._namespaceMap:
+            return 0
+
+        touched = self._namespaceSamples(namespace)
+        del self._namespaceMap[namespace]
+        return touched
+
+    def _exactIds(self,namespace,ID):
+        ID = ID.lower()
+        return self._matchingIds(namespace,lambda knownID: knownID.lower() == ID)
+
+    # the options of a <Namespace> (or of each that matches, if it is a pattern)
+    def PlanNamespace(self,namespacePlan,namespace):
+        if not namespace in self._namespaceMap:
+            for ns in list(self._namespaceMap):
+                if Matches(ns,namespace):
+                    self.PlanNamespace(namespacePlan,ns)
+            return
+
+        for operation in namespacePlan.Operations:
+            nodeName = operation.Name
+            description = namespace + " " + operation.Description
+
+            if nodeName == "RenameNS":
+                newName = operation.Namespace
+                self.Do(description,lambda estimate: estimate._rename(namespace,newName))
+                namespace = newName
+
+            elif nodeName == "DuplicateNS":
+                self.Do(description,lambda estimate: estimate._copy(namespace,operation.Namespace))
+
+            elif nodeName == "DeleteID":
+                self.Do(description,lambda estimate: estimate.Delete_Id([namespace],[operation.ID]))
+
+            elif nodeName == "MergeWithNS":
+                self.Do(description,lambda estimate: estimate.Merge(namespace,operation.Namespace))
+
+            elif nodeName == "TrimNS":
+                self.Do("{} {} to {}".format(description,operation.StartTime,operation.EndTime),lambda estimate: estimate.Trim(namespace,operation.StartTime,operation.EndTime))
+
+            elif nodeName in ("ScaleID","BoundID"):
+                self.Do(description,lambda estimate: estimate._touchIds([namespace],[operation.ID]))
+
+            elif nodeName == "AddValue":
+                self.Do(description,lambda estimate: sum(idEst.SampleCount for idEst in estimate._exactIds(namespace,operation.ID)))
+
+            elif nodeName == "InsertID":
+                self.Do(description,lambda estimate: estimate.Insert(namespace,operation.ID,operation.Time,operation.Interval))
+
+            elif nodeName == "InitAllID":
+                self.Do(description,lambda estimate: estimate.InitAll(namespace,operation.Time))
+
+            elif nodeName == "RenameID":
+                self.Do(description,lambda estimate: estimate._renameIds(namespace,estimate._exactIds(namespace,operation.ID),lambda knownID: operation.NewID))
+
+            elif nodeName == "SpanNS":
+                self.Do("{} {}".format(description,operation.RunTime),lambda estimate: estimate.Span(namespace,operation.RunTime))
+
+
+# plan of a <Source> in a Fudd config (its ConfigPlan.SourcePlan), in the same order FileHandler does things
+def PlanSource(sourcePlan):
+    estimate = FileEstimate(sourcePlan.File)
+    estimate.insertTime = sourcePlan.InsertTime
+
+    # the index doesn't know which datapoint is first in the file, the earliest is close enough
+    startTime = min([estimate._namespaceTimes(namespace)[0] for namespace in estimate._namespaceMap if None != estimate._namespaceTimes(namespace)[0]] + [None],key=lambda time: (None == time,time))
+    if None != startTime:
+        if isinstance(estimate.insertTime,int):
+            startTime -= estimate.insertTime
+        estimate.Rebase(startTime)
+    estimate.Load()
+
+    for namespacePlan in sourcePlan.Namespaces:
+        estimate.PlanNamespace(namespacePlan,namespacePlan.Name)
+
+    for operation in sourcePlan.FileActions:
+        if operation.Name == "Trim":
+            estimate.Do(operation.Description,lambda est: sum(est.Trim(namespace,operation.StartTime,operation.EndTime) for namespace in list(est._namespaceMap)))
+
+        elif operation.Name == "Span":
+            estimate.Do(operation.Description,lambda est: sum(est.Span(namespace,operation.RunTime) for namespace in list(est._namespaceMap)))
+
+    for namespace in sourcePlan.RemoveNamespaces:
+        estimate.Do("<RemoveNamespace> " + namespace,lambda est: est.Remove(namespace))
+
+    return estimate
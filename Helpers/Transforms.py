@@ -0,0 +1,217 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Numeric changes (scale, bound, delta, add) to the values of a batch of
+#   datapoints at once.  Datapoints are grouped by their value so each
+#   distinct value is parsed, worked on and turned back into a string once,
+#   the arithmetic is done over all of the distinct values in one go (with
+#   numpy if it is installed).  Results are the same strings the one at a
+#   time versions gave.
+#
+##############################################################################
+import pickle
+
+from Helpers import Log
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _toNumber(value):
+    try:
+        return float(value)
+    except Exception:
+        return None
+
+
+## datapoints grouped by value, with the value as a number (None if it isn't one)
+class _ValueGroups(object):
+    def __init__(self,samples):
+        groupMap = {}
+        for sample in samples:
+            key = (sample.Value.__class__,sample.Value)
+            if not key in groupMap:
+                groupMap[key] = []
+            groupMap[key].append(sample)
+
+        self.Values = [key[1] for key in groupMap]
+        self.Samples = list(groupMap.values())
+        self.Numbers = [_toNumber(value) for value in self.Values]
+        self.NumericMask = [None != number for number in self.Numbers]
+
+    def Numeric(self):
+        return [number for number,isNumber in zip(self.Numbers,self.NumericMask) if isNumber]
+
+    # groups of the non numeric values
+    def NonNumericSamples(self):
+        return [samples for samples,isNumber in zip(self.Samples,self.NumericMask) if not isNumber]
+
+    # (value, samples, number) of the numeric values, in the same order as Numeric()
+    def NumericGroups(self):
+        return [(value,samples,number) for value,samples,number,isNumber in zip(self.Values,self.Samples,self.Numbers,self.NumericMask) if isNumber]
+
+    # sets every datapoint of each numeric group to the matching new value (None leaves it be),
+    # returns how many datapoints were changed
+    def SetNumeric(self,newValues):
+        changedCount = 0
+        for (value,samples,number),newValue in zip(self.NumericGroups(),newValues):
+            if None != newValue:
+                for sample in samples:
+                    sample.Value = newValue
+                changedCount += len(samples)
+
+        return changedCount
+
+
+def _multiply(numbers,factor):
+    if None != numpy:
+        return (numpy.array(numbers,dtype=numpy.float64) * factor).tolist()
+
+    return [number * factor for number in numbers]
+
+def _add(numbers,amount):
+    if None != numpy:
+        return (numpy.array(numbers,dtype=numpy.float64) + amount).tolist()
+
+    return [number + amount for number in numbers]
+
+# like applying a min and then a max one at a time, returns (new numbers, changed flags)
+def _bound(numbers,min,max):
+    if None != numpy:
+        bounded = numpy.array(numbers,dtype=numpy.float64)
+        changed = numpy.zeros(len(numbers),dtype=bool)
+        if None != min:
+            changed |= bounded < min
+            bounded = numpy.where(bounded < min,min,bounded)
+        if None != max:
+            changed |= bounded > max
+            bounded = numpy.where(bounded > max,max,bounded)
+        return bounded.tolist(),changed.tolist()
+
+    bounded = []
+    changed = []
+    for number in numbers:
+        wasChanged = False
+        if None != min and number < min:
+            number = min
+            wasChanged = True
+        if None != max and number > max:
+            number = max
+            wasChanged = True
+        bounded.append(number)
+        changed.append(wasChanged)
+
+    return bounded,changed
+
+
+# scales the numeric ones, others are logged and left as they are
+def ScaleValues(samples,scaleVal,Precision):
+    groups = _ValueGroups(samples)
+    for nonNumeric in groups.NonNumericSamples():
+        for sample in nonNumeric:
+            Log.getLogger().info("Failed to scale ID: "  + sample.ID + " as it is not a numeric value.  Ignoring.")
+
+    scaled = _multiply(groups.Numeric(),float(scaleVal))
+    if None != Precision:
+        newValues = [format(fVal,'.' + str(Precision) + 'f') for fVal in scaled]
+    else:
+        newValues = [str(fVal) for fVal in scaled]
+
+    return groups.SetNumeric(newValues)
+
+
+# min and max of a BoundID as numbers (None if not given)
+def BoundLimits(min,max):
+    limits = []
+    for limit,name in ((min,"Min"),(max,"Max")):
+        if None != limit:
+            try:
+                limit = float(limit)
+            except:
+                Log.getLogger().error("Invalid <Namespace> - " + name + " BoundID value of " + limit +" is invalid.")
+                raise pickle.UnpicklingError()
+        limits.append(limit)
+
+    return limits[0],limits[1]
+
+# sets the numeric values below min to min and above max to max, returns how many were changed
+def BoundValues(samples,min,max):
+    samples = list(samples)
+    if 0 == len(samples):
+        return 0
+
+    if None == min and None == max:
+        Log.getLogger().error("Invalid <Namespace> - BoundID without Min or Max value specified.")
+        raise pickle.UnpicklingError()
+
+    groups = _ValueGroups(samples)
+    for nonNumeric in groups.NonNumericSamples():
+        for sample in nonNumeric:
+            Log.getLogger().info("Invalid <Namespace> - BoundID tried to bound non numeric data point, ID="+sample.ID)
+
+    numbers = groups.Numeric()
+    if 0 == len(numbers):
+        return 0
+
+    min,max = BoundLimits(min,max)
+    bounded,changed = _bound(numbers,min,max)
+    return groups.SetNumeric([str(number) if wasChanged else None for number,wasChanged in zip(bounded,changed)])
+
+
+# adds delta to the numeric values, returns how many were changed
+def DeltaValues(samples,delta):
+    groups = _ValueGroups(samples)
+    for nonNumeric in groups.NonNumericSamples():
+        for sample in nonNumeric:
+            Log.getLogger().info("Invalid <Namespace> - BoundID tried to bound non numeric data point, ID="+sample.ID)
+
+    numbers = groups.Numeric()
+    if None == delta or 0 == len(numbers):
+        return 0
+
+    try:
+        delta = float(delta)
+    except:
+        Log.getLogger().error("Invalid <Namespace> - delta  value of " + delta +" is invalid.")
+        raise pickle.UnpicklingError()
+
+    return groups.SetNumeric([str(number) for number in _add(numbers,delta)])
+
+
+# digits after the decimal point in a value
+def _precision(value):
+    parts = value.split(".")
+    if len(parts) > 1:
+        return len(parts[1])
+
+    return 0
+
+# adds valueToAdd to each value, rounded to the larger of valuePrecision and the number of digits
+# after the point in the value.  Every value must be numeric, errorMsg is logged if one isn't
+def AddValues(samples,valueToAdd,valuePrecision,errorMsg):
+    groups = _ValueGroups(samples)
+    try:
+        if len(groups.NonNumericSamples()) > 0:
+            raise ValueError()
+        precisions = [_precision(value) for value in groups.Values]
+    except Exception:
+        Log.getLogger().error(errorMsg)
+        raise pickle.UnpicklingError()
+
+    added = _add(groups.Numeric(),valueToAdd)
+    return groups.SetNumeric([str(round(fVal,max(valuePrecision,precision))) for fVal,precision in zip(added,precisions)])
@@ -0,0 +1,72 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Shared bits for the tests.  The save files in Demonstration are copied to a
+#   temporary directory for each test, so the index and plan files made next
+#   to them never end up in the repo.
+#
+##############################################################################
+import os
+import sys
+import shutil
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,REPO_DIR)
+
+from Helpers import BiffStream
+
+DEMO_FILES = ["A SaveFile.biff","AnotherSaveFile.biff"]
+
+_FIELDS = ["Namespace","ID","Value","ArrivalTime"]
+
+
+# an entry as plain tuples, so two files can be compared whatever they were read from
+def _canonical(entry):
+    fields = tuple(getattr(entry,name,None) for name in _FIELDS)
+    if hasattr(entry,"_DataList"):
+        return ("Group",fields,tuple(_canonical(subEntry) for subEntry in entry._DataList))
+
+    return ("Data",fields)
+
+# the entries of a save file, in the order they are in it
+def ReadBack(fileName,lowMemory=False):
+    return [_canonical(entry) for entry in BiffStream.ReadEntries(fileName,lowMemory=lowMemory)]
+
+# runs Fudd.py or Fudd2.py in workDir (where its log goes), returns what it printed.
+# Fails the test if it doesn't work
+def RunScript(workDir,script,*args):
+    command = [sys.executable,os.path.join(REPO_DIR,script)] + list(args)
+    result = subprocess.run(command,cwd=workDir,stdout=subprocess.PIPE,stderr=subprocess.STDOUT,universal_newlines=True)
+    assert 0 == result.returncode, result.stdout
+    return result.stdout
+
+
+# copies of the demonstration save files, in the order of DEMO_FILES.  They are in a
+# directory of their own, so a glob of it only finds them and what is made from them
+@pytest.fixture
+def saveFiles(tmp_path):
+    saveDir = os.path.join(str(tmp_path),"saves")
+    os.mkdir(saveDir)
+    fileList = []
+    for fileName in DEMO_FILES:
+        target = os.path.join(saveDir,fileName)
+        shutil.copyfile(os.path.join(REPO_DIR,"Demonstration",fileName),target)
+        fileList.append(target)
+
+    return fileList
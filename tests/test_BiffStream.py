@@ -0,0 +1,136 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Save files written by BiffStream read back the same whatever the format
+#   (pickle or columnar) and compression.  The streaming unpickler is built on
+#   the pure Python pickle internals, it is checked against the C unpickler on
+#   every kind of file so a Python that changes them fails here.
+#
+##############################################################################
+import os
+import pickle
+
+import pytest
+
+from Helpers import BiffStream
+from conftest import ReadBack
+from conftest import _canonical
+
+TARGETS = ["out.biff","out.biff.gz","out.biff.xz","out.biff.bz2","out.fcol","out.fcol.gz","out.fcol.xz","out.fcol.bz2"]
+
+
+@pytest.mark.parametrize("targetName",TARGETS)
+def test_RoundTrip(tmp_path,saveFiles,targetName):
+    for sourceFile in saveFiles:
+        target = os.path.join(str(tmp_path),targetName)
+        count = BiffStream.WriteEntries(target,BiffStream.ReadEntries(sourceFile))
+
+        entries = ReadBack(target)
+        assert entries == ReadBack(sourceFile)
+        assert count == len(entries)
+
+# the streaming unpickler gives what the C one does
+def test_LowMemory(saveFiles):
+    for sourceFile in saveFiles:
+        assert ReadBack(sourceFile,lowMemory=True) == ReadBack(sourceFile)
+
+# every format written to from every other one
+def test_Chain(tmp_path,saveFiles):
+    expected = ReadBack(saveFiles[1])
+    previous = saveFiles[1]
+    for targetName in TARGETS + TARGETS[:1]:
+        target = os.path.join(str(tmp_path),"chain_" + targetName)
+        BiffStream.WriteEntries(target,BiffStream.ReadEntries(previous))
+        assert ReadBack(target) == expected
+        previous = target
+
+# really compressed, not just a plain file with the name
+@pytest.mark.parametrize("extension,magic",[(".gz",b"\x1f\x8b"),(".xz",b"\xfd7zXZ"),(".bz2",b"BZh")])
+def test_Compressed(tmp_path,saveFiles,extension,magic):
+    for targetName in ("out.biff","out.fcol"):
+        target = os.path.join(str(tmp_path),targetName + extension)
+        BiffStream.WriteEntries(target,BiffStream.ReadEntries(saveFiles[0]))
+        with open(target,'rb') as fp:
+            assert fp.read(len(magic)) == magic
+
+def test_IsWrittenAs(tmp_path,saveFiles):
+    pickleFile = os.path.join(str(tmp_path),"fudd.biff")
+    columnarFile = os.path.join(str(tmp_path),"fudd.fcol")
+    BiffStream.WriteEntries(pickleFile,BiffStream.ReadEntries(saveFiles[0]))
+    BiffStream.WriteEntries(columnarFile,BiffStream.ReadEntries(saveFiles[0]))
+
+    assert BiffStream.IsWrittenAs(pickleFile,"x.biff")
+    assert not BiffStream.IsWrittenAs(pickleFile,"x.biff.gz")
+    assert not BiffStream.IsWrittenAs(pickleFile,"x.fcol")
+    assert BiffStream.IsWrittenAs(columnarFile,"x.fcol")
+    assert not BiffStream.IsWrittenAs(saveFiles[0],"x.biff") # from Oscar, may not be in time order
+
+
+# what _StreamingUnpickler uses of the pure Python pickle module
+def test_PickleInternals():
+    for name in ("_Unpickler","_Unframer","_Stop"):
+        assert hasattr(pickle,name), "pickle." + name + " is gone, BiffStream._StreamingUnpickler needs it"
+
+    for name in ("_file_read","_file_readline"):
+        unpickler = pickle._Unpickler(open(os.devnull,'rb'))
+        assert hasattr(unpickler,name), "pickle._Unpickler." + name + " is gone, BiffStream._StreamingUnpickler needs it"
+
+    for opcode in (pickle.EMPTY_LIST,pickle.PUT,pickle.BINPUT,pickle.LONG_BINPUT,pickle.MEMOIZE):
+        assert opcode[0] in pickle._Unpickler.dispatch
+
+# the save files the streaming unpickler gets given: straight from Oscar (A SaveFile.biff
+# has groups, AnotherSaveFile.biff doesn't), chunked ones written by FUDD, and every
+# pickle protocol (text PUT, BINPUT/LONG_BINPUT, MEMOIZE with framing)
+def streamingSources(tmp_path,saveFiles):
+    sources = list(saveFiles)
+    for sourceFile in saveFiles:
+        chunked = os.path.join(str(tmp_path),"chunked_" + os.path.basename(sourceFile))
+        BiffStream.WriteEntries(chunked,BiffStream.ReadEntries(sourceFile))
+        sources.append(chunked)
+
+    entries = list(BiffStream.ReadEntries(saveFiles[0]))
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+        protocolFile = os.path.join(str(tmp_path),"protocol{}.biff".format(protocol))
+        with open(protocolFile,'wb') as fp:
+            pickle.dump(entries,fp,protocol)
+        sources.append(protocolFile)
+
+    return sources
+
+@pytest.mark.parametrize("compact",[False,True])
+def test_StreamingUnpickler(tmp_path,saveFiles,compact):
+    for sourceFile in streamingSources(tmp_path,saveFiles):
+        with open(sourceFile,'rb') as fp:
+            if compact:
+                expected = BiffStream.CompactUnpickler(fp).load()
+            else:
+                expected = pickle.load(fp)
+
+        with open(sourceFile,'rb') as fp:
+            streamed = list(BiffStream._StreamingUnpickler(fp,compact).Entries())
+
+        assert [entry.__class__ for entry in streamed] == [entry.__class__ for entry in expected], sourceFile
+        assert [_canonical(entry) for entry in streamed] == [_canonical(entry) for entry in expected], sourceFile
+        assert any(hasattr(entry,"_DataList") for entry in streamed) == any(hasattr(entry,"_DataList") for entry in expected)
+
+def test_StreamingNotAList(tmp_path):
+    notAList = os.path.join(str(tmp_path),"dict.biff")
+    with open(notAList,'wb') as fp:
+        pickle.dump({"a" : 1},fp)
+
+    with open(notAList,'rb') as fp:
+        with pytest.raises(pickle.UnpicklingError):
+            list(BiffStream._StreamingUnpickler(fp).Entries())
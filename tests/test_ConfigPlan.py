@@ -0,0 +1,67 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Compiled config plans are only saved in the cache directory, as JSON, and
+#   read back the same as they were compiled.
+#
+##############################################################################
+import os
+import glob
+
+from Helpers import BuildCache
+from Helpers import ConfigPlan
+from conftest import RunScript
+from test_Fudd import writeConfig
+
+
+def test_JsonRoundTrip(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles)
+    cacheDir = os.path.join(workDir,"cache")
+
+    compiled = ConfigPlan.GetPlan(configFile)
+    saved = ConfigPlan.GetPlan(configFile,cacheDir)
+    assert 1 == len(glob.glob(os.path.join(cacheDir,"plan-*.json")))
+
+    reloaded = ConfigPlan.GetPlan(configFile,cacheDir)
+    assert isinstance(reloaded,ConfigPlan.ConfigPlan)
+    for plan in (saved,reloaded):
+        assert BuildCache._normalized(plan) == BuildCache._normalized(compiled)
+
+# only the plan classes are made from a saved plan
+def test_OnlyPlanClasses(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles)
+    cacheDir = os.path.join(workDir,"cache")
+    ConfigPlan.GetPlan(configFile,cacheDir)
+
+    planFile = glob.glob(os.path.join(cacheDir,"plan-*.json"))[0]
+    with open(planFile,'w') as fp:
+        fp.write('{"class" : "BuildCache", "fields" : {}}')
+
+    assert isinstance(ConfigPlan.GetPlan(configFile,cacheDir),ConfigPlan.ConfigPlan)
+
+# nothing is written next to the config, with --plan nothing at all
+def test_NothingWritten(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles)
+    before = sorted(os.listdir(workDir))
+
+    RunScript(workDir,"Fudd.py","-i",configFile,"--plan")
+    assert sorted(os.listdir(workDir)) == sorted(before + ["Fudd.txt"])
+
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",os.path.join(workDir,"out.biff"))
+    assert sorted(os.listdir(workDir)) == sorted(before + ["Fudd.txt","out.biff"])
@@ -0,0 +1,91 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   A change to a namespace that shares datapoints with others (duplicated,
+#   merged, cloned) only shows up in that namespace.
+#
+##############################################################################
+import os
+
+from Helpers import CopyOnWrite
+from conftest import ReadBack
+from conftest import RunScript
+
+# {0} is AnotherSaveFile.biff
+MERGE_CONFIG = """<Fudd><Source File="{0}">
+<Namespace Name="vnf11"><DuplicateNS>B</DuplicateNS></Namespace>
+<Namespace Name="vnf12"><MergeWithNS>B</MergeWithNS></Namespace>
+<Namespace Name="vnf11"><ScaleID ID="Total.TX.Pps" Factor="100"/></Namespace>
+<Namespace Name="vnf12"><ScaleID ID="Total.TX.Pps" Factor="10"/></Namespace>
+</Source></Fudd>
+"""
+
+
+# values of an ID in a namespace, in file order
+def values(entries,namespace,ID):
+    found = []
+    for entry in entries:
+        for subEntry in (entry[2] if "Group" == entry[0] else [entry]):
+            if subEntry[1][0] == namespace and subEntry[1][1] == ID:
+                found.append(subEntry[1][2])
+
+    return found
+
+
+# B is a copy of vnf11 with vnf12 merged into it, scaling vnf11 or vnf12 afterwards
+# mustn't change it
+def test_DuplicateMergeScale(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    configFile = os.path.join(workDir,"merge.xml")
+    with open(configFile,'w') as fp:
+        fp.write(MERGE_CONFIG.format(saveFiles[1]))
+
+    outfile = os.path.join(workDir,"merge.biff")
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile)
+
+    source = ReadBack(saveFiles[1])
+    output = ReadBack(outfile)
+    original = sorted(values(source,"vnf11","Total.TX.Pps") + values(source,"vnf12","Total.TX.Pps"))
+    assert len(original) > 0
+    assert sorted(values(output,"B","Total.TX.Pps")) == original
+    assert values(output,"vnf11","Total.TX.Pps") != values(source,"vnf11","Total.TX.Pps")
+
+
+def test_LastSharerNotShared():
+    shared = CopyOnWrite.SharedNamespaces()
+    shared.Share("A","B")
+    assert shared.IsShared("A") and shared.IsShared("B")
+
+    shared.Forget("B")
+    assert not shared.IsShared("A")
+
+def test_MergeKeepsBothGroups():
+    shared = CopyOnWrite.SharedNamespaces()
+    shared.Share("A","B")
+    shared.Share("C","D")
+    shared.Merge("D","B")
+
+    shared.Forget("C")
+    shared.Forget("D")
+    assert shared.IsShared("A") and shared.IsShared("B")
+
+def test_CloneShares():
+    shared = CopyOnWrite.SharedNamespaces()
+    clone = shared.Clone(["A"])
+    assert shared.IsShared("A") and clone.IsShared("A")
+
+    clone.Forget("A")
+    assert not shared.IsShared("A")
@@ -0,0 +1,124 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   A Fudd config run with --memlimit, --jobs and --cache makes the same file
+#   as a plain run of it.
+#
+##############################################################################
+import os
+
+import pytest
+
+from Helpers import ConfigPlan
+from Helpers import FileHandler
+from conftest import ReadBack
+from conftest import RunScript
+
+# {0} and {1} are the two save files
+CONFIG = """<Fudd>
+<Source File="{1}">
+  <Namespace Name="vnf11"><DuplicateNS>D1</DuplicateNS><ScaleID ID="Total.*" Factor="2"/></Namespace>
+  <Namespace Name="D1"><BoundID ID="Total.RX*" Max="1"/><RenameID ID="SysTime" NewID="ST"/></Namespace>
+  <Namespace Name="vnf12"><DuplicateNS>D3</DuplicateNS><RenameNS>R12</RenameNS></Namespace>
+  <Namespace Name="D3"><InsertID ID="X" Value="1" Time="100" Interval="700"/><DeleteID ID="Uptime"/></Namespace>
+  <Namespace Name="vnf13"><MergeWithNS>vnf14</MergeWithNS></Namespace>
+</Source>
+<Source File="{0}"><InsertTime>2000</InsertTime>
+  <Namespace Name="DemoNamespace"><DuplicateNS>DD</DuplicateNS></Namespace>
+  <Namespace Name="DD"><ScaleID ID="BX" Factor="2"/></Namespace>
+</Source>
+<Source File="{0}"><InsertTime>Append</InsertTime></Source>
+<Source File="{1}"><InsertTime>7000</InsertTime></Source>
+</Fudd>
+"""
+
+
+# the same config with the last <ScaleID> of the first source changed
+CHANGED_CONFIG = CONFIG.replace('Factor="2"/></Namespace>\n</Source>','Factor="4"/></Namespace>\n</Source>')
+
+
+def writeConfig(workDir,saveFiles,fileName="config.xml",config=CONFIG):
+    configFile = os.path.join(workDir,fileName)
+    with open(configFile,'w') as fp:
+        fp.write(config.format(*saveFiles))
+
+    return configFile
+
+# output of a plain run of the config
+@pytest.fixture
+def plainRun(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles)
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",os.path.join(workDir,"plain.biff"))
+    return ReadBack(os.path.join(workDir,"plain.biff"))
+
+
+@pytest.mark.parametrize("options",[["--memlimit","40K"],["--jobs","2"],["--jobs","2","--memlimit","40K"]])
+def test_SameAsPlain(tmp_path,saveFiles,plainRun,options):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles,"options.xml")
+    outfile = os.path.join(workDir,"options.biff")
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,*options)
+
+    assert ReadBack(outfile) == plainRun
+
+def test_Cache(tmp_path,saveFiles,plainRun):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles,"cached.xml")
+    cacheDir = os.path.join(workDir,"cache")
+    outfile = os.path.join(workDir,"cached.biff")
+
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,"--cache",cacheDir)
+    assert ReadBack(outfile) == plainRun
+
+    # nothing changed, the output is left alone
+    written = os.stat(outfile).st_mtime_ns
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,"--cache",cacheDir)
+    assert os.stat(outfile).st_mtime_ns == written
+
+    # made again from the cached sources
+    os.remove(outfile)
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,"--cache",cacheDir)
+    assert ReadBack(outfile) == plainRun
+
+def test_CacheSourceChanged(tmp_path,saveFiles,plainRun):
+    workDir = str(tmp_path)
+    configFile = writeConfig(workDir,saveFiles,"cached.xml")
+    cacheDir = os.path.join(workDir,"cache")
+    outfile = os.path.join(workDir,"cached.biff")
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,"--cache",cacheDir)
+
+    # a source changed, the output must be what a plain run of the new config makes
+    writeConfig(workDir,saveFiles,"cached.xml",CHANGED_CONFIG)
+    RunScript(workDir,"Fudd.py","-i",configFile,"-o",outfile,"--cache",cacheDir)
+
+    changedFile = writeConfig(workDir,saveFiles,"changed.xml",CHANGED_CONFIG)
+    RunScript(workDir,"Fudd.py","-i",changedFile,"-o",os.path.join(workDir,"changed.biff"))
+
+    assert ReadBack(outfile) == ReadBack(os.path.join(workDir,"changed.biff"))
+    assert ReadBack(outfile) != plainRun
+
+# the size --memlimit goes by counts a duplicated namespace's datapoints once, and
+# doesn't copy them to measure them
+def test_MemorySize(saveFiles):
+    source = '<Fudd><Source File="{0}">{1}</Source></Fudd>'
+    plain = FileHandler.FileHandler(ConfigPlan.Compile(source.format(saveFiles[1],"")).Sources[0])
+    duplicated = FileHandler.FileHandler(ConfigPlan.Compile(source.format(saveFiles[1],'<Namespace Name="vnf11"><DuplicateNS>D1</DuplicateNS></Namespace>')).Sources[0])
+
+    before = list(duplicated._namespaceMap["D1"])
+    assert duplicated.MemorySize() == plain.MemorySize()
+    assert all(entry is original for entry,original in zip(duplicated._namespaceMap["D1"],before))
+    assert all(entry.Namespace == "vnf11" for entry in duplicated._namespaceMap["D1"] if not hasattr(entry,"_DataList"))
@@ -0,0 +1,134 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Fudd2 on files it doesn't change (written in the format of the target, or
+#   copied as they are), with --memlimit and --jobs, and on a directory with
+#   the index files of an earlier run in it.
+#
+##############################################################################
+import os
+
+import pytest
+
+from Helpers import BiffStream
+from conftest import ReadBack
+from conftest import RunScript
+
+# an action that matches no namespace in the save files
+NOTHING_TO_DO = ["-a","delete","namespace","-n","NoSuchNamespace"]
+# matches IDs in both of them
+RENAME_ID = ["-a","rename","id","-n","*","--id","Total.*","Graph*","-new","Renamed.*"]
+
+
+def runFudd2(workDir,inputs,output,action,*options):
+    return RunScript(workDir,"Fudd2.py","-y","-i",inputs,"-o",output,*(list(options) + action))
+
+def readFile(fileName):
+    with open(fileName,'rb') as fp:
+        return fp.read()
+
+
+# not a copy of the bytes, the source is neither compressed nor columnar
+@pytest.mark.parametrize("targetName",["out.biff.gz","out.biff.xz","out.fcol","out.fcol.bz2"])
+def test_UnchangedOtherFormat(tmp_path,saveFiles,targetName):
+    workDir = str(tmp_path)
+    plainFile = os.path.join(workDir,"plain.biff")
+    runFudd2(workDir,saveFiles[1],plainFile,NOTHING_TO_DO)
+
+    target = os.path.join(workDir,targetName)
+    runFudd2(workDir,saveFiles[1],target,NOTHING_TO_DO)
+    assert readFile(target) != readFile(saveFiles[1])
+    assert ReadBack(target) == ReadBack(plainFile)
+
+# one written by FUDD in the target's format is copied as it is, once there is an index
+# of it to say there is nothing to do
+@pytest.mark.parametrize("sourceName",["fudd.biff","fudd.biff.gz","fudd.fcol"])
+def test_UnchangedCopied(tmp_path,saveFiles,sourceName):
+    workDir = str(tmp_path)
+    sourceFile = os.path.join(workDir,sourceName)
+    BiffStream.WriteEntries(sourceFile,BiffStream.ReadEntries(saveFiles[1]))
+    runFudd2(workDir,sourceFile,os.path.join(workDir,"first_" + sourceName),NOTHING_TO_DO)
+
+    target = os.path.join(workDir,"copy_" + sourceName)
+    assert "copied from" in runFudd2(workDir,sourceFile,target,NOTHING_TO_DO,"-v")
+    assert readFile(target) == readFile(sourceFile)
+
+# one straight from Oscar may not be in time order, so is written again, the same way as
+# when there was no index yet and it was loaded anyway
+def test_UnchangedFromOscar(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    first = os.path.join(workDir,"first.biff")
+    second = os.path.join(workDir,"second.biff")
+    runFudd2(workDir,saveFiles[1],first,NOTHING_TO_DO)
+    runFudd2(workDir,saveFiles[1],second,NOTHING_TO_DO)
+
+    assert readFile(second) != readFile(saveFiles[1])
+    assert ReadBack(second) == ReadBack(first)
+    assert sorted(ReadBack(second)) == sorted(ReadBack(saveFiles[1]))
+
+
+@pytest.mark.parametrize("options",[["--memlimit","40K"],["--jobs","2"],["--columnar"],["--columnar","--memlimit","40K"]])
+def test_SameAsPlain(tmp_path,saveFiles,options):
+    workDir = str(tmp_path)
+    inputs = os.path.join(os.path.dirname(saveFiles[0]),"*.biff")
+    os.mkdir(os.path.join(workDir,"plain"))
+    os.mkdir(os.path.join(workDir,"options"))
+
+    runFudd2(workDir,inputs,os.path.join(workDir,"plain","*.biff"),RENAME_ID)
+    runFudd2(workDir,inputs,os.path.join(workDir,"options","*.biff"),RENAME_ID,*options)
+
+    for fileName in saveFiles:
+        baseName = os.path.basename(fileName)
+        plainFile = os.path.join(workDir,"plain",baseName)
+        assert ReadBack(os.path.join(workDir,"options",baseName)) == ReadBack(plainFile)
+        assert ReadBack(plainFile) != ReadBack(fileName)
+
+# the columnar handler works on the numbers ValueTable keeps for each distinct value,
+# they have to come out the same as the object handler's
+@pytest.mark.parametrize("action",[["-a","bound","id","-n","*","--id","*","--max","2.5","--min","1"],["-a","delta","id","-n","*","--id","*","--delta","1.25"]])
+def test_ColumnarValues(tmp_path,saveFiles,action):
+    workDir = str(tmp_path)
+    objectFile = os.path.join(workDir,"object.biff")
+    columnarFile = os.path.join(workDir,"columnar.biff")
+    runFudd2(workDir,saveFiles[1],objectFile,action)
+    runFudd2(workDir,saveFiles[1],columnarFile,action,"--columnar")
+
+    assert ReadBack(columnarFile) == ReadBack(objectFile)
+    assert ReadBack(objectFile) != ReadBack(saveFiles[1])
+
+# the *02 IDs of A SaveFile.biff are all in groups, the datapoints copied out of them are
+# the same either way
+def test_CopyIdFromGroups(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    action = ["-a","copy","id","-n","*","--id","*02","--newNamespace","Copied","--newId","Copy.*"]
+    objectFile = os.path.join(workDir,"object.biff")
+    columnarFile = os.path.join(workDir,"columnar.biff")
+    runFudd2(workDir,saveFiles[0],objectFile,action)
+    runFudd2(workDir,saveFiles[0],columnarFile,action,"--columnar")
+
+    copied = [entry for entry in ReadBack(objectFile) if "Data" == entry[0] and "Copied" == entry[1][0]]
+    assert 28 * 5 <= len(copied)
+    assert ReadBack(columnarFile) == ReadBack(objectFile)
+
+# the index files the first run leaves next to the save files aren't taken as save files
+def test_SkipsIndexFiles(tmp_path,saveFiles):
+    workDir = str(tmp_path)
+    os.mkdir(os.path.join(workDir,"out"))
+    for _ in range(2):
+        output = runFudd2(workDir,os.path.join(os.path.dirname(saveFiles[0]),"*"),os.path.join(workDir,"out","*.biff"),RENAME_ID)
+        assert not "ERROR" in output
+
+    assert sorted(os.listdir(os.path.join(workDir,"out"))) == sorted(os.path.basename(fileName) for fileName in saveFiles)
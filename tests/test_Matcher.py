@@ -0,0 +1,38 @@
+##############################################################################
+#  Copyright (c) 2022 Patrick Kutch
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+##############################################################################
+#    File Abstract:
+#   Wildcard matching gives the same answers as fnmatch ignoring case, and
+#   what it remembers doesn't grow past MAX_CACHED.
+#
+##############################################################################
+from Helpers import Matcher
+
+
+def test_Matches():
+    assert Matcher.Matches("Total.TX.Pps","total.*")
+    assert Matcher.Matches("vnf11","VNF1?")
+    assert not Matcher.Matches("vnf11","vnf1")
+
+    patterns = Matcher.PatternSet(["a*","B"])
+    assert patterns.Filter(["abc","b","c"]) == ["abc","b"]
+
+def test_Bounded(monkeypatch):
+    monkeypatch.setattr(Matcher,"MAX_CACHED",10)
+    for number in range(50):
+        assert Matcher.Matches("ID" + str(number),"ID" + str(number) + "*")
+
+    assert len(Matcher._compiledMap) <= 10
+    assert len(Matcher._matchMap) <= 10